@@ -0,0 +1,99 @@
+"""
+Control de admisión por carriles de prioridad
+
+Las rutas de caja (venta, login, búsqueda de productos) no tienen límite y
+siempre se atienden. Las rutas de reportes pasan por un carril acotado: como
+máximo POS_REPORTS_MAX_CONCURRENT reportes a la vez en todo el servidor, de
+modo que el resto de los workers queda reservado para la caja. Si el carril
+está lleno se responde 429 con Retry-After en lugar de encolar el reporte
+detrás de las ventas.
+
+Los cupos son archivos con flock() en un directorio compartido, así el límite
+es global entre los workers de gunicorn y un worker que muere libera su cupo
+automáticamente.
+"""
+import fcntl
+import os
+import random
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import jsonify
+
+from metrics import LANE_REJECTIONS
+
+
+class Lane:
+
+    def __init__(self, name, slots, lock_dir, retry_after=5, wait=0.0):
+        """
+        Args:
+            name: nombre del carril (se usa en métricas y mensajes)
+            slots: peticiones simultáneas permitidas en todo el servidor
+            lock_dir: directorio compartido por los workers para los cupos
+            retry_after: segundos sugeridos al cliente en la respuesta 429
+            wait: segundos que se espera por un cupo antes de rechazar
+        """
+        self.name = name
+        self.slots = slots
+        self.lock_dir = lock_dir
+        self.retry_after = retry_after
+        self.wait = wait
+        os.makedirs(lock_dir, exist_ok=True)
+
+    def _try_acquire(self):
+        start = random.randrange(self.slots)
+        for i in range(self.slots):
+            path = os.path.join(self.lock_dir, f'{self.name}-{(start + i) % self.slots}.lock')
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+        return None
+
+    @contextmanager
+    def admit(self):
+        """Entrega True si se obtuvo un cupo (liberado al salir) o False"""
+        deadline = time.monotonic() + self.wait
+        fd = self._try_acquire()
+        while fd is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+            fd = self._try_acquire()
+
+        if fd is None:
+            LANE_REJECTIONS.labels(lane=self.name).inc()
+            yield False
+            return
+
+        try:
+            yield True
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def limit(self, f):
+        """Decorador de ruta Flask: 429 + Retry-After si el carril está lleno"""
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            with self.admit() as admitted:
+                if not admitted:
+                    return jsonify({
+                        'success': False,
+                        'message': 'El servidor está ocupado con otros reportes. Intente de nuevo en unos segundos.'
+                    }), 429, {'Retry-After': str(self.retry_after)}
+                return f(*args, **kwargs)
+        return decorated_function
+
+
+LANES_DIR = os.environ.get('POS_LANES_DIR', '/tmp/pos_lanes')
+
+reports_lane = Lane(
+    'reports',
+    slots=int(os.environ.get('POS_REPORTS_MAX_CONCURRENT', 2)),
+    lock_dir=LANES_DIR,
+    retry_after=int(os.environ.get('POS_REPORTS_RETRY_AFTER', 5)),
+    wait=float(os.environ.get('POS_REPORTS_QUEUE_WAIT', 0.5))
+)
@@ -1,9 +1,36 @@
 from flask import Flask, request, jsonify, session
 from flask_cors import CORS
 from pos_backend import InventoryManager, ReceiptPrinter
+from admission import reports_lane
+from branches import DEFAULT_BRANCH, BranchNetwork, configured_branches
+import metrics
+import profiling
+import secuenciales
+from config import SRIConfig
+from sri_pipeline import FACTURAS_DIR, INTERVALO_RECUPERACION, FacturaStore, FacturacionPipeline
+from tracing import tracer
 import secrets
+import threading
+import time
 import os
 
+def _create_emulated_branches():
+    """Sucursales sobre el emulador de Sheets (pruebas de carga, sin Google)"""
+    from benchmarks.datasets import NullPrinter, build_dataset
+
+    branches = configured_branches()
+    spreadsheet = build_dataset(
+        products=int(os.environ.get("POS_EMULATOR_PRODUCTS", 1000)),
+        sales=int(os.environ.get("POS_EMULATOR_SALES", 10000)),
+        latency=float(os.environ.get("POS_EMULATOR_LATENCY", 0)),
+        branches=[code for code in branches if code != DEFAULT_BRANCH]
+    )
+    printer = NullPrinter()
+    return {
+        code: InventoryManager(spreadsheet=spreadsheet, printer=printer, branch=code)
+        for code in branches
+    }
+
 def create_app():
     app = Flask(__name__)
 
@@ -22,16 +49,39 @@ def create_app():
 
     CORS(app, supports_credentials=True)  # Importante: soportar credenciales
 
-    CREDS_PATH = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
-    
-    if not CREDS_PATH:
-        raise RuntimeError("GOOGLE_APPLICATION_CREDENTIALS is not set")
+    # Latencia por ruta + endpoint /metrics
+    metrics.init_app(app)
+
+    # Perfilado bajo demanda (cabecera X-Profile o muestreo desde admin)
+    profiling.init_app(app)
 
-    if not os.path.isfile(CREDS_PATH):
-        raise RuntimeError(f"Credentials file not found: {CREDS_PATH}")
+    # Sucursales de la cadena (POS_SUCURSALES) y la local de este servidor
+    # (POS_SUCURSAL): ventas y stock solo tocan la local
+    if os.environ.get("POS_SHEETS_BACKEND") == "emulator":
+        managers = _create_emulated_branches()
+    else:
+        CREDS_PATH = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
+        
+        if not CREDS_PATH:
+            raise RuntimeError("GOOGLE_APPLICATION_CREDENTIALS is not set")
+
+        if not os.path.isfile(CREDS_PATH):
+            raise RuntimeError(f"Credentials file not found: {CREDS_PATH}")
 
+        printer = ReceiptPrinter()
+        managers = {
+            code: InventoryManager(
+                CREDS_PATH,
+                'CentroComercialTB',
+                printer=printer,
+                pool_size=int(os.environ.get("POS_SHEETS_POOL_SIZE", 4)),
+                branch=code
+            )
+            for code in configured_branches()
+        }
 
-    inventory = InventoryManager(CREDS_PATH, 'CentroComercialTB')
+    branches = BranchNetwork(managers, local=os.environ.get("POS_SUCURSAL"))
+    inventory = branches.local
 
     @app.route('/api/auth/login', methods=['POST'])
     def login():
@@ -142,12 +192,41 @@ def create_app():
             return f(*args, **kwargs)
         return decorated_function
 
+    @app.route('/api/traces', methods=['GET'])
+    def get_traces():
+        """Trazas recientes por etapa (solo administradores)"""
+        if 'user' not in session or session['user']['role'] != 'admin':
+            return jsonify({
+                'success': False,
+                'message': 'No autorizado'
+            }), 403
+
+        traces = tracer.query(
+            name=request.args.get('name'),
+            min_duration_ms=request.args.get('min_ms', type=float),
+            limit=request.args.get('limit', 50, type=int)
+        )
+        return jsonify({'success': True, 'data': traces})
+
+    @app.route('/api/traces/<trace_id>', methods=['GET'])
+    def get_trace(trace_id):
+        """Detalle de una traza (solo administradores)"""
+        if 'user' not in session or session['user']['role'] != 'admin':
+            return jsonify({
+                'success': False,
+                'message': 'No autorizado'
+            }), 403
+
+        trace = tracer.get(trace_id)
+        if trace:
+            return jsonify({'success': True, 'data': trace})
+        return jsonify({'success': False, 'error': 'Traza no encontrada'}), 404
+
     @app.route('/api/inventory', methods=['GET'])
     def get_inventory():
         """Obtener todo el inventario"""
         try:
             data = inventory.get_inventory()
-            print(data)
             return jsonify({'success': True, 'data': data})
         except Exception as e:
             return jsonify({'success': False, 'error': str(e)}), 500
@@ -191,6 +270,31 @@ def create_app():
                 'message': str(e)
             }), 500
 
+    @app.route('/api/inventory/adjust', methods=['POST'])
+    @require_auth
+    def adjust_stock():
+        """Ingreso de mercadería o ajuste por conteo físico en lote"""
+        try:
+            lines = request.json.get('lines', [])
+
+            if not lines:
+                return jsonify({
+                    'success': False,
+                    'message': 'Se requiere al menos una línea'
+                }), 400
+
+            result = inventory.adjust_stock(lines)
+
+            if not result['success']:
+                return jsonify(result), 500
+            return jsonify(result)
+
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 500
+
     @app.route('/api/product/<code>', methods=['GET'])
     def get_product(code):
         """Obtener un producto específico"""
@@ -199,6 +303,55 @@ def create_app():
             return jsonify({'success': True, 'data': product})
         return jsonify({'success': False, 'error': 'Producto no encontrado'}), 404
 
+    @app.route('/api/products/search', methods=['GET'])
+    def search_products():
+        """Búsqueda de productos por código o nombre mientras se escribe"""
+        try:
+            query = request.args.get('q', '').strip()
+            limit = min(request.args.get('limit', 10, type=int), 50)
+
+            if not query:
+                return jsonify({'success': True, 'data': []})
+
+            results = inventory.search_products(query, limit)
+            return jsonify({'success': True, 'data': results})
+        except Exception as e:
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @app.route('/api/branches', methods=['GET'])
+    @require_auth
+    def get_branches():
+        """Sucursales configuradas y la local de este servidor"""
+        return jsonify({
+            'success': True,
+            'data': {
+                'sucursales': branches.branches,
+                'local': branches.local_branch
+            }
+        })
+
+    @app.route('/api/branches/stock/<code>', methods=['GET'])
+    @require_auth
+    def get_branch_stock(code):
+        """Stock de un producto en todas las sucursales"""
+        try:
+            stock = branches.get_stock(code)
+            if stock is None:
+                return jsonify({'success': False, 'error': 'Producto no encontrado'}), 404
+            return jsonify({'success': True, 'data': stock})
+        except Exception as e:
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @app.route('/api/branches/alerts', methods=['GET'])
+    @require_auth
+    def get_branch_alerts():
+        """Alertas de stock bajo de todas las sucursales"""
+        try:
+            alerts, errors = branches.get_low_stock_alerts()
+            return jsonify({'success': True, 'alerts': alerts, 'errores': errors})
+        except Exception as e:
+            return jsonify({'success': False, 'error': str(e)}), 500
+
     @app.route('/api/sale', methods=['POST'])
     def process_sale():
         """Procesar una venta"""
@@ -214,6 +367,7 @@ def create_app():
             return jsonify({'success': False, 'error': str(e)}), 500
 
     @app.route('/api/sales/history', methods=['GET'])
+    @reports_lane.limit
     def get_sales_history():
         """Obtener historial de ventas"""
         try:
@@ -227,6 +381,7 @@ def create_app():
             return jsonify({'success': False, 'error': str(e)}), 500
 
     @app.route('/api/sales/summary', methods=['GET'])
+    @reports_lane.limit
     def get_sales_summary():
         """Obtener resumen de ventas del día"""
         try:
@@ -245,7 +400,85 @@ def create_app():
         except Exception as e:
             return jsonify({'success': False, 'error': str(e)}), 500
 
+    @app.route('/api/cierres', methods=['POST'])
+    def close_days():
+        """Cierre de caja de los días completos pendientes (solo administradores)"""
+        try:
+            if 'user' not in session or session['user']['role'] != 'admin':
+                return jsonify({
+                    'success': False,
+                    'message': 'No autorizado'
+                }), 403
+
+            through = (request.json or {}).get('hasta')  # YYYY-MM-DD, por defecto ayer
+            result = inventory.close_days(through)
+
+            if not result['success']:
+                return jsonify(result), 400
+            return jsonify(result)
+
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 500
+
+    @app.route('/api/cierres/<fecha>', methods=['GET'])
+    @require_auth
+    def get_cierre(fecha):
+        """Obtener el cierre de un día (YYYY-MM-DD)"""
+        cierre = inventory.get_cierre(fecha)
+        if cierre:
+            return jsonify({'success': True, 'data': cierre})
+        return jsonify({'success': False, 'error': 'Cierre no encontrado'}), 404
+
+    @app.route('/api/sales/archive', methods=['POST'])
+    def archive_sales():
+        """Mueve los meses cerrados de Ventas al archivo local (solo administradores)"""
+        try:
+            if 'user' not in session or session['user']['role'] != 'admin':
+                return jsonify({
+                    'success': False,
+                    'message': 'No autorizado'
+                }), 403
+
+            through = (request.json or {}).get('hasta')  # YYYY-MM, por defecto el mes anterior
+            result = inventory.archive_sales(through)
+
+            if not result['success']:
+                return jsonify(result), 400
+            return jsonify(result)
+
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 500
+
+    @app.route('/api/sales/backfill-costs', methods=['POST'])
+    def backfill_sale_costs():
+        """Completa el costo unitario de ventas antiguas (solo administradores)"""
+        try:
+            if 'user' not in session or session['user']['role'] != 'admin':
+                return jsonify({
+                    'success': False,
+                    'message': 'No autorizado'
+                }), 403
+
+            result = inventory.backfill_sale_costs()
+
+            if not result['success']:
+                return jsonify(result), 500
+            return jsonify(result)
+
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 500
+
     @app.route('/api/sales/profit-analysis', methods=['GET'])
+    @reports_lane.limit
     def get_profit_analysis():
         try:
             period = request.args.get('period', 'today')  # today, week, month, custom
@@ -253,7 +486,6 @@ def create_app():
             custom_end = request.args.get('end_date')
             
             result = inventory.get_profit_analysis(period, custom_start, custom_end)
-            print(result)
             return jsonify(result)
             
         except Exception as e:
@@ -261,12 +493,89 @@ def create_app():
                 'success': False,
                 'message': str(e)
             }), 500
-    
-    return app
-    """
+
+    @app.route('/api/branches/profit-analysis', methods=['GET'])
+    @reports_lane.limit
+    def get_branches_profit_analysis():
+        """Utilidades consolidadas de todas las sucursales (solo administradores)"""
+        try:
+            if 'user' not in session or session['user']['role'] != 'admin':
+                return jsonify({
+                    'success': False,
+                    'message': 'No autorizado'
+                }), 403
+
+            period = request.args.get('period', 'today')  # today, week, month, custom
+            custom_start = request.args.get('start_date')
+            custom_end = request.args.get('end_date')
+
+            result = branches.get_profit_analysis(period, custom_start, custom_end)
+            return jsonify(result)
+
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 500
+
+    # Facturación electrónica: el pipeline se inicia al arrancar el worker
+    # si hay certificado (o con la primera factura), así las facturas que
+    # quedaron a medias en un reinicio se retoman sin esperar una venta. Sin
+    # certificado o sin acceso al SRI el resto del POS funciona igual. El
+    # estado de las facturas se lee del disco, así cualquier worker lo responde.
+    sri = {'pipeline': None, 'iniciando': False}
+    sri_lock = threading.Lock()
+    facturas = FacturaStore(FACTURAS_DIR)
+
+    def get_sri_pipeline():
+        """
+        Pipeline del worker, o None mientras otro hilo lo inicia
+
+        SRIManager carga el certificado y los WSDL (segundos si el SRI está
+        lento): se construye fuera del lock para que las peticiones no
+        esperen detrás del arranque, y solo se publica con el lock tomado.
+        """
+        with sri_lock:
+            if sri['pipeline'] is not None or sri['iniciando']:
+                return sri['pipeline']
+            sri['iniciando'] = True
+        try:
+            from sri_manager import SRIManager
+            pipeline = FacturacionPipeline(SRIManager(), FACTURAS_DIR).start()
+        except Exception:
+            with sri_lock:
+                sri['iniciando'] = False
+            raise
+        with sri_lock:
+            sri['pipeline'] = pipeline
+            sri['iniciando'] = False
+        return pipeline
+
+    def iniciar_sri_pipeline():
+        # En un hilo aparte: la carga de los WSDL no retrasa el arranque del
+        # worker y, si el SRI no responde, se reintenta
+        while True:
+            try:
+                get_sri_pipeline()
+                return
+            except Exception as e:
+                print(f"⚠️  Facturación electrónica no iniciada: {str(e)} "
+                      f"(reintento en {INTERVALO_RECUPERACION} s)")
+                time.sleep(INTERVALO_RECUPERACION)
+
+    # create_app corre en cada worker después del fork (gunicorn sin
+    # preload_app), así los hilos del pipeline son del worker
+    if os.environ.get('SRI_PIPELINE_AL_INICIO', '1') == '1' and os.path.exists(SRIConfig.CERTIFICADO_PATH):
+        threading.Thread(target=iniciar_sri_pipeline, name='sri-inicio', daemon=True).start()
+
     @app.route('/api/sale-with-invoice-sri', methods=['POST'])
     def process_sale_with_invoice_sri():
-        # Procesar venta con factura electrónica SRI
+        """
+        Procesa la venta y encola su factura electrónica
+
+        Responde 202 apenas la venta queda registrada; la autorización del
+        SRI se consulta en /api/invoices/<id>.
+        """
         try:
             cart = request.json.get('cart', [])
             vendedor = request.json.get('vendedor', 'Sistema')
@@ -287,6 +596,26 @@ def create_app():
                         'success': False,
                         'error': f'Campo {campo} del cliente es obligatorio'
                     }), 400
+
+            try:
+                pipeline = get_sri_pipeline()
+            except Exception as e:
+                return jsonify({
+                    'success': False,
+                    'error': f'Facturación electrónica no disponible: {str(e)}'
+                }), 503
+            if pipeline is None:
+                return jsonify({
+                    'success': False,
+                    'error': 'La facturación electrónica se está iniciando. Intente de nuevo en unos segundos.'
+                }), 503, {'Retry-After': '5'}
+
+            # Cola llena: se rechaza antes de descontar inventario
+            if pipeline.saturated():
+                return jsonify({
+                    'success': False,
+                    'error': 'Hay demasiadas facturas en proceso. Intente de nuevo en unos segundos.'
+                }), 503, {'Retry-After': '5'}
             
             # 1. Procesar venta normal (inventario + historial)
             sale_result = inventory.process_sale(cart, vendedor)
@@ -294,7 +623,7 @@ def create_app():
             if not sale_result['success']:
                 return jsonify(sale_result), 400
             
-            # 2. Emitir factura electrónica SRI
+            # 2. Encolar factura electrónica SRI
             venta_pos = {
                 'cart': cart,
                 'vendedor': vendedor,
@@ -302,15 +631,7 @@ def create_app():
                 'cliente': cliente
             }
             
-            invoice_result = sri_manager.emitir_factura(venta_pos, cliente)
-            
-            if not invoice_result['success']:
-                return jsonify({
-                    'success': False,
-                    'error': f"Venta procesada pero factura falló: {invoice_result.get('error', 'Error desconocido')}",
-                    'sale_id': sale_result['sale_id'],
-                    'detalles_error': invoice_result
-                }), 500
+            invoice = pipeline.submit(venta_pos, cliente)
             
             # 3. TODO: Guardar datos de factura en Google Sheets hoja "Facturas"
             
@@ -319,14 +640,37 @@ def create_app():
             return jsonify({
                 'success': True,
                 'sale': sale_result,
-                'invoice': invoice_result
-            })
+                'invoice': invoice,
+                'status_url': f"/api/invoices/{invoice['id']}"
+            }), 202
             
         except Exception as e:
             import traceback
             traceback.print_exc()
             return jsonify({'success': False, 'error': str(e)}), 500
-    """
+
+    @app.route('/api/invoices/<factura_id>', methods=['GET'])
+    @require_auth
+    def get_invoice_status(factura_id):
+        """Estado de una factura encolada (EN COLA ... AUTORIZADO)"""
+        record = facturas.get(factura_id)
+        if record is None:
+            return jsonify({'success': False, 'error': 'Factura no encontrada'}), 404
+        return jsonify({'success': True, 'invoice': FacturacionPipeline.public(record)})
+
+    @app.route('/api/invoices/sequence-gaps', methods=['GET'])
+    def get_sequence_gaps():
+        """Secuenciales reservados que pueden faltar en la numeración (solo administradores)"""
+        if 'user' not in session or session['user']['role'] != 'admin':
+            return jsonify({
+                'success': False,
+                'message': 'No autorizado'
+            }), 403
+
+        return jsonify({'success': True, 'huecos': secuenciales.huecos()})
+    
+    return app
+
 app = create_app()
 #if __name__ == '__main__':
 #    app.run(host="0.0.0.0", debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,3 @@
+"""
+Benchmarks reproducibles del backend sobre el emulador de Google Sheets
+"""
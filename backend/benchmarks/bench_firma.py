@@ -0,0 +1,102 @@
+"""
+Throughput de la firma electrónica (facturas por segundo)
+
+Uso (desde backend/):
+    python -m benchmarks.bench_firma --invoices 500
+    python -m benchmarks.bench_firma --cert certificado.p12 --password ... --items 20
+    python -m benchmarks.bench_firma --cold 20
+    python -m benchmarks.bench_firma --invoices 5000 --workers 1 2 4 8
+
+Sin --cert se genera un .p12 autofirmado temporal. --cold N mide además N
+facturas cargando el certificado en cada una (costo que se paga si el .p12
+se descifra por factura) para comparar. --workers mide la firma por lotes
+(firmar_lote) con cada cantidad de procesos, incluido el arranque del pool.
+
+La firma de la última factura medida, y la primera de cada lote, se
+verifican (XAdES-BES): si no es válida el benchmark termina con código 1,
+el throughput no cuenta.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_pos import percentile
+from benchmarks.sri_fixtures import TEST_CERT_PASSWORD, make_test_certificate, sample_invoices
+from sri_firma_electronica import FirmaElectronica
+
+
+def measure(sign, invoices):
+    timings = []
+    signed = None
+    start = time.perf_counter()
+    for xml in invoices:
+        t0 = time.perf_counter()
+        signed = sign(xml)
+        timings.append((time.perf_counter() - t0) * 1000)
+    elapsed = time.perf_counter() - start
+    return {
+        'signed': signed,
+        'invoices': len(invoices),
+        'invoices_per_s': round(len(invoices) / elapsed, 1),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+    }
+
+
+def print_result(name, result):
+    print(f"{name:<22} {result['invoices']:>8} {result['invoices_per_s']:>12.1f} "
+          f"{result['p50_ms']:>10.3f} {result['p95_ms']:>10.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark de firma electrónica')
+    parser.add_argument('--cert', help='certificado .p12 (por defecto uno autofirmado temporal)')
+    parser.add_argument('--password', default=TEST_CERT_PASSWORD)
+    parser.add_argument('--invoices', type=int, default=200)
+    parser.add_argument('--items', type=int, default=5, help='detalles por factura')
+    parser.add_argument('--cold', type=int, default=0, help='facturas a medir cargando el .p12 en cada una')
+    parser.add_argument('--workers', type=int, nargs='*', default=[], help='procesos para firmar_lote')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cert = args.cert or make_test_certificate(os.path.join(tmp, 'bench.p12'), args.password)
+        invoices = sample_invoices(args.invoices, args.items)
+
+        t0 = time.perf_counter()
+        firmador = FirmaElectronica(cert, args.password)
+        print(f'Carga del certificado: {(time.perf_counter() - t0) * 1000:.1f} ms\n')
+
+        firmador.firmar_xml(invoices[0])  # calentamiento
+
+        print(f"{'modo':<22} {'facturas':>8} {'facturas/s':>12} {'p50 ms':>10} {'p95 ms':>10}")
+        result = measure(firmador.firmar_xml, invoices)
+        print_result('certificado cargado', result)
+        if not firmador.verificar_firma(result['signed']):
+            print('❌ La firma generada no es válida')
+            return 1
+
+        if args.cold:
+            def cold_sign(xml):
+                return FirmaElectronica(cert, args.password).firmar_xml(xml)
+            print_result('carga por factura', measure(cold_sign, invoices[:args.cold]))
+
+        for workers in args.workers:
+            t0 = time.perf_counter()
+            results = firmador.firmar_lote(invoices, workers=workers)
+            elapsed = time.perf_counter() - t0
+            failed = sum(1 for r in results if not r['success'])
+            name = f'lote {workers} procesos'
+            print(f"{name:<22} {len(invoices):>8} {len(invoices) / elapsed:>12.1f} "
+                  f"{'-':>10} {'-':>10}" + (f'  ❌ {failed} fallidas' if failed else ''))
+            firmada = next((r['xml'] for r in results if r['success']), None)
+            if firmada is None or not firmador.verificar_firma(firmada):
+                print(f'❌ El lote con {workers} procesos no generó firmas válidas')
+                return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""
+Benchmark de los flujos de inventario, ventas y reportes
+
+Uso (desde backend/):
+    python -m benchmarks.bench_pos --profile small
+    python -m benchmarks.bench_pos --profile medium --save-baseline
+    python -m benchmarks.bench_pos --profile medium --check --tolerance 0.25
+
+Para cada escenario reporta percentiles de latencia, llamadas a la API de
+Sheets por operación y pico de memoria (tracemalloc, en una pasada aparte
+para no distorsionar los tiempos). Con --save-baseline guarda el resultado
+en benchmarks/baselines/<perfil>.json; con --check lo compara contra esa
+línea base y termina con código 1 si algún escenario empeoró.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from benchmarks.datasets import (
+    BENCH_PASSWORD, PROFILES, VENDEDORES, NullPrinter, build_dataset, product_code
+)
+from pos_backend import InventoryManager
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), 'baselines')
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+# Prefijo de código, palabra sin tilde, dos prefijos y error de tipeo
+SEARCH_QUERIES = ['P0001', 'azucar', 'prod ace', 'arros', 'jabon 12', 'cafe']
+
+
+def scenarios(inventory, product_count, rng):
+    """(nombre, función sin argumentos) de cada flujo medido"""
+
+    def sale():
+        cart = [{
+            'codigo': product_code(rng.randint(1, product_count)),
+            'cantidad_vendida': 1,
+            'tipoPrecio': 'precio_1'
+        } for _ in range(3)]
+        result = inventory.process_sale(cart, rng.choice(VENDEDORES))
+        assert result['success'], result
+
+    return [
+        ('process_sale', sale),
+        ('get_sales_summary', lambda: inventory.get_sales_summary()),
+        ('get_profit_analysis_today', lambda: inventory.get_profit_analysis('today')),
+        ('get_profit_analysis_month', lambda: inventory.get_profit_analysis('month')),
+        ('get_low_stock_alerts', lambda: inventory.get_low_stock_alerts()),
+        ('search_products', lambda: inventory.search_products(rng.choice(SEARCH_QUERIES))),
+        ('authenticate_user', lambda: inventory.authenticate_user('cajero1', BENCH_PASSWORD)),
+    ]
+
+
+def run(profile, products=None, sales=None, repeat=5, latency=0.0, seed=42, only=None):
+    product_count, sales_count = PROFILES[profile]
+    product_count = products or product_count
+    sales_count = sales or sales_count
+
+    print(f'Generando datos: {product_count} productos, {sales_count} filas de ventas...')
+    start = time.perf_counter()
+    spreadsheet = build_dataset(product_count, sales_count, seed=seed, latency=latency)
+    inventory = InventoryManager(spreadsheet=spreadsheet, printer=NullPrinter())
+    print(f'Datos listos en {time.perf_counter() - start:.1f}s\n')
+
+    rng = random.Random(seed)
+    results = {}
+
+    for name, func in scenarios(inventory, product_count, rng):
+        if only and name not in only:
+            continue
+
+        func()  # calentamiento
+        spreadsheet.reset_calls()
+
+        timings = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - t0) * 1000)
+
+        calls = {op: count / repeat for op, count in sorted(spreadsheet.calls.items())}
+
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        results[name] = {
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'mean_ms': round(statistics.mean(timings), 3),
+            'api_calls': calls,
+            'api_calls_total': sum(calls.values()),
+            'peak_memory_kib': round(peak / 1024, 1)
+        }
+
+    return {
+        'profile': profile,
+        'products': product_count,
+        'sales_rows': sales_count,
+        'repeat': repeat,
+        'latency_s': latency,
+        'python': sys.version.split()[0],
+        'results': results
+    }
+
+
+def print_report(report):
+    print(f"{'escenario':<28} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'llamadas':>9} {'pico KiB':>10}")
+    for name, r in report['results'].items():
+        print(f"{name:<28} {r['p50_ms']:>10.2f} {r['p95_ms']:>10.2f} {r['p99_ms']:>10.2f} "
+              f"{r['api_calls_total']:>9.1f} {r['peak_memory_kib']:>10.1f}")
+
+
+def baseline_path(profile):
+    return os.path.join(BASELINE_DIR, f'{profile}.json')
+
+
+def check_regressions(report, baseline, tolerance):
+    """Lista de regresiones respecto a la línea base"""
+    regressions = []
+    for name, current in report['results'].items():
+        previous = baseline['results'].get(name)
+        if not previous:
+            continue
+
+        limit = previous['p50_ms'] * (1 + tolerance)
+        if current['p50_ms'] > limit:
+            regressions.append(
+                f"{name}: p50 {current['p50_ms']:.2f} ms > {previous['p50_ms']:.2f} ms (+{tolerance:.0%})"
+            )
+
+        # Las llamadas a la API son determinísticas: cualquier aumento cuenta
+        if current['api_calls_total'] > previous['api_calls_total']:
+            regressions.append(
+                f"{name}: llamadas a la API {current['api_calls_total']} > {previous['api_calls_total']}"
+            )
+
+        limit = previous['peak_memory_kib'] * (1 + tolerance)
+        if current['peak_memory_kib'] > limit:
+            regressions.append(
+                f"{name}: memoria {current['peak_memory_kib']} KiB > {previous['peak_memory_kib']} KiB (+{tolerance:.0%})"
+            )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark del backend del POS')
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='small')
+    parser.add_argument('--products', type=int, help='sobrescribe la cantidad de productos del perfil')
+    parser.add_argument('--sales', type=int, help='sobrescribe la cantidad de filas de ventas del perfil')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.0, help='latencia simulada por llamada (s)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--only', nargs='*', help='escenarios a ejecutar')
+    parser.add_argument('--output', help='guardar el reporte JSON en esta ruta')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--check', action='store_true', help='comparar contra la línea base')
+    parser.add_argument('--tolerance', type=float, default=0.20)
+    args = parser.parse_args(argv)
+
+    report = run(args.profile, args.products, args.sales, args.repeat,
+                 args.latency, args.seed, args.only)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(baseline_path(args.profile), 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'\n💾 Línea base guardada: {baseline_path(args.profile)}')
+
+    if args.check:
+        try:
+            with open(baseline_path(args.profile)) as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            print(f'\n❌ No existe línea base para el perfil {args.profile}')
+            return 2
+
+        regressions = check_regressions(report, baseline, args.tolerance)
+        if regressions:
+            print('\n❌ Regresiones detectadas:')
+            for line in regressions:
+                print(f'  - {line}')
+            return 1
+        print('\n✅ Sin regresiones respecto a la línea base')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""
+Throughput de emisión de facturas de punta a punta contra el emulador del SRI
+
+Uso (desde backend/):
+    python -m benchmarks.bench_sri --invoices 50
+    python -m benchmarks.bench_sri --invoices 200 --latency 0.2 --auth-delay 1 --pipeline
+    python -m benchmarks.bench_sri --invoices 100 --devuelta-rate 0.05 --no-autorizado-rate 0.05
+
+Levanta sri_emulator en un hilo, un certificado autofirmado y un directorio
+temporal para secuenciales y XML, y mide SRIManager.emitir_factura una por
+una (como la ruta de venta antigua). Con --pipeline mide además
+FacturacionPipeline: cuánto tarda en quedar resuelto todo el lote. Reporta
+facturas por segundo, percentiles y llamadas SOAP por operación.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from benchmarks.bench_pos import percentile
+from benchmarks.sri_fixtures import TEST_CERT_PASSWORD, make_test_certificate, sample_pos_sales
+from config import SRIConfig
+from sri_emulator import SRIEmulator
+from sri_pipeline import ESTADOS_FINALES, FacturacionPipeline
+
+
+def print_result(name, count, elapsed, timings, estados, calls):
+    p50 = f'{percentile(timings, 50):>10.1f}' if timings else f"{'-':>10}"
+    p95 = f'{percentile(timings, 95):>10.1f}' if timings else f"{'-':>10}"
+    print(f"{name:<16} {count:>8} {count / elapsed:>12.1f} {p50} {p95}")
+    print(f"{'':<16} estados: {dict(estados)}  llamadas SOAP: {dict(calls)}")
+
+
+def bench_emitir(manager, ventas):
+    timings, estados = [], Counter()
+    start = time.perf_counter()
+    for venta_pos, cliente in ventas:
+        t0 = time.perf_counter()
+        resultado = manager.emitir_factura(venta_pos, cliente)
+        timings.append((time.perf_counter() - t0) * 1000)
+        estados['AUTORIZADO' if resultado['success'] else resultado.get('estado', 'ERROR')] += 1
+    return time.perf_counter() - start, timings, estados
+
+
+def bench_pipeline(manager, ventas, directory, poll_initial):
+    pipeline = FacturacionPipeline(manager, directory, poll_initial=poll_initial).start()
+    try:
+        start = time.perf_counter()
+        ids = [pipeline.submit(venta_pos, cliente)['id'] for venta_pos, cliente in ventas]
+        submit_ms = (time.perf_counter() - start) * 1000 / len(ids)
+        pendientes = set(ids)
+        estados = Counter()
+        while pendientes:
+            time.sleep(0.05)
+            for factura_id in list(pendientes):
+                estado = pipeline.get(factura_id)['estado']
+                if estado in ESTADOS_FINALES:
+                    estados[estado] += 1
+                    pendientes.discard(factura_id)
+        return time.perf_counter() - start, submit_ms, estados
+    finally:
+        pipeline.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark de emisión de facturas contra el emulador del SRI')
+    parser.add_argument('--invoices', type=int, default=50)
+    parser.add_argument('--items', type=int, default=5, help='detalles por factura')
+    parser.add_argument('--latency', type=float, default=0.05, help='segundos por llamada SOAP')
+    parser.add_argument('--auth-delay', type=float, default=0.0, help='segundos hasta la autorización')
+    parser.add_argument('--devuelta-rate', type=float, default=0.0)
+    parser.add_argument('--no-autorizado-rate', type=float, default=0.0)
+    parser.add_argument('--pipeline', action='store_true', help='medir también FacturacionPipeline')
+    parser.add_argument('--skip-sequential', action='store_true', help='no medir emitir_factura')
+    args = parser.parse_args(argv)
+
+    emulator = SRIEmulator(args.latency, args.auth_delay, args.devuelta_rate, args.no_autorizado_rate)
+    server = emulator.serve()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Secuenciales, XML y caché de WSDL quedan en el directorio temporal
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        manager = None
+        try:
+            SRIConfig.CERTIFICADO_PATH = make_test_certificate(os.path.join(tmp, 'bench.p12'))
+            SRIConfig.CERTIFICADO_PASSWORD = TEST_CERT_PASSWORD
+            SRIConfig.URL_RECEPCION = emulator.wsdl_url('recepcion')
+            SRIConfig.URL_AUTORIZACION = emulator.wsdl_url('autorizacion')
+
+            from sri_manager import SRIManager
+            t0 = time.perf_counter()
+            manager = SRIManager()
+            print(f'Inicio de SRIManager: {(time.perf_counter() - t0) * 1000:.1f} ms\n')
+
+            ventas = sample_pos_sales(args.invoices, args.items)
+            print(f"{'modo':<16} {'facturas':>8} {'facturas/s':>12} {'p50 ms':>10} {'p95 ms':>10}")
+
+            if not args.skip_sequential:
+                emulator.calls.clear()
+                elapsed, timings, estados = bench_emitir(manager, ventas)
+                print_result('emitir_factura', len(ventas), elapsed, timings, estados, emulator.calls)
+
+            if args.pipeline:
+                emulator.calls.clear()
+                elapsed, submit_ms, estados = bench_pipeline(
+                    manager, sample_pos_sales(args.invoices, args.items, seed=7),
+                    os.path.join(tmp, 'facturas'), poll_initial=max(0.1, args.auth_delay / 2)
+                )
+                print_result('pipeline', args.invoices, elapsed, [], estados, emulator.calls)
+                print(f"{'':<16} respuesta de la ruta (submit): {submit_ms:.2f} ms por factura")
+        finally:
+            # Las rutas del bloque de secuenciales son relativas al directorio
+            # temporal: se libera antes de volver
+            if manager is not None:
+                manager.secuenciales.liberar()
+            os.chdir(cwd)
+            server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+Arranque de los clientes SOAP del SRI (get_client) en un proceso nuevo
+
+Uso (desde backend/):
+    python -m benchmarks.bench_wsdl --runs 10
+
+Cada corrida es un proceso nuevo, como un worker de gunicorn recién creado,
+que arma los clientes de recepción y autorización contra sri_emulator:
+
+    sin caché    descarga y parsea los WSDL/XSD (primer arranque o TTL vencido;
+                 contra el emulador local la descarga es casi gratis, contra
+                 el SRI suma la latencia de red)
+    caché disco  parsea desde la caché SQLite de descargas (SRI_WSDL_CACHE)
+    en memoria   segunda llamada a get_client en el mismo proceso
+
+zeep no permite guardar en disco el WSDL ya parseado (el Document tiene
+locks por hilo y árboles de lxml), así que cada proceso nuevo lo parsea una
+vez; después todas las llamadas usan el cliente en memoria.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.bench_pos import percentile
+from sri_emulator import SRIEmulator
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Se ejecuta en el proceso nuevo: tiempos en ms de get_client para cada URL
+_ARRANQUE = '''
+import json, sys, time
+import sri_facturacion
+tiempos = {}
+for url in sys.argv[1:]:
+    t0 = time.perf_counter()
+    sri_facturacion.get_client(url)
+    tiempos.setdefault('primera', 0.0)
+    tiempos['primera'] += (time.perf_counter() - t0) * 1000
+    t0 = time.perf_counter()
+    sri_facturacion.get_client(url)
+    tiempos.setdefault('memoria', 0.0)
+    tiempos['memoria'] += (time.perf_counter() - t0) * 1000
+print(json.dumps(tiempos))
+'''
+
+
+def arrancar(urls, cache_path):
+    env = dict(os.environ, SRI_WSDL_CACHE=cache_path)
+    salida = subprocess.run(
+        [sys.executable, '-c', _ARRANQUE, *urls],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(salida.strip().splitlines()[-1])
+
+
+def print_result(name, timings):
+    print(f"{name:<14} {len(timings):>8} {percentile(timings, 50):>10.2f} {percentile(timings, 95):>10.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark de arranque de los clientes SOAP')
+    parser.add_argument('--runs', type=int, default=10, help='procesos por modo')
+    args = parser.parse_args(argv)
+
+    emulador = SRIEmulator()
+    emulador.serve()
+    urls = [emulador.wsdl_url('recepcion'), emulador.wsdl_url('autorizacion')]
+
+    frio, disco, memoria = [], [], []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(args.runs):
+            frio.append(arrancar(urls, os.path.join(tmp, f'frio-{i}.db'))['primera'])
+
+        cache_path = os.path.join(tmp, 'compartida.db')
+        arrancar(urls, cache_path)  # llena la caché de disco
+        for _ in range(args.runs):
+            tiempos = arrancar(urls, cache_path)
+            disco.append(tiempos['primera'])
+            memoria.append(tiempos['memoria'])
+
+    print(f"{'modo':<14} {'procesos':>8} {'p50 ms':>10} {'p95 ms':>10}")
+    print_result('sin caché', frio)
+    print_result('caché disco', disco)
+    print_result('en memoria', memoria)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
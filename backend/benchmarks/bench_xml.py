@@ -0,0 +1,80 @@
+"""
+Generación del XML de la factura: plantilla vs. árbol de lxml
+
+Uso (desde backend/):
+    python -m benchmarks.bench_xml
+    python -m benchmarks.bench_xml --items 5 50 500 --invoices 500
+
+Compara XMLGenerator.construir_factura (plantilla del emisor ya
+serializada, sin indentar) con construir_factura_arbol (elemento por
+elemento e indentado, como se generaba antes) para facturas de distinto
+número de detalles. Antes de medir verifica que ambos den el mismo
+documento en forma canónica (C14N) y byte a byte sin indentar.
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime
+
+from lxml import etree
+
+from benchmarks.bench_pos import percentile
+from benchmarks.sri_fixtures import sample_invoice_data
+from sri_xml_generator import XMLGenerator
+
+
+def c14n(xml):
+    return etree.tostring(etree.fromstring(xml.encode('utf-8')), method='c14n')
+
+
+def measure(build, facturas):
+    timings = []
+    start = time.perf_counter()
+    for datos_venta, datos_cliente, secuencial, fecha, clave in facturas:
+        t0 = time.perf_counter()
+        build(datos_venta, datos_cliente, secuencial, fecha, clave)
+        timings.append((time.perf_counter() - t0) * 1000)
+    elapsed = time.perf_counter() - start
+    return len(facturas) / elapsed, percentile(timings, 50), percentile(timings, 95)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark de generación del XML de factura')
+    parser.add_argument('--items', type=int, nargs='+', default=[5, 50, 500], help='detalles por factura')
+    parser.add_argument('--invoices', type=int, default=300)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(42)
+    fecha = datetime.now()
+    print(f"{'detalles':>8} {'modo':<18} {'facturas/s':>12} {'p50 ms':>10} {'p95 ms':>10} {'bytes':>9}")
+    for items in args.items:
+        facturas = []
+        for i in range(args.invoices):
+            datos_venta, datos_cliente = sample_invoice_data(items, rng)
+            datos_venta['info_adicional'] = [
+                {'nombre': 'Email', 'valor': 'cliente@example.com'},
+                {'nombre': 'Nota "especial"', 'valor': 'A < B & C > D'},
+            ]
+            facturas.append((datos_venta, datos_cliente, i + 1, fecha,
+                             XMLGenerator.generar_clave_acceso(fecha, i + 1)))
+
+        for factura in facturas[:20]:
+            plantilla = XMLGenerator.construir_factura(*factura)
+            arbol = XMLGenerator.construir_factura_arbol(*factura, pretty_print=False)
+            if plantilla != arbol or c14n(plantilla) != c14n(arbol):
+                print(f'❌ La plantilla no coincide con el árbol ({items} detalles)')
+                return 1
+
+        size_arbol = len(XMLGenerator.construir_factura_arbol(*facturas[0]).encode('utf-8'))
+        size_plantilla = len(XMLGenerator.construir_factura(*facturas[0]).encode('utf-8'))
+        rate_arbol, p50, p95 = measure(XMLGenerator.construir_factura_arbol, facturas)
+        print(f"{items:>8} {'árbol indentado':<18} {rate_arbol:>12.1f} {p50:>10.3f} {p95:>10.3f} {size_arbol:>9}")
+        rate, p50, p95 = measure(XMLGenerator.construir_factura, facturas)
+        print(f"{items:>8} {'plantilla':<18} {rate:>12.1f} {p50:>10.3f} {p95:>10.3f} {size_plantilla:>9}"
+              f"   x{rate / rate_arbol:.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Datos sintéticos para los benchmarks (determinísticos según la semilla)
+"""
+import hashlib
+import random
+from datetime import datetime, timedelta
+
+from branches import branch_worksheets
+from pos_backend import BUSINESS_TZ
+from sheets_emulator import INVENTORY_HEADERS, SALES_HEADERS, build_pos_spreadsheet
+
+# Tamaños de referencia: (productos, filas de ventas)
+PROFILES = {
+    'small': (100, 1_000),
+    'medium': (5_000, 100_000),
+    'large': (50_000, 1_000_000),
+}
+
+VENDEDORES = ['admin', 'cajero1', 'cajero2', 'cajero3']
+BENCH_PASSWORD = 'bench123'
+
+
+class NullPrinter:
+    """Impresora que no imprime, para correr sin hardware"""
+
+    def print_receipt(self, receipt_data):
+        return {'success': True, 'message': 'Impresión omitida'}
+
+
+def product_code(index):
+    return f'P{index:06d}'
+
+
+def make_products(count, rng):
+    rows = []
+    for i in range(1, count + 1):
+        costo = round(rng.uniform(0.2, 40), 2)
+        unidad = 'unidad' if rng.random() < 0.8 else 'kg'
+        rows.append([
+            i,
+            product_code(i),
+            f'Producto {i} {rng.choice(["Arroz", "Azúcar", "Aceite", "Jabón", "Café", "Atún"])}',
+            10_000_000,  # stock alto: los benchmarks de venta no deben agotarlo
+            unidad,
+            costo,
+            round(costo * 1.3, 2),
+            round(costo * 1.2, 2),
+            rng.randint(0, 20),
+            '2024-01-01 00:00:00'
+        ])
+    return rows
+
+
+def make_sales(count, products, rng, days=365):
+    """Filas de Ventas repartidas en los últimos `days` días hasta hoy"""
+    today = datetime.now(BUSINESS_TZ).replace(hour=8, minute=0, second=0, microsecond=0)
+    rows = []
+    sale_number = 0
+    while len(rows) < count:
+        sale_number += 1
+        moment = today - timedelta(days=rng.randrange(days), seconds=rng.randrange(12 * 3600))
+        fecha = moment.strftime('%Y-%m-%d')
+        hora = moment.strftime('%H:%M:%S')
+        vendedor = rng.choice(VENDEDORES)
+        lines = [rng.choice(products) for _ in range(rng.randint(1, 5))]
+        total = round(sum(p[6] for p in lines), 2)
+        for product in lines:
+            rows.append([
+                f'VTA-{moment.strftime("%Y%m%d")}-{sale_number:08x}',
+                fecha,
+                hora,
+                product[0],
+                product[1],
+                product[2],
+                1,
+                product[6],
+                product[6],
+                total,
+                vendedor,
+                product[5]
+            ])
+    rows = rows[:count]
+    # La hoja real es cronológica (append-only)
+    rows.sort(key=lambda r: (r[1], r[2]))
+    return rows
+
+
+def make_users():
+    hashed = hashlib.sha256(BENCH_PASSWORD.encode()).hexdigest()
+    return [
+        [i, name, hashed, 'admin' if name == 'admin' else 'vendedor', name.title(), 'Si', '']
+        for i, name in enumerate(VENDEDORES, start=1)
+    ]
+
+
+def build_dataset(products, sales, seed=42, branches=(), **options):
+    """
+    Libro emulado con `products` productos y `sales` filas de ventas
+
+    `branches` agrega las hojas de otras sucursales (mismo catálogo de
+    códigos, costos y ventas propios).
+    """
+    rng = random.Random(seed)
+    product_rows = make_products(products, rng)
+    sales_rows = make_sales(sales, product_rows, rng)
+    spreadsheet = build_pos_spreadsheet(
+        products=product_rows,
+        sales=sales_rows,
+        users=make_users(),
+        seed=seed,
+        **options
+    )
+    for branch in branches:
+        worksheets = branch_worksheets(branch)
+        branch_products = make_products(products, rng)
+        spreadsheet.add_worksheet(worksheets['inventory'], values=[INVENTORY_HEADERS] + branch_products)
+        spreadsheet.add_worksheet(worksheets['sales'], values=[SALES_HEADERS] + make_sales(sales, branch_products, rng))
+    return spreadsheet
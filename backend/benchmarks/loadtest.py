@@ -0,0 +1,235 @@
+"""
+Prueba de carga con N cajeros concurrentes contra la API Flask
+
+Levanta api_server bajo gunicorn con el emulador de Sheets (o usa un
+servidor ya corriendo con --url) y simula cajeros que inician sesión, buscan
+productos, registran ventas y consultan el panel. Por cada nivel de
+concurrencia reporta throughput, latencia de cola y tasa de error por
+endpoint.
+
+Uso (desde backend/):
+    python -m benchmarks.loadtest --concurrency 1 5 10 25 50 --duration 20
+    python -m benchmarks.loadtest --latency 0.15 --workers 4 --concurrency 4 8 16
+    python -m benchmarks.loadtest --worker-class gevent --workers 1 --concurrency 50 100 200
+    python -m benchmarks.loadtest --url http://localhost:5000 --username admin --password ...
+"""
+import argparse
+import json
+import os
+import random
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+from benchmarks.bench_pos import percentile
+from benchmarks.datasets import BENCH_PASSWORD, VENDEDORES, product_code
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Stats:
+    """Latencias y errores por endpoint, compartidos entre hilos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, endpoint, elapsed_ms, ok):
+        with self._lock:
+            self.latencies[endpoint].append(elapsed_ms)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def summary(self, duration):
+        report = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            report[endpoint] = {
+                'requests': len(values),
+                'rps': round(len(values) / duration, 2),
+                'p50_ms': round(percentile(values, 50), 1),
+                'p95_ms': round(percentile(values, 95), 1),
+                'p99_ms': round(percentile(values, 99), 1),
+                'max_ms': round(max(values), 1),
+                'error_rate': round(self.errors[endpoint] / len(values), 4)
+            }
+        return report
+
+
+class Cashier(threading.Thread):
+    """Un terminal de caja: login y luego ciclos de búsqueda + venta + panel"""
+
+    def __init__(self, base_url, stats, stop_event, args, seed):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.stats = stats
+        self.stop_event = stop_event
+        self.args = args
+        self.rng = random.Random(seed)
+        self.session = requests.Session()
+        self.username = args.username or self.rng.choice(VENDEDORES)
+
+    def _request(self, method, endpoint, path, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, self.base_url + path, timeout=self.args.timeout, **kwargs
+            )
+            ok = response.status_code < 400
+        except requests.RequestException:
+            response = None
+            ok = False
+        self.stats.record(endpoint, (time.perf_counter() - t0) * 1000, ok)
+        return response
+
+    def run(self):
+        self._request('POST', 'POST /api/auth/login', '/api/auth/login', json={
+            'username': self.username,
+            'password': self.args.password
+        })
+
+        iteration = 0
+        while not self.stop_event.is_set():
+            iteration += 1
+            cart = []
+            for _ in range(self.rng.randint(1, self.args.max_items)):
+                code = product_code(self.rng.randint(1, self.args.products))
+                self._request('GET', 'GET /api/product/<code>', f'/api/product/{code}')
+                cart.append({'codigo': code, 'cantidad_vendida': 1, 'tipoPrecio': 'precio_1'})
+
+            self._request('POST', 'POST /api/sale', '/api/sale', json={
+                'cart': cart,
+                'vendedor': self.username
+            })
+
+            if iteration % self.args.dashboard_every == 0:
+                self._request('GET', 'GET /api/sales/summary', '/api/sales/summary')
+                self._request('GET', 'GET /api/alerts', '/api/alerts')
+
+            if self.args.think_time:
+                self.stop_event.wait(self.rng.uniform(0, 2 * self.args.think_time))
+
+
+def start_server(args):
+    """Lanza gunicorn con el emulador y espera a que responda"""
+    env = dict(os.environ)
+    env.update({
+        'POS_SHEETS_BACKEND': 'emulator',
+        'POS_EMULATOR_PRODUCTS': str(args.products),
+        'POS_EMULATOR_SALES': str(args.sales),
+        'POS_EMULATOR_LATENCY': str(args.latency),
+        'SECRET_KEY': env.get('SECRET_KEY') or secrets.token_hex(32),
+        'GUNICORN_WORKERS': str(args.workers),
+        'GUNICORN_WORKER_CLASS': args.worker_class,
+    })
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py',
+         '--bind', f'127.0.0.1:{args.port}', 'api_server:app'],
+        cwd=BACKEND_DIR,
+        env=env
+    )
+
+    base_url = f'http://127.0.0.1:{args.port}'
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn terminó antes de iniciar')
+        try:
+            requests.get(base_url + '/api/auth/check', timeout=1)
+            return process, base_url
+        except requests.RequestException:
+            time.sleep(0.5)
+
+    process.terminate()
+    raise RuntimeError('gunicorn no respondió a tiempo')
+
+
+def run_step(base_url, concurrency, args):
+    stats = Stats()
+    stop_event = threading.Event()
+    cashiers = [
+        Cashier(base_url, stats, stop_event, args, seed=args.seed + i)
+        for i in range(concurrency)
+    ]
+
+    start = time.perf_counter()
+    for cashier in cashiers:
+        cashier.start()
+    stop_event.wait(args.duration)
+    stop_event.set()
+    for cashier in cashiers:
+        cashier.join(args.timeout + 5)
+    duration = time.perf_counter() - start
+
+    summary = stats.summary(duration)
+    total = sum(r['requests'] for r in summary.values())
+    return {
+        'concurrency': concurrency,
+        'duration_s': round(duration, 1),
+        'throughput_rps': round(total / duration, 2),
+        'endpoints': summary
+    }
+
+
+def print_step(step):
+    print(f"\n=== {step['concurrency']} cajeros - {step['throughput_rps']} req/s ===")
+    print(f"{'endpoint':<28} {'req':>6} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'error':>7}")
+    for endpoint, r in step['endpoints'].items():
+        print(f"{endpoint:<28} {r['requests']:>6} {r['rps']:>8.2f} {r['p50_ms']:>8.1f} "
+              f"{r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['error_rate']:>7.2%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Prueba de carga de cajeros concurrentes')
+    parser.add_argument('--url', help='servidor ya corriendo (si no, se lanza gunicorn con el emulador)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 5, 10, 25])
+    parser.add_argument('--duration', type=float, default=20, help='segundos por nivel de concurrencia')
+    parser.add_argument('--workers', type=int, default=4, help='workers de gunicorn')
+    parser.add_argument('--worker-class', default='sync', choices=['sync', 'gevent'],
+                        help='tipo de worker de gunicorn')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--sales', type=int, default=10000)
+    parser.add_argument('--latency', type=float, default=0.1, help='latencia simulada por llamada a Sheets (s)')
+    parser.add_argument('--username', help='usuario fijo (por defecto uno de los del emulador)')
+    parser.add_argument('--password', default=BENCH_PASSWORD)
+    parser.add_argument('--max-items', type=int, default=3)
+    parser.add_argument('--dashboard-every', type=int, default=5, help='consultar el panel cada N ventas')
+    parser.add_argument('--think-time', type=float, default=0.5, help='pausa media entre ventas (s)')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='guardar el reporte JSON en esta ruta')
+    args = parser.parse_args(argv)
+
+    process = None
+    base_url = args.url
+    if not base_url:
+        process, base_url = start_server(args)
+
+    try:
+        steps = []
+        for concurrency in args.concurrency:
+            step = run_step(base_url, concurrency, args)
+            print_step(step)
+            steps.append(step)
+    finally:
+        if process:
+            process.terminate()
+            process.wait(30)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'config': vars(args), 'steps': steps}, f, indent=2)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Datos de prueba para los benchmarks de facturación electrónica
+
+Genera un certificado .p12 autofirmado (para no depender del certificado
+real) y facturas sin firmar con el generador del SRI.
+"""
+import datetime
+import random
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.serialization import pkcs12
+from cryptography.x509.oid import NameOID
+
+from sri_xml_generator import XMLGenerator
+
+TEST_CERT_PASSWORD = 'bench123'
+
+
+def make_test_certificate(path, password=TEST_CERT_PASSWORD, key_size=2048):
+    """Escribe en `path` un .p12 autofirmado con llave RSA"""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=key_size)
+    name = x509.Name([
+        x509.NameAttribute(NameOID.COUNTRY_NAME, 'EC'),
+        x509.NameAttribute(NameOID.COMMON_NAME, 'POS BENCHMARK'),
+    ])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=365))
+        .sign(key, hashes.SHA256())
+    )
+    data = pkcs12.serialize_key_and_certificates(
+        b'pos-benchmark', key, certificate, None,
+        serialization.BestAvailableEncryption(password.encode('utf-8'))
+    )
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def sample_invoice_data(items=5, rng=None):
+    """(datos_venta, datos_cliente) con el formato de SRIManager.preparar_datos_*"""
+    rng = rng or random.Random(42)
+    detalle = []
+    subtotal = 0
+    for i in range(items):
+        cantidad = rng.randint(1, 5)
+        precio = round(rng.uniform(0.5, 40), 2)
+        total_linea = cantidad * precio
+        iva = total_linea * 0.15
+        subtotal += total_linea
+        detalle.append({
+            'codigo': f'P{i:06d}',
+            'descripcion': f'Producto {i} Azúcar & Café',
+            'cantidad': cantidad,
+            'precio_unitario': precio,
+            'descuento': 0.00,
+            'precio_total_sin_impuesto': total_linea,
+            'codigo_porcentaje_iva': '4',
+            'tarifa_iva': '15',
+            'valor_iva': iva
+        })
+    iva_total = subtotal * 0.15
+    datos_venta = {
+        'subtotal_sin_impuestos': subtotal,
+        'descuento_total': 0.00,
+        'iva_total': iva_total,
+        'total': subtotal + iva_total,
+        'codigo_porcentaje_iva': '4',
+        'forma_pago': '01',
+        'items': detalle,
+        'info_adicional': [
+            {'nombre': 'Vendedor', 'valor': 'cajero1'},
+            {'nombre': 'Email', 'valor': 'cliente@example.com'}
+        ]
+    }
+    datos_cliente = {
+        'tipo_identificacion': '05',
+        'identificacion': '1102762885',
+        'razon_social': 'CLIENTE DE PRUEBA',
+        'direccion': 'LOJA',
+        'email': 'cliente@example.com',
+        'telefono': ''
+    }
+    return datos_venta, datos_cliente
+
+
+def sample_invoices(count, items=5, seed=42):
+    """Lista de XML de facturas sin firmar"""
+    rng = random.Random(seed)
+    invoices = []
+    for secuencial in range(1, count + 1):
+        datos_venta, datos_cliente = sample_invoice_data(items, rng)
+        xml, _ = XMLGenerator.generar_factura_xml(datos_venta, datos_cliente, secuencial)
+        invoices.append(xml)
+    return invoices
+
+
+def sample_pos_sales(count, items=5, seed=42):
+    """Lista de (venta_pos, cliente) con el formato de la ruta de venta con factura"""
+    rng = random.Random(seed)
+    cliente = {
+        'identificacion': '1102762885',
+        'razon_social': 'CLIENTE DE PRUEBA',
+        'direccion': 'LOJA',
+        'email': 'cliente@example.com'
+    }
+    ventas = []
+    for i in range(count):
+        cart = [
+            {
+                'codigo': f'P{rng.randrange(100000):06d}',
+                'nombre': f'Producto {j} Azúcar & Café',
+                'cantidad_vendida': rng.randint(1, 5),
+                'precio': round(rng.uniform(0.5, 40), 2)
+            }
+            for j in range(items)
+        ]
+        ventas.append(({'cart': cart, 'vendedor': 'cajero1', 'sale_id': f'VTA-BENCH-{i:06d}', 'cliente': cliente}, cliente))
+    return ventas
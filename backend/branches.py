@@ -0,0 +1,173 @@
+"""
+Sucursales: inventario y ventas separados por establecimiento
+
+Cada sucursal (código de establecimiento del SRI, p. ej. '002') tiene sus
+propias hojas Inventario_002 y Ventas_002 en el mismo libro, sus cierres y su
+archivo de ventas. La sucursal principal (SRIConfig.CODIGO_ESTABLECIMIENTO)
+conserva los nombres originales (Inventario, Ventas). La hoja Usuarios es
+común a toda la cadena.
+
+Las ventas y consultas de stock de un servidor solo tocan su sucursal local.
+BranchNetwork consulta todas las sucursales en paralelo para los reportes
+consolidados de la cadena.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from cierres import ProfitAccumulator
+from config import SRIConfig
+
+DEFAULT_BRANCH = SRIConfig.CODIGO_ESTABLECIMIENTO
+
+
+def branch_worksheets(branch):
+    """Atributo de SheetsSession -> nombre de hoja para la sucursal"""
+    if branch == DEFAULT_BRANCH:
+        suffix = ''
+    else:
+        suffix = f'_{branch}'
+    return {
+        'inventory': f'Inventario{suffix}',
+        'sales': f'Ventas{suffix}',
+        'users': 'Usuarios',
+    }
+
+
+def branch_dir(base, branch):
+    """Directorio local de la sucursal (la principal usa `base` tal cual)"""
+    if branch == DEFAULT_BRANCH:
+        return base
+    return os.path.join(base, branch)
+
+
+def configured_branches():
+    """Códigos de POS_SUCURSALES ("001,002"); por defecto solo la principal"""
+    value = os.environ.get('POS_SUCURSALES', '')
+    branches = [code.strip() for code in value.split(',') if code.strip()]
+    return branches or [DEFAULT_BRANCH]
+
+
+class BranchNetwork:
+
+    def __init__(self, managers, local=None, max_workers=None):
+        """
+        Args:
+            managers: dict código de sucursal -> InventoryManager
+            local: sucursal de este servidor (por defecto la principal o la
+                primera configurada)
+            max_workers: consultas simultáneas (por defecto una por sucursal)
+        """
+        self.managers = dict(managers)
+        if local is None:
+            local = DEFAULT_BRANCH if DEFAULT_BRANCH in self.managers else next(iter(self.managers))
+        if local not in self.managers:
+            raise ValueError(f'La sucursal local {local} no está en POS_SUCURSALES')
+        self.local_branch = local
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or len(self.managers),
+            thread_name_prefix='sucursales'
+        )
+
+    @property
+    def local(self):
+        return self.managers[self.local_branch]
+
+    @property
+    def branches(self):
+        return sorted(self.managers)
+
+    def _fan_out(self, func):
+        """
+        Ejecuta func(manager) en todas las sucursales en paralelo
+
+        Returns:
+            dict código -> resultado; las sucursales que fallan se reportan
+            en el dict de errores en lugar de tumbar el reporte completo
+        """
+        futures = {
+            code: self._executor.submit(func, manager)
+            for code, manager in self.managers.items()
+        }
+        results, errors = {}, {}
+        for code, future in futures.items():
+            try:
+                results[code] = future.result()
+            except Exception as e:
+                errors[code] = str(e)
+        return results, errors
+
+    def get_stock(self, product_code):
+        """Stock de un producto en cada sucursal y total de la cadena"""
+        results, errors = self._fan_out(lambda m: m.get_product_by_code(product_code))
+
+        sucursales = []
+        total = 0
+        for code in sorted(results):
+            product = results[code]
+            if product is None:
+                continue
+            total += product['cantidad']
+            sucursales.append({
+                'sucursal': code,
+                'cantidad': product['cantidad'],
+                'unidad': product['unidad'],
+                'precio': product['precio'],
+                'minStock': product['minStock']
+            })
+
+        if not sucursales and not errors:
+            return None
+
+        return {
+            'codigo': product_code,
+            'nombre': next((results[s['sucursal']]['nombre'] for s in sucursales), None),
+            'total': round(total, 3),
+            'sucursales': sucursales,
+            'errores': errors
+        }
+
+    def get_profit_analysis(self, period='today', custom_start=None, custom_end=None):
+        """Utilidades de toda la cadena con el detalle por sucursal"""
+        period_range = self.local.period_range(period, custom_start, custom_end)
+        if period_range is None:
+            return {'success': False, 'error': 'Período no válido'}
+        start_date, end_date, period_label = period_range
+
+        results, errors = self._fan_out(lambda m: m.profit_accumulator(start_date, end_date))
+        if not results:
+            return {'success': False, 'error': 'Ninguna sucursal respondió', 'errores': errors}
+
+        consolidated = ProfitAccumulator(keep_detail=True)
+        sucursales = []
+        for code in sorted(results):
+            accumulator = results[code]
+            for line in accumulator.detalle:
+                line['sucursal'] = code
+            consolidated.merge(accumulator)
+
+            branch_result = accumulator.result(period_label)
+            sucursales.append({
+                'sucursal': code,
+                'total_ingresos': branch_result['total_ingresos'],
+                'total_costos': branch_result['total_costos'],
+                'utilidad_neta': branch_result['utilidad_neta'],
+                'margen_total': branch_result['margen_total'],
+                'total_ventas': branch_result['total_ventas']
+            })
+
+        data = consolidated.result(f'{period_label} - Todas las sucursales')
+        data['sucursales'] = sucursales
+        data['errores'] = errors
+
+        return {
+            'success': True,
+            'data': data
+        }
+
+    def get_low_stock_alerts(self):
+        """Alertas de stock bajo de todas las sucursales"""
+        results, errors = self._fan_out(lambda m: m.get_low_stock_alerts())
+        alerts = []
+        for code in sorted(results):
+            alerts.extend({**alert, 'sucursal': code} for alert in results[code])
+        return alerts, errors
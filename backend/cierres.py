@@ -0,0 +1,273 @@
+"""
+Cierres de caja diarios para reportes de utilidad de largo plazo
+
+Al cerrar un día se congelan sus totales, el detalle por producto y por
+vendedor en un archivo JSON (un archivo por fecha). Los reportes de varios
+días suman los cierres ya guardados y solo recorren las filas vivas de Ventas
+que todavía no tienen cierre (normalmente las de hoy), así su costo depende
+de la cantidad de días y no de la cantidad de ventas.
+"""
+import json
+import os
+from decimal import Decimal, ROUND_HALF_UP
+
+Q3 = Decimal("0.001")
+Q2 = Decimal("0.01")
+
+
+def _to_decimal(value):
+    return Decimal(str(value))
+
+
+class ProfitAccumulator:
+    """Acumula ingresos, costos y utilidad por producto y por vendedor"""
+
+    def __init__(self, keep_detail=False):
+        self.total_ingresos = Decimal("0.000")
+        self.total_costos = Decimal("0.000")
+        self.total_unidades = Decimal("0")
+        self.lineas = 0
+        self.productos = {}
+        self.vendedores = {}
+        self.keep_detail = keep_detail
+        self.detalle = []
+
+    def add_sale(self, sale, costo_unitario):
+        """Agrega una fila de Ventas con su costo unitario"""
+        codigo = sale['Codigo']
+        cantidad = _to_decimal(sale['Cantidad'])
+        precio_venta = _to_decimal(sale['PrecioUnitario'])
+        costo_unitario = _to_decimal(costo_unitario)
+        vendedor = sale.get('Vendedor', 'Sistema')
+
+        ingreso = (precio_venta * cantidad).quantize(Q3, ROUND_HALF_UP)
+        costo = (costo_unitario * cantidad).quantize(Q3, ROUND_HALF_UP)
+        utilidad = (ingreso - costo).quantize(Q3, ROUND_HALF_UP)
+        utilidad = utilidad.quantize(Q2, rounding=ROUND_HALF_UP)
+
+        self.total_ingresos += ingreso
+        self.total_costos += costo
+        self.total_unidades += cantidad
+        self.lineas += 1
+
+        if self.keep_detail:
+            self.detalle.append({
+                'fecha': sale['Fecha'],
+                'hora': sale['Hora'],
+                'producto': sale['Nombre'],
+                'cantidad': cantidad,
+                'precio_venta': precio_venta,
+                'costo_unitario': costo_unitario,
+                'ingreso': ingreso,
+                'costo': costo,
+                'utilidad': utilidad,
+                'vendedor': vendedor
+            })
+
+        self._add_producto(codigo, sale['Nombre'], cantidad, ingreso, costo, utilidad)
+        self._add_vendedor(vendedor, 1, ingreso, utilidad)
+
+    def _add_producto(self, codigo, nombre, cantidad, ingresos, costos, utilidad):
+        if codigo not in self.productos:
+            self.productos[codigo] = {
+                'producto': nombre,
+                'codigo': codigo,
+                'cantidad': 0,
+                'ingresos': 0,
+                'costos': 0,
+                'utilidad': 0
+            }
+        producto = self.productos[codigo]
+        producto['cantidad'] += cantidad
+        producto['ingresos'] += ingresos
+        producto['costos'] += costos
+        producto['utilidad'] += utilidad
+
+    def _add_vendedor(self, vendedor, ventas, ingresos, utilidad):
+        if vendedor not in self.vendedores:
+            self.vendedores[vendedor] = {
+                'vendedor': vendedor,
+                'ventas': 0,
+                'ingresos': 0,
+                'utilidad': 0
+            }
+        stats = self.vendedores[vendedor]
+        stats['ventas'] += ventas
+        stats['ingresos'] += ingresos
+        stats['utilidad'] += utilidad
+
+    def add_snapshot(self, snapshot):
+        """Suma un cierre diario ya guardado"""
+        totales = snapshot['totales']
+        self.total_ingresos += _to_decimal(totales['ingresos'])
+        self.total_costos += _to_decimal(totales['costos'])
+        self.total_unidades += _to_decimal(totales['unidades'])
+        self.lineas += totales['lineas']
+
+        for codigo, p in snapshot['productos'].items():
+            self._add_producto(
+                codigo, p['producto'], _to_decimal(p['cantidad']),
+                _to_decimal(p['ingresos']), _to_decimal(p['costos']), _to_decimal(p['utilidad'])
+            )
+        for vendedor, v in snapshot['vendedores'].items():
+            self._add_vendedor(
+                vendedor, v['ventas'], _to_decimal(v['ingresos']), _to_decimal(v['utilidad'])
+            )
+
+    def merge(self, other):
+        """Suma otro acumulador (p. ej. de otra sucursal)"""
+        self.total_ingresos += other.total_ingresos
+        self.total_costos += other.total_costos
+        self.total_unidades += other.total_unidades
+        self.lineas += other.lineas
+
+        for codigo, p in other.productos.items():
+            self._add_producto(codigo, p['producto'], p['cantidad'], p['ingresos'], p['costos'], p['utilidad'])
+        for vendedor, v in other.vendedores.items():
+            self._add_vendedor(vendedor, v['ventas'], v['ingresos'], v['utilidad'])
+        if self.keep_detail:
+            self.detalle.extend(other.detalle)
+
+    def to_snapshot(self, fecha, ultima_fila, cerrado_en):
+        """Cierre serializable (los Decimal se guardan como texto)"""
+        return {
+            'fecha': fecha,
+            'cerrado_en': cerrado_en,
+            'ultima_fila': ultima_fila,
+            'totales': {
+                'ingresos': str(self.total_ingresos),
+                'costos': str(self.total_costos),
+                'unidades': str(self.total_unidades),
+                'lineas': self.lineas
+            },
+            'productos': {
+                codigo: {k: str(v) if isinstance(v, Decimal) else v for k, v in p.items()}
+                for codigo, p in self.productos.items()
+            },
+            'vendedores': {
+                vendedor: {k: str(v) if isinstance(v, Decimal) else v for k, v in s.items()}
+                for vendedor, s in self.vendedores.items()
+            }
+        }
+
+    def result(self, period_label):
+        """Datos del reporte de utilidades (formato de get_profit_analysis)"""
+        utilidad_neta = (self.total_ingresos - self.total_costos).quantize(Q3, ROUND_HALF_UP)
+        margen_total = ((utilidad_neta / self.total_ingresos * 100)).quantize(Q3, ROUND_HALF_UP) if self.total_ingresos > 0 else Decimal("0.000")
+
+        # Convertir diccionarios a listas y ordenar
+        productos_list = sorted(self.productos.values(), key=lambda x: x['utilidad'], reverse=True)
+        vendedores_list = sorted(self.vendedores.values(), key=lambda x: x['ingresos'], reverse=True)
+
+        return {
+            'periodo': period_label,
+            'total_ingresos': round(self.total_ingresos, 2),
+            'total_costos': round(self.total_costos, 2),
+            'utilidad_neta': round(utilidad_neta, 2),
+            'margen_total': round(margen_total, 2),
+            'total_ventas': self.lineas,
+            'total_unidades': self.total_unidades,
+            'ticket_promedio': round(self.total_ingresos / self.lineas, 2) if self.lineas else 0,
+            'productos_vendidos': productos_list[:10],  # Top 10
+            'vendedores': vendedores_list,
+            'ventas_detalle': self.detalle
+        }
+
+
+class CierreStore:
+    """Cierres diarios guardados como JSON, uno por fecha (YYYY-MM-DD.json)"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, fecha):
+        return os.path.join(self.directory, f'{fecha}.json')
+
+    def get(self, fecha):
+        try:
+            with open(self._path(fecha), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, snapshot):
+        # Escritura atómica: otro worker nunca lee un cierre a medias
+        path = self._path(snapshot['fecha'])
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def dates(self):
+        return sorted(
+            name[:-5] for name in os.listdir(self.directory)
+            if name.endswith('.json')
+        )
+
+    def latest(self):
+        dates = self.dates()
+        return self.get(dates[-1]) if dates else None
+
+    # 'ultima_fila' cuenta también las filas que el archivado mensual ya
+    # borró de la hoja; fila en la hoja = ultima_fila - archived_rows()
+
+    def archived_rows(self):
+        try:
+            with open(os.path.join(self.directory, 'filas_archivadas'), 'r') as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def add_archived_rows(self, count):
+        self._set_archived_rows(self.archived_rows() + count)
+
+    def _set_archived_rows(self, total):
+        path = os.path.join(self.directory, 'filas_archivadas')
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(str(total))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    # Un archivado anota antes de borrar filas de la hoja cuántas borra y
+    # cuál es la primera; si el proceso muere entre el borrado y la suma de
+    # filas archivadas, el siguiente archivado ve el pendiente y decide con
+    # la hoja si el borrado ocurrió
+
+    def _pending_path(self):
+        return os.path.join(self.directory, 'archivado_pendiente.json')
+
+    def pending_archive(self):
+        """Borrado de filas archivadas sin confirmar o None"""
+        try:
+            with open(self._pending_path(), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def begin_archive(self, count, first_row):
+        path = self._pending_path()
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'filas': count,
+                'filas_archivadas_antes': self.archived_rows(),
+                'primera_fila': first_row
+            }, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def finish_archive(self, deleted):
+        """
+        Cierra el pendiente; si las filas se borraron de la hoja, fija el
+        total de filas archivadas (idempotente: repetirlo no suma dos veces)
+        """
+        pending = self.pending_archive()
+        if pending is None:
+            return
+        if deleted:
+            self._set_archived_rows(pending['filas_archivadas_antes'] + pending['filas'])
+        os.remove(self._pending_path())
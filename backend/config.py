@@ -28,13 +28,15 @@ class SRIConfig:
     # Tipo de emisión
     TIPO_EMISION_NORMAL = 1
     
-    # URLs del SRI
+    # URLs del SRI (SRI_URL_* apunta a otro servidor, p. ej. sri_emulator)
     if AMBIENTE_ACTUAL == AMBIENTE_PRUEBAS:
         URL_RECEPCION = "https://celcer.sri.gob.ec/comprobantes-electronicos-ws/RecepcionComprobantesOffline?wsdl"
         URL_AUTORIZACION = "https://celcer.sri.gob.ec/comprobantes-electronicos-ws/AutorizacionComprobantesOffline?wsdl"
     else:
         URL_RECEPCION = "https://cel.sri.gob.ec/comprobantes-electronicos-ws/RecepcionComprobantesOffline?wsdl"
         URL_AUTORIZACION = "https://cel.sri.gob.ec/comprobantes-electronicos-ws/AutorizacionComprobantesOffline?wsdl"
+    URL_RECEPCION = os.environ.get('SRI_URL_RECEPCION', URL_RECEPCION)
+    URL_AUTORIZACION = os.environ.get('SRI_URL_AUTORIZACION', URL_AUTORIZACION)
     
     # Certificado digital
     CERTIFICADO_PATH = "certificado.p12"
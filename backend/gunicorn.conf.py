@@ -0,0 +1,47 @@
+"""
+Configuración de gunicorn para el backend del POS
+"""
+import os
+import shutil
+
+bind = "0.0.0.0:5000"
+workers = int(os.environ.get("GUNICORN_WORKERS", 4))
+
+# Modo asíncrono (experimental): con GUNICORN_WORKER_CLASS=gevent cada worker
+# atiende cientos de peticiones a la vez. gunicorn aplica el monkey patching de
+# gevent antes de cargar la app, así que los sockets de gspread/requests
+# (Sheets), zeep (SRI) y escpos (impresora de red) ceden el control mientras
+# esperan la red, y los flock de stock y archivado esperan con time.sleep.
+# Siguen bloqueando todo el worker: sqlite3 (xml_archive y la caché de WSDL),
+# los fsync de cierres/secuenciales/archivo y el trabajo de CPU (firma,
+# reportes). Por eso el valor por defecto, también en docker-compose, es sync;
+# compararlo antes con benchmarks.loadtest (sync contra gevent).
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "sync")
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 500))
+
+# Workers con hilos: con GUNICORN_THREADS > 1 gunicorn usa la clase gthread y
+# cada worker atiende esa cantidad de peticiones a la vez. Los locks de stock
+# (Lock por hilo + flock entre workers) y el pool de clientes de Sheets ya
+# están pensados para varios hilos por proceso.
+threads = int(os.environ.get("GUNICORN_THREADS", 1))
+
+# Las consultas al SRI pueden tardar; en modo sync el timeout por defecto (30 s)
+# mataría al worker durante la espera de autorización
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+
+# Directorio compartido donde cada worker publica sus métricas
+PROMETHEUS_MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+
+def on_starting(server):
+    """Limpia métricas de una ejecución anterior antes de lanzar los workers"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+        os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Marca como muerto al worker para que sus gauges no se sigan sumando"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
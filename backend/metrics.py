@@ -0,0 +1,161 @@
+"""
+Métricas estilo Prometheus para el backend del POS
+
+Con gunicorn cada worker es un proceso distinto. Si la variable
+PROMETHEUS_MULTIPROC_DIR está definida, prometheus_client escribe los valores
+de cada worker en ese directorio y /metrics los agrega todos (ver
+gunicorn.conf.py para la limpieza del directorio y de los workers muertos).
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Buckets pensados para llamadas de red lentas (Sheets, SRI, impresora)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+HTTP_REQUEST_LATENCY = Histogram(
+    'pos_http_request_duration_seconds',
+    'Latencia de las peticiones HTTP por ruta',
+    ['method', 'route', 'status'],
+    buckets=LATENCY_BUCKETS
+)
+
+SHEETS_CALLS = Counter(
+    'pos_sheets_api_calls_total',
+    'Llamadas a la API de Google Sheets por operación',
+    ['worksheet', 'operation']
+)
+
+SHEETS_CALL_LATENCY = Histogram(
+    'pos_sheets_api_call_duration_seconds',
+    'Latencia de las llamadas a la API de Google Sheets',
+    ['operation'],
+    buckets=LATENCY_BUCKETS
+)
+
+SHEETS_CALL_ERRORS = Counter(
+    'pos_sheets_api_errors_total',
+    'Llamadas a Google Sheets que terminaron en excepción',
+    ['operation']
+)
+
+SRI_CALL_LATENCY = Histogram(
+    'pos_sri_soap_duration_seconds',
+    'Latencia de las llamadas SOAP a los web services del SRI',
+    ['service', 'operation', 'result'],
+    buckets=LATENCY_BUCKETS
+)
+
+PRINTER_JOB_LATENCY = Histogram(
+    'pos_printer_job_duration_seconds',
+    'Duración de los trabajos de impresión de recibos',
+    ['result'],
+    buckets=LATENCY_BUCKETS
+)
+
+LANE_REJECTIONS = Counter(
+    'pos_lane_rejections_total',
+    'Peticiones rechazadas con 429 por carril de prioridad saturado',
+    ['lane']
+)
+
+CACHE_REQUESTS = Counter(
+    'pos_cache_requests_total',
+    'Consultas a cachés internos (hit/miss) para calcular el ratio de aciertos',
+    ['cache', 'result']
+)
+
+
+@contextmanager
+def observe(histogram, **labels):
+    """Mide la duración del bloque y la registra en el histograma,
+    etiquetada con result=ok/error según termine o lance excepción.
+    """
+    start = time.perf_counter()
+    result = 'ok'
+    try:
+        yield
+    except Exception:
+        result = 'error'
+        raise
+    finally:
+        histogram.labels(result=result, **labels).observe(time.perf_counter() - start)
+
+
+def record_cache(cache, hit):
+    """Registra un acierto o fallo de caché"""
+    CACHE_REQUESTS.labels(cache=cache, result='hit' if hit else 'miss').inc()
+
+
+class InstrumentedWorksheet:
+    """Envuelve un gspread.Worksheet y cuenta/mide cada llamada a la API.
+
+    Los atributos que no son métodos (title, id, ...) se devuelven sin medir.
+    """
+
+    def __init__(self, worksheet, name=None):
+        self._worksheet = worksheet
+        self._name = name or getattr(worksheet, 'title', 'desconocida')
+
+    def __getattr__(self, attr):
+        value = getattr(self._worksheet, attr)
+        if not callable(value):
+            return value
+
+        def wrapper(*args, **kwargs):
+            SHEETS_CALLS.labels(worksheet=self._name, operation=attr).inc()
+            start = time.perf_counter()
+            try:
+                return value(*args, **kwargs)
+            except Exception:
+                SHEETS_CALL_ERRORS.labels(operation=attr).inc()
+                raise
+            finally:
+                SHEETS_CALL_LATENCY.labels(operation=attr).observe(time.perf_counter() - start)
+
+        return wrapper
+
+
+def render_metrics():
+    """Devuelve (payload, content_type) con las métricas de todos los workers"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        from prometheus_client import REGISTRY as registry
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def init_app(app):
+    """Registra la medición de latencia por ruta y el endpoint /metrics"""
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_latency(response):
+        start = getattr(g, '_metrics_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            HTTP_REQUEST_LATENCY.labels(
+                method=request.method,
+                route=route,
+                status=str(response.status_code)
+            ).observe(time.perf_counter() - start)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        payload, content_type = render_metrics()
+        return Response(payload, mimetype=content_type)
@@ -1,17 +1,50 @@
 from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from functools import wraps
 import gspread
+from gspread.utils import numericise, numericise_all, rowcol_to_a1
 from oauth2client.service_account import ServiceAccountCredentials
+import fcntl
 import hashlib
-from datetime import datetime
+import os
+from datetime import date, datetime, timedelta
 from zoneinfo import ZoneInfo
+import threading
+import time
 import uuid
+import zlib
 
 # Printer
 from escpos.printer import Network
-from decimal import Decimal, ROUND_HALF_UP
+
+from branches import DEFAULT_BRANCH, branch_dir, branch_worksheets
+from cierres import CierreStore, ProfitAccumulator
+from metrics import PRINTER_JOB_LATENCY, observe, record_cache
+from product_search import ProductIndex
+from sheets_pool import SheetsClientPool
+from tracing import tracer
+from ventas_archive import VentasArchive
 
 BUSINESS_TZ = ZoneInfo("America/Guayaquil")
 
+# Espera entre intentos de flock cuando otro worker tiene el archivo
+LOCK_RETRY_INTERVAL = 0.01
+
+
+def _flock_exclusive(fd):
+    """
+    flock exclusivo que espera con time.sleep en vez de bloquear en el
+    kernel (como admission.Lane): con workers gevent el sleep cede el
+    control a las demás peticiones del worker y un flock bloqueante
+    detendría todo el proceso mientras otro worker habla con Sheets
+    """
+    while True:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            time.sleep(LOCK_RETRY_INTERVAL)
+
 
 class ReceiptPrinter: 
     def __init__(self):
@@ -37,95 +70,219 @@ class ReceiptPrinter:
             return {'success': False, 'error': 'Printer not initialized'}
         
         try:
-            business = receipt_data['business']
-            sale = receipt_data['sale']
-            items = receipt_data['items']
-            totals = receipt_data['totals']
-            
-            # Set encoding
-            self.printer.charcode('USA')
-            
-            # Header - Centered
-            self.printer.set(align='center', text_type='B', width=2, height=2)
-            self.printer.text(f"{business['name']}\n")
-            
-            self.printer.set(align='center', text_type='normal', width=1, height=1)
-            self.printer.text(f"{business['address']}\n")
-            self.printer.text(f"{business['RUC']}\n")
-
-            # Separator
-            self.printer.text("================================\n")
-            
-            # Sale Info - Left aligned
-            self.printer.set(align='left')
-            self.printer.text(f"Fecha: {sale['fecha']} {sale['hora']}\n")          
-            self.printer.text("--------------------------------\n")
-            
-            # Items Header
-            self.printer.set(text_type='B')
-            self.printer.text(f"{'Producto':<20} {'Cant':>4} {'Total':>8}\n")
-            self.printer.set(text_type='normal')
-            self.printer.text("--------------------------------\n")
-            
-            # Items
-            for item in items:
-                # Product name (can wrap if long)
-                name = item['product_name'][:20]
-                self.printer.text(f"{name:<20}\n")
-                
-                # Quantity, price, total
-                qty = item['quantity_sold']
-                price = item['price']
-                total = price * qty
-                self.printer.text(f"  ${price:.2f} x {qty:>2}        ${total:>7.2f}\n")
-            
-            self.printer.text("================================\n")
-            
-            # Totals
-            self.printer.set(text_type='B', width=2, height=2)
-            self.printer.text(f"TOTAL:          ${totals['total']:>8.2f}\n")
-            
-            #self.printer.set(text_type='normal', width=1, height=1)
-            #if totals['received'] > 0:
-            #    self.printer.text(f"Recibido:       ${totals['received']:>8.2f}\n")
-            #    self.printer.text(f"Cambio:         ${totals['change']:>8.2f}\n")
-            
-            self.printer.text("--------------------------------\n")
-            
-            # Footer - Centered
-            self.printer.set(align='center')
-            self.printer.text("\n")
-            self.printer.set(text_type='B')
-            self.printer.text("¡Gracias por su compra!\n")
-            self.printer.text("\n")
-            
-            # Cut paper
-            self.printer.cut()
+            with observe(PRINTER_JOB_LATENCY):
+                self._print(receipt_data)
             
             return {'success': True, 'message': 'Receipt printed successfully'}
             
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
-class InventoryManager:
-    def __init__(self, credentials_file, spreadsheet_name):
-        scope = ['https://spreadsheets.google.com/feeds',
-                 'https://www.googleapis.com/auth/drive']
+    def _print(self, receipt_data):
+        """Send the receipt to the printer"""
+        business = receipt_data['business']
+        sale = receipt_data['sale']
+        items = receipt_data['items']
+        totals = receipt_data['totals']
+        
+        # Set encoding
+        self.printer.charcode('USA')
         
-        creds = ServiceAccountCredentials.from_json_keyfile_name(
-            credentials_file, scope
-        )
-        self.client = gspread.authorize(creds)
-        self.spreadsheet = self.client.open(spreadsheet_name)
-        self.sheet_inventory = self.spreadsheet.worksheet('Inventario')
-        self.sheet_sales = self.spreadsheet.worksheet('Ventas')
-        self.sheet_users = self.spreadsheet.worksheet('Usuarios')  # Nueva hoja
-        self.printer = ReceiptPrinter()
+        # Header - Centered
+        self.printer.set(align='center', text_type='B', width=2, height=2)
+        self.printer.text(f"{business['name']}\n")
+        
+        self.printer.set(align='center', text_type='normal', width=1, height=1)
+        self.printer.text(f"{business['address']}\n")
+        self.printer.text(f"{business['RUC']}\n")
+
+        # Separator
+        self.printer.text("================================\n")
+        
+        # Sale Info - Left aligned
+        self.printer.set(align='left')
+        self.printer.text(f"Fecha: {sale['fecha']} {sale['hora']}\n")          
+        self.printer.text("--------------------------------\n")
+        
+        # Items Header
+        self.printer.set(text_type='B')
+        self.printer.text(f"{'Producto':<20} {'Cant':>4} {'Total':>8}\n")
+        self.printer.set(text_type='normal')
+        self.printer.text("--------------------------------\n")
+        
+        # Items
+        for item in items:
+            # Product name (can wrap if long)
+            name = item['product_name'][:20]
+            self.printer.text(f"{name:<20}\n")
+            
+            # Quantity, price, total
+            qty = item['quantity_sold']
+            price = item['price']
+            total = price * qty
+            self.printer.text(f"  ${price:.2f} x {qty:>2}        ${total:>7.2f}\n")
+        
+        self.printer.text("================================\n")
+        
+        # Totals
+        self.printer.set(text_type='B', width=2, height=2)
+        self.printer.text(f"TOTAL:          ${totals['total']:>8.2f}\n")
+        
+        #self.printer.set(text_type='normal', width=1, height=1)
+        #if totals['received'] > 0:
+        #    self.printer.text(f"Recibido:       ${totals['received']:>8.2f}\n")
+        #    self.printer.text(f"Cambio:         ${totals['change']:>8.2f}\n")
+        
+        self.printer.text("--------------------------------\n")
+        
+        # Footer - Centered
+        self.printer.set(align='center')
+        self.printer.text("\n")
+        self.printer.set(text_type='B')
+        self.printer.text("¡Gracias por su compra!\n")
+        self.printer.text("\n")
+        
+        # Cut paper
+        self.printer.cut()
+
+def uses_sheets(method):
+    """Asigna un cliente del pool al hilo durante la operación.
+
+    Las llamadas anidadas (process_sale -> update_stock) reutilizan el mismo
+    cliente; otro hilo obtiene el suyo.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if getattr(self._local, 'session', None) is not None:
+            return method(self, *args, **kwargs)
+        with self.pool.checkout() as session:
+            self._local.session = session
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self._local.session = None
+    return wrapper
+
+
+class InventoryManager:
+    # Locks por franja de código para serializar lectura-modificación-escritura
+    # del stock: un Lock entre hilos del proceso y un flock() entre los
+    # workers de gunicorn (archivos stock-<franja>.lock en POS_LOCKS_DIR)
+    STOCK_LOCK_STRIPES = 64
+
+    def __init__(self, credentials_file=None, spreadsheet_name=None, spreadsheet=None,
+                 printer=None, pool_size=4, cierres_dir=None, archive_dir=None,
+                 branch=None):
+        """
+        Args:
+            credentials_file: JSON de la cuenta de servicio de Google
+            spreadsheet_name: nombre del libro en Google Sheets
+            spreadsheet: libro ya abierto (p. ej. sheets_emulator.EmulatedSpreadsheet);
+                si se pasa, no se usan credenciales
+            printer: impresora de recibos; por defecto ReceiptPrinter()
+            pool_size: clientes de Google Sheets que pueden usarse a la vez
+            cierres_dir: directorio de los cierres diarios (POS_CIERRES_DIR)
+            archive_dir: directorio del archivo mensual de Ventas (POS_ARCHIVE_DIR)
+            branch: código de establecimiento de la sucursal (por defecto la
+                principal); define sus hojas y sus directorios locales
+        """
+        if spreadsheet is None:
+            scope = ['https://spreadsheets.google.com/feeds',
+                     'https://www.googleapis.com/auth/drive']
+            
+            creds = ServiceAccountCredentials.from_json_keyfile_name(
+                credentials_file, scope
+            )
+
+            def open_spreadsheet():
+                # Un cliente (y sesión HTTP keep-alive) por entrada del pool
+                return gspread.authorize(creds).open(spreadsheet_name)
+        else:
+            def open_spreadsheet():
+                return spreadsheet
+
+        self.branch = branch or DEFAULT_BRANCH
+        self.pool = SheetsClientPool(open_spreadsheet, size=pool_size,
+                                     worksheets=branch_worksheets(self.branch))
+        self.pool.prefill(1)
+        self._local = threading.local()
+        self._stock_locks = [threading.Lock() for _ in range(self.STOCK_LOCK_STRIPES)]
+        self.locks_dir = branch_dir(os.environ.get('POS_LOCKS_DIR', '/tmp/pos_locks'), self.branch)
+        os.makedirs(self.locks_dir, exist_ok=True)
+        self.printer = printer or ReceiptPrinter()
+        self.cierres = CierreStore(branch_dir(
+            cierres_dir or os.environ.get('POS_CIERRES_DIR', 'cierres'), self.branch))
+        self.archive = VentasArchive(branch_dir(
+            archive_dir or os.environ.get('POS_ARCHIVE_DIR', 'archivo_ventas'), self.branch))
+        # La hoja Ventas ya tiene el encabezado CostoUnitario (columna 12)
+        self._sales_cost_header = False
+        self.search_index = ProductIndex()
+        # Segundos antes de recargar el índice (cambios de otros workers o
+        # ediciones directas en la hoja)
+        self.search_refresh = float(os.environ.get('POS_SEARCH_REFRESH', 60))
+        self._search_refreshing = threading.Lock()
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            raise RuntimeError('Acceso a Google Sheets fuera de una operación @uses_sheets')
+        return session
+
+    @property
+    def sheet_inventory(self):
+        return self._session().inventory
+
+    @property
+    def sheet_sales(self):
+        return self._session().sales
+
+    @property
+    def sheet_users(self):
+        return self._session().users
+
+    def _run_with_session(self, session, func, *args, **kwargs):
+        """Ejecuta func en otro hilo prestándole un cliente ya tomado"""
+        self._local.session = session
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self._local.session = None
+
+    @contextmanager
+    def _archive_lock(self):
+        """flock entre workers sobre el archivo de Ventas de la sucursal"""
+        fd = os.open(os.path.join(self.archive.directory, 'archivado.lock'),
+                     os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            _flock_exclusive(fd)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _stock_stripe(self, product_code):
+        # crc32 y no hash(): la franja de un código debe ser la misma en
+        # todos los workers (hash() de str cambia por proceso)
+        return zlib.crc32(str(product_code).encode('utf-8')) % self.STOCK_LOCK_STRIPES
+
+    @contextmanager
+    def _stock_lock(self, *stripes):
+        """Toma las franjas en orden (Lock del hilo y flock entre workers)"""
+        with ExitStack() as stack:
+            for stripe in sorted(stripes):
+                stack.enter_context(self._stock_locks[stripe])
+                fd = os.open(os.path.join(self.locks_dir, f'stock-{stripe}.lock'),
+                             os.O_RDWR | os.O_CREAT, 0o644)
+                stack.callback(os.close, fd)
+                _flock_exclusive(fd)
+                stack.callback(fcntl.flock, fd, fcntl.LOCK_UN)
+            yield
     
     def hash_password(self, password):
         """Hash de contraseña con SHA256"""
         return hashlib.sha256(password.encode()).hexdigest()
     
+    @uses_sheets
     def create_user(self, username, password, role='vendedor', nombre=''):
         """Crea un nuevo usuario"""
         try:
@@ -169,6 +326,7 @@ class InventoryManager:
                 'error': str(e)
             }
     
+    @uses_sheets
     def authenticate_user(self, username, password):
         """Autentica un usuario"""
         try:
@@ -206,6 +364,7 @@ class InventoryManager:
                 'error': str(e)
             }
     
+    @uses_sheets
     def get_all_users(self):
         """Obtiene todos los usuarios (sin passwords)"""
         try:
@@ -233,11 +392,13 @@ class InventoryManager:
                 'error': str(e)
             }
 
+    @uses_sheets
     def get_inventory(self):
         """Obtiene todo el inventario"""
         records = self.sheet_inventory.get_all_records()
         return records
     
+    @uses_sheets
     def add_product(self, product_data):
         """Agrega un nuevo producto a la hoja de Inventario"""
         try:
@@ -268,6 +429,7 @@ class InventoryManager:
             
             # Insertar el producto
             self.sheet_inventory.append_row(row)
+            self.search_index.upsert(self._product_from_row([str(v) for v in row]))
             
             return {
                 'success': True,
@@ -283,69 +445,134 @@ class InventoryManager:
                 'message': f'Error al agregar producto: {str(e)}'
             }
     
+    @staticmethod
+    def _product_from_row(row):
+        """Fila de Inventario (valores como texto) -> dict del producto"""
+        # Columnas: ID, Codigo, Nombre, Cantidad, Unidad, Costo, Precio_1, Precio_2, MinStock
+        return {
+            'id': row[0],
+            'codigo': row[1],
+            'nombre': row[2],
+            'cantidad': float(row[3]),
+            'unidad': row[4],
+            'precio': float(row[6]),
+            'precio_2': float(row[7] or 0),
+            'minStock': float(row[8])
+        }
+
+    @uses_sheets
     def get_product_by_code(self, code):
         """Busca un producto por código"""
         try:
             cell = self.sheet_inventory.find(code)
             row = self.sheet_inventory.row_values(cell.row)
-            return {
-                'id': row[0],
-                'codigo': row[1],
-                'nombre': row[2],
-                'cantidad': int(row[3]),
-                'precio': float(row[4]),
-                'minStock': int(row[5])
-            }
+            return self._product_from_row(row)
         except:
             return None
+
+    @uses_sheets
+    def refresh_search_index(self):
+        """Reconstruye el índice de búsqueda con una sola lectura de Inventario"""
+        values = self.sheet_inventory.get_all_values()
+        products = []
+        for row in values[1:]:
+            try:
+                products.append(self._product_from_row(row))
+            except (IndexError, ValueError):
+                continue  # filas incompletas o en edición
+        self.search_index.build(products, built_at=time.monotonic())
+        return len(products)
+
+    def _refresh_search_index_background(self):
+        if not self._search_refreshing.acquire(blocking=False):
+            return  # ya hay una recarga en curso
+
+        def refresh():
+            try:
+                self.refresh_search_index()
+            except Exception as e:
+                print(f"Error recargando índice de búsqueda: {e}")
+            finally:
+                self._search_refreshing.release()
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def search_products(self, query, limit=10):
+        """
+        Búsqueda de productos mientras se escribe (código, nombre, aproximada)
+
+        La primera búsqueda construye el índice; después se recarga en segundo
+        plano cada POS_SEARCH_REFRESH segundos sin bloquear las consultas.
+        """
+        built_at = self.search_index.built_at
+        record_cache('busqueda_productos', built_at is not None)
+        if built_at is None:
+            with self._search_refreshing:
+                if self.search_index.built_at is None:
+                    self.refresh_search_index()
+        elif time.monotonic() - built_at > self.search_refresh:
+            self._refresh_search_index_background()
+        return self.search_index.search(query, limit)
     
+    @uses_sheets
     def update_stock(self, product_code, quantity_sold, price_type):
         """Actualiza el stock después de una venta"""
+        with self._stock_lock(self._stock_stripe(product_code)):
+            return self._update_stock(product_code, quantity_sold, price_type)
+
+    def _update_stock(self, product_code, quantity_sold, price_type):
         try:
             print("Actualizando stock...")
 
-            # Buscar el producto
-            cell = self.sheet_inventory.find(product_code)
-            row = cell.row
-            
-            print("No product")
+            with tracer.span('stock_lookup', codigo=product_code):
+                # Buscar el producto
+                cell = self.sheet_inventory.find(product_code)
+                row = cell.row
+                
+                print("No product")
 
-            # Obtener datos del producto
-            product_id = self.sheet_inventory.cell(row, 1).value
-            product_name = self.sheet_inventory.cell(row, 3).value
-            current_qty = float(self.sheet_inventory.cell(row, 4).value)
-            unidad = self.sheet_inventory.cell(row, 5).value.lower()
-            price_1 = float(self.sheet_inventory.cell(row, 7).value)
-            price_2 = float(self.sheet_inventory.cell(row, 8).value)
-            min_stock = float(self.sheet_inventory.cell(row, 9).value)
-            quantity_sold = float(quantity_sold)
+                # Obtener datos del producto (una sola lectura de la fila)
+                # Columnas: ID, Codigo, Nombre, Cantidad, Unidad, Costo, Precio_1, Precio_2, MinStock
+                values = self.sheet_inventory.row_values(row)
+                product_id = values[0]
+                product_name = values[2]
+                current_qty = float(values[3])
+                unidad = values[4].lower()
+                unit_cost = float(values[5] or 0)
+                price_1 = float(values[6])
+                price_2 = float(values[7] or 0)
+                min_stock = float(values[8])
+                quantity_sold = float(quantity_sold)
 
             print("Datos obtenidos")
             
-            if unidad == "unidad" and not quantity_sold.is_integer():
-                print("Unidad is not integer")
-                return {
-                    'success': False,
-                    'error': 'Este producto solo se puede vender en unidades enteras'
-                }
+            with tracer.span('stock_validation', codigo=product_code):
+                if unidad == "unidad" and not quantity_sold.is_integer():
+                    print("Unidad is not integer")
+                    return {
+                        'success': False,
+                        'error': 'Este producto solo se puede vender en unidades enteras'
+                    }
 
-            # Verificar si hay suficiente stock
-            if current_qty < quantity_sold:
-                print("Datos obtenidos")
-                return {
-                    'success': False,
-                    'error': 'Stock insuficiente'
-                }
+                # Verificar si hay suficiente stock
+                if current_qty < quantity_sold:
+                    print("Datos obtenidos")
+                    return {
+                        'success': False,
+                        'error': 'Stock insuficiente'
+                    }
             
             # Calcular nueva cantidad
             new_qty = round(current_qty - quantity_sold, 3)
             
-            # Actualizar en la hoja
-            self.sheet_inventory.update_cell(row, 4, new_qty)
-            
-            # Actualizar timestamp
-            timestamp = datetime.now(BUSINESS_TZ).strftime('%Y-%m-%d %H:%M:%S')
-            self.sheet_inventory.update_cell(row, 10, timestamp)
+            with tracer.span('stock_write', codigo=product_code):
+                # Actualizar en la hoja
+                self.sheet_inventory.update_cell(row, 4, new_qty)
+                
+                # Actualizar timestamp
+                timestamp = datetime.now(BUSINESS_TZ).strftime('%Y-%m-%d %H:%M:%S')
+                self.sheet_inventory.update_cell(row, 10, timestamp)
+                self.search_index.update_fields(values[1], cantidad=new_qty)
             
             # Verificar si requiere alerta
             alert = new_qty <= min_stock
@@ -365,6 +592,7 @@ class InventoryManager:
                     'product_code': product_code,
                     'product_name': product_name,
                     'price': selected_price,
+                    'cost': unit_cost,
                     'quantity_sold':quantity_sold,
                     'new_quantity': new_qty,
                     'alert': alert
@@ -376,6 +604,107 @@ class InventoryManager:
                 'error': str(e)
             }
         
+    @uses_sheets
+    def adjust_stock(self, lines):
+        """
+        Aplica en lote ingresos de mercadería y ajustes por conteo físico
+
+        Args:
+            lines: lista de dicts con 'codigo' y 'delta' (suma/resta a la
+                cantidad actual) o 'cantidad' (conteo absoluto)
+
+        Returns:
+            dict con el resultado por línea. Las líneas inválidas se reportan
+            y no impiden aplicar las demás.
+        """
+        # Solo las franjas de los códigos del lote (sin repetir)
+        stripes = {self._stock_stripe(str(line.get('codigo', ''))) for line in lines}
+        with self._stock_lock(*stripes):
+            return self._adjust_stock(lines)
+
+    def _adjust_stock(self, lines):
+        try:
+            # Una sola lectura de la hoja (incluye encabezado)
+            values = self.sheet_inventory.get_all_values()
+            rows_by_code = {}
+            for index, row in enumerate(values[1:], start=2):
+                if len(row) > 1 and row[1] != '':
+                    rows_by_code[str(row[1])] = (index, row)
+
+            timestamp = datetime.now(BUSINESS_TZ).strftime('%Y-%m-%d %H:%M:%S')
+            pending = {}  # fila -> cantidad nueva (acumula líneas repetidas)
+            results = []
+
+            for line in lines:
+                codigo = str(line.get('codigo', ''))
+                result = {'codigo': codigo, 'success': False}
+                results.append(result)
+
+                if codigo not in rows_by_code:
+                    result['error'] = 'Producto no encontrado'
+                    continue
+
+                row_number, row = rows_by_code[codigo]
+                try:
+                    current_qty = pending.get(row_number, float(row[3] or 0))
+                    if 'cantidad' in line:
+                        new_qty = float(line['cantidad'])
+                    elif 'delta' in line:
+                        new_qty = current_qty + float(line['delta'])
+                    else:
+                        result['error'] = "Se requiere 'delta' o 'cantidad'"
+                        continue
+                except (TypeError, ValueError):
+                    result['error'] = 'Cantidad no válida'
+                    continue
+
+                new_qty = round(new_qty, 3)
+                unidad = row[4].lower() if len(row) > 4 else ''
+
+                if unidad == 'unidad' and not new_qty.is_integer():
+                    result['error'] = 'Este producto solo maneja unidades enteras'
+                    continue
+
+                if new_qty < 0:
+                    result['error'] = 'El stock no puede quedar negativo'
+                    continue
+
+                pending[row_number] = new_qty
+                result.update({
+                    'success': True,
+                    'product_name': row[2],
+                    'previous_quantity': current_qty,
+                    'new_quantity': new_qty
+                })
+
+            # Escribir todas las filas tocadas en una sola llamada
+            if pending:
+                updates = []
+                for row_number, new_qty in pending.items():
+                    updates.append({'range': f'D{row_number}', 'values': [[new_qty]]})
+                    updates.append({'range': f'J{row_number}', 'values': [[timestamp]]})
+                self.sheet_inventory.batch_update(updates, value_input_option='USER_ENTERED')
+                for row_number, new_qty in pending.items():
+                    self.search_index.update_fields(values[row_number - 1][1], cantidad=new_qty)
+
+            applied = sum(1 for r in results if r['success'])
+
+            return {
+                'success': True,
+                'applied': applied,
+                'failed': len(results) - applied,
+                'products_updated': len(pending),
+                'timestamp': timestamp,
+                'results': results
+            }
+
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    @uses_sheets
     def save_sale(self, sale_id, cart_items, total, vendedor='Sistema'):
         """Guarda el detalle de la venta en la hoja de Ventas"""
         try:
@@ -397,10 +726,13 @@ class InventoryManager:
                     item['price'],
                     item['price'] * item['quantity_sold'],  # Subtotal
                     total,
-                    vendedor
+                    vendedor,
+                    item.get('cost', '')  # CostoUnitario al momento de la venta
                 ]
                 rows.append(row)
             print(f'Filas para insertar: {rows}')
+            if not self._sales_cost_header:
+                self._ensure_sales_cost_header()
             # Insertar todas las filas de la venta
             self.sheet_sales.append_rows(rows)
             
@@ -416,9 +748,27 @@ class InventoryManager:
                 'error': str(e)
             }
         
+    def _ensure_sales_cost_header(self):
+        """
+        Sin el encabezado CostoUnitario, get_all_records() descarta la
+        columna 12 y el costo que guarda save_sale no se usa en los reportes
+        """
+        headers = self.sheet_sales.row_values(1)
+        if 'CostoUnitario' not in headers and len(headers) <= 11:
+            self.sheet_sales.update_cell(1, 12, 'CostoUnitario')
+        self._sales_cost_header = True
+
+    @uses_sheets
     def process_sale(self, cart_items, vendedor='Sistema'):
         """Procesa una venta completa"""
+        with tracer.trace('process_sale', items=len(cart_items), vendedor=vendedor) as trace:
+            result = self._process_sale(cart_items, vendedor)
+            trace.set('success', result['success'])
+            if result['success']:
+                trace.set('sale_id', result['sale_id'])
+            return result
 
+    def _process_sale(self, cart_items, vendedor):
         sale_id = f"VTA-{datetime.now(BUSINESS_TZ).strftime('%Y%m%d')}-{str(uuid.uuid4())[:8]}"
 
         results = []
@@ -455,6 +805,7 @@ class InventoryManager:
                 'product_code': result['product_code'],
                 'product_name': result['product_name'],
                 'price': result['price'],
+                'cost': result['cost'],
                 'quantity_sold': result['quantity_sold']
             })
             
@@ -486,13 +837,18 @@ class InventoryManager:
             }
         }
 
-        with ThreadPoolExecutor(max_workers=2) as executor:
+        with tracer.span('history_append', rows=len(sale_details)), \
+                ThreadPoolExecutor(max_workers=2) as executor:
             # Submit both tasks receipt
             #print_future = executor.submit(
             #    self.printer.print_receipt, 
             #    receipt_data
             #)
+            # El hilo actual solo espera el resultado, así que el hilo del
+            # executor puede usar su mismo cliente sin tomar otro del pool
             save_future = executor.submit(
+                self._run_with_session,
+                self._session(),
                 self.save_sale, 
                 sale_id, 
                 sale_details, 
@@ -528,16 +884,30 @@ class InventoryManager:
             'alerts': alerts
         }
     
+    @uses_sheets
     def get_sales_history(self, limit=None, date_from=None, date_to=None):
-        """Obtiene el historial de ventas con filtros opcionales"""
+        """
+        Obtiene el historial de ventas con filtros opcionales
+
+        Combina los meses archivados que caen en el rango con la hoja viva.
+        """
         try:
-            records = self.sheet_sales.get_all_records()
+            archived_months = self.archive.months()
+            live_needed = not (date_to and archived_months and date_to[:7] <= archived_months[-1])
+            records = self.sheet_sales.get_all_records() if live_needed else []
             
             # Filtrar por fecha si se especifica
             if date_from:
                 records = [r for r in records if r['Fecha'] >= date_from]
             if date_to:
                 records = [r for r in records if r['Fecha'] <= date_to]
+
+            # Completar con el archivo (solo lo que falta para el límite)
+            if archived_months and not (date_from and date_from[:7] > archived_months[-1]):
+                if limit and len(records) < limit:
+                    records = self.archive.query(date_from, date_to, limit - len(records)) + records
+                elif not limit:
+                    records = self.archive.query(date_from, date_to) + records
             
             # Limitar cantidad de resultados
             if limit:
@@ -548,14 +918,18 @@ class InventoryManager:
             print(f"Error obteniendo historial: {e}")
             return []
     
+    @uses_sheets
     def get_sales_summary(self, date=None):
         """Obtiene un resumen de ventas del día"""
         try:
             if date is None:
                 date = datetime.now(BUSINESS_TZ).strftime('%Y-%m-%d')
             
-            records = self.sheet_sales.get_all_records()
-            daily_sales = [r for r in records if r['Fecha'] == date]
+            if self.archive.has_month(date[:7]):
+                daily_sales = self.archive.query(date, date)
+            else:
+                records = self.sheet_sales.get_all_records()
+                daily_sales = [r for r in records if r['Fecha'] == date]
             
             if not daily_sales:
                 return {
@@ -584,6 +958,7 @@ class InventoryManager:
                 'error': str(e)
             }
             
+    @uses_sheets
     def get_low_stock_alerts(self):
         """Obtiene todos los productos con stock bajo"""
         records = self.get_inventory()
@@ -600,155 +975,386 @@ class InventoryManager:
         
         return alerts
 
-    def get_profit_analysis(self, period='today', custom_start=None, custom_end=None):
-        """Analiza las utilidades para cierre de caja por período"""
+    def _get_sales_since(self, first_row):
+        """
+        Filas de Ventas desde first_row
+
+        Los números de fila son absolutos: incluyen las filas que el archivado
+        mensual ya borró de la hoja (como 'ultima_fila' de los cierres).
+
+        Returns:
+            lista de (número de fila, registro) con el mismo formato que
+            get_all_records()
+        """
+        archived = self.cierres.archived_rows()
+        headers = self.sheet_sales.row_values(1)
+        sheet_row = max(first_row - archived, 2)
+        last_column = rowcol_to_a1(1, len(headers))[:-1]
+        values = self.sheet_sales.get(f"A{sheet_row}:{last_column}")
+        records = []
+        for offset, row in enumerate(values):
+            row = list(row) + [''] * (len(headers) - len(row))
+            records.append((archived + sheet_row + offset, dict(zip(headers, numericise_all(row)))))
+        return records
+
+    @staticmethod
+    def _code_key(code):
+        """
+        Código como clave de diccionario: get_all_records() convierte los
+        códigos numéricos (p. ej. EAN) a int y get_all_values() los deja como
+        texto; ambos se llevan a la misma forma
+        """
+        return str(numericise(code)) if isinstance(code, str) else str(code)
+
+    def _get_costs(self):
+        """Diccionario código (ver _code_key) -> costo actual del inventario"""
+        inventory = self.sheet_inventory.get_all_records()
+        return {self._code_key(item['Codigo']): float(item.get('Costo', 0) or 0) for item in inventory}
+
+    def _sale_costs(self, sales):
+        """
+        Costo unitario de cada venta: el guardado en la fila (CostoUnitario) o,
+        para filas antiguas sin costo, el costo actual del inventario. El
+        inventario solo se descarga si alguna fila lo necesita.
+        """
+        costs = []
+        costs_dict = None
+        for sale in sales:
+            cost = sale.get('CostoUnitario', '')
+            if cost == '':
+                if costs_dict is None:
+                    costs_dict = self._get_costs()
+                cost = costs_dict.get(self._code_key(sale['Codigo']), 0)
+            costs.append(cost)
+        return costs
+
+    @uses_sheets
+    def backfill_sale_costs(self):
+        """
+        Completa CostoUnitario en las filas de Ventas que no lo tienen, con el
+        costo actual del inventario (no existe otro dato para ventas antiguas).
+        Escribe toda la columna en una sola llamada.
+        """
         try:
-            from datetime import datetime, timedelta
-            
-            # Obtener ventas e inventario
-            sales = self.sheet_sales.get_all_records()
-            inventory = self.sheet_inventory.get_all_records()
+            values = self.sheet_sales.get_all_values()
+            if not values:
+                return {'success': True, 'updated': 0}
 
-            print(sales)
-            print(inventory)
-            
-            # Diccionario de costos
-            costs_dict = {item['Codigo']: float(item.get('Costo', 0)) for item in inventory}
-            
-            # Determinar rango de fechas según período
-            now = datetime.now(BUSINESS_TZ)
-            
-            if period == 'today':
-                start_date = now.replace(hour=0, minute=0, second=0)
-                end_date = now.replace(hour=23, minute=59, second=59)
-                period_label = f"Hoy - {now.strftime('%d/%m/%Y')}"
-                
-            elif period == 'week':
-                # Inicio de semana (lunes)
-                start_date = now - timedelta(days=now.weekday())
-                start_date = start_date.replace(hour=0, minute=0, second=0)
-                end_date = now.replace(hour=23, minute=59, second=59)
-                period_label = f"Esta Semana ({start_date.strftime('%d/%m')} - {end_date.strftime('%d/%m/%Y')})"
-                
-            elif period == 'month':
-                # Inicio de mes
-                start_date = now.replace(day=1, hour=0, minute=0, second=0)
-                end_date = now.replace(hour=23, minute=59, second=59)
-                period_label = f"Este Mes - {now.strftime('%B %Y')}"
-                
-            elif period == 'custom' and custom_start and custom_end:
-                start_date = datetime.strptime(custom_start, '%Y-%m-%d')
-                end_date = datetime.strptime(custom_end, '%Y-%m-%d')
-                end_date = end_date.replace(hour=23, minute=59, second=59)
-                period_label = f"{start_date.strftime('%d/%m/%Y')} - {end_date.strftime('%d/%m/%Y')}"
+            headers = values[0]
+            if 'CostoUnitario' in headers:
+                column = headers.index('CostoUnitario') + 1
             else:
-                return {'success': False, 'error': 'Período no válido'}
-            
-            # Filtrar ventas por período
-            filtered_sales = []
-            for sale in sales:
+                column = len(headers) + 1
+            code_index = headers.index('Codigo')
+
+            costs_dict = self._get_costs()
+            column_values = [['CostoUnitario']]
+            updated = 0
+            for row in values[1:]:
+                current = row[column - 1] if len(row) >= column else ''
+                if current == '':
+                    current = costs_dict.get(self._code_key(row[code_index]), '')
+                    if current != '':
+                        updated += 1
+                column_values.append([current])
+
+            letter = rowcol_to_a1(1, column)[:-1]
+            self.sheet_sales.batch_update([{
+                'range': f'{letter}1:{letter}{len(column_values)}',
+                'values': column_values
+            }], value_input_option='USER_ENTERED')
+
+            return {
+                'success': True,
+                'updated': updated,
+                'rows': len(values) - 1
+            }
+
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    @uses_sheets
+    def close_days(self, through=None):
+        """
+        Cierre de caja: congela los días completos que aún no tienen cierre
+
+        Lee solo las filas de Ventas posteriores al último cierre (o toda la
+        hoja la primera vez) y guarda un cierre por cada día hasta `through`
+        (YYYY-MM-DD, por defecto ayer), incluidos los días sin ventas.
+        """
+        try:
+            today = datetime.now(BUSINESS_TZ).date()
+            through = date.fromisoformat(through) if through else today - timedelta(days=1)
+            if through >= today:
+                return {'success': False, 'error': 'Solo se pueden cerrar días completos'}
+
+            if self.cierres.pending_archive() is not None:
+                # Archivado interrumpido: sin confirmarlo las filas archivadas
+                # no cuadran con la hoja
+                with self._archive_lock():
+                    self._recover_archive()
+
+            latest = self.cierres.latest()
+            if latest and latest['fecha'] >= through.isoformat():
+                return {'success': True, 'closed': []}
+
+            last_row = latest['ultima_fila'] if latest else 1
+            rows = self._get_sales_since(last_row + 1)
+
+            # Agrupar por día (la hoja se llena en orden cronológico)
+            by_day = {}
+            for row_number, sale in rows:
+                fecha = str(sale.get('Fecha', ''))
+                if fecha > through.isoformat():
+                    break
+                by_day.setdefault(fecha, []).append((row_number, sale))
+
+            if latest:
+                day = date.fromisoformat(latest['fecha']) + timedelta(days=1)
+            elif by_day:
+                day = date.fromisoformat(min(by_day))
+            else:
+                day = through
+
+            cerrado_en = datetime.now(BUSINESS_TZ).strftime('%Y-%m-%d %H:%M:%S')
+            closed = []
+
+            while day <= through:
+                fecha = day.isoformat()
+                accumulator = ProfitAccumulator()
+                day_rows = by_day.get(fecha, [])
+                day_sales = [sale for _, sale in day_rows]
+                for (row_number, sale), cost in zip(day_rows, self._sale_costs(day_sales)):
+                    accumulator.add_sale(sale, cost)
+                    last_row = max(last_row, row_number)
+
+                self.cierres.save(accumulator.to_snapshot(fecha, last_row, cerrado_en))
+                closed.append(fecha)
+                day += timedelta(days=1)
+
+            return {'success': True, 'closed': closed}
+
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    @uses_sheets
+    def archive_sales(self, through=None):
+        """
+        Mueve los meses cerrados de Ventas al archivo local
+
+        Args:
+            through: último mes a archivar (YYYY-MM, por defecto el anterior);
+                el mes en curso nunca se archiva
+
+        Antes se cierran los días pendientes, porque los cierres se calculan
+        con las filas de la hoja. Las filas archivadas se borran de la hoja
+        con una sola llamada.
+
+        Todo ocurre con un flock en el directorio del archivo: dos workers
+        nunca leen el mismo bloque inicial ni lo borran dos veces. Antes de
+        borrar se comprueba que cada venta del bloque quedó en el archivo y se
+        anota el borrado en los cierres (ver CierreStore.begin_archive).
+        """
+        with self._archive_lock():
+            try:
+                self._recover_archive()
+
+                current_month = datetime.now(BUSINESS_TZ).strftime('%Y-%m')
+                if through is None:
+                    first_day = datetime.now(BUSINESS_TZ).date().replace(day=1)
+                    through = (first_day - timedelta(days=1)).strftime('%Y-%m')
+                if through >= current_month:
+                    return {'success': False, 'error': 'Solo se pueden archivar meses cerrados'}
+
+                closing = self.close_days()
+                if not closing['success']:
+                    return closing
+
+                values = self.sheet_sales.get_all_values()
+                if len(values) < 2:
+                    return {'success': True, 'rows': 0, 'months': {}}
+                headers = values[0]
+                date_index = headers.index('Fecha')
+
+                # La hoja está en orden cronológico: se archiva el bloque inicial
+                by_month = {}
+                count = 0
+                for row in values[1:]:
+                    month = row[date_index][:7] if len(row) > date_index else ''
+                    if not month or month > through:
+                        break
+                    by_month.setdefault(month, []).append(row)
+                    count += 1
+
+                if not count:
+                    return {'success': True, 'rows': 0, 'months': {}}
+
+                id_index = headers.index('VentaID')
+                months = {}
+                for month, rows in by_month.items():
+                    self.archive.write_month(month, headers, rows)
+                    archived_ids = self.archive.sale_ids(month)
+                    if any(row[id_index] not in archived_ids for row in rows):
+                        return {'success': False, 'error': f'El archivo de {month} no contiene todas las ventas; no se borró la hoja'}
+                    months[month] = len(rows)
+
+                self.cierres.begin_archive(count, self._trim_row(values[1]))
+                self.sheet_sales.delete_rows(2, count + 1)
+                self.cierres.finish_archive(deleted=True)
+
+                return {
+                    'success': True,
+                    'rows': count,
+                    'months': months
+                }
+
+            except Exception as e:
+                return {
+                    'success': False,
+                    'error': str(e)
+                }
+
+    @staticmethod
+    def _trim_row(row):
+        """Fila como la devuelve row_values() (sin celdas vacías al final)"""
+        row = [str(value) for value in row]
+        while row and row[-1] == '':
+            row.pop()
+        return row
+
+    def _recover_archive(self):
+        """
+        Confirma un archivado que murió entre anotar el borrado y sumar las
+        filas archivadas (llamar con _archive_lock tomado). Si la primera fila
+        de la hoja ya no es la anotada, el borrado ocurrió.
+        """
+        pending = self.cierres.pending_archive()
+        if pending is None:
+            return
+        deleted = self._trim_row(self.sheet_sales.row_values(2)) != pending['primera_fila']
+        self.cierres.finish_archive(deleted)
+        print(f"⚠️  Archivado interrumpido recuperado: {pending['filas']} filas "
+              f"{'borradas' if deleted else 'sin borrar'} de la hoja")
+
+    def get_cierre(self, fecha):
+        """Cierre guardado de un día o None"""
+        snapshot = self.cierres.get(fecha)
+        record_cache('cierres', snapshot is not None)
+        return snapshot
+
+    def period_range(self, period='today', custom_start=None, custom_end=None):
+        """
+        Rango de fechas de un período de reporte
+
+        Returns:
+            (inicio, fin, etiqueta) o None si el período no es válido
+        """
+        now = datetime.now(BUSINESS_TZ)
+        
+        if period == 'today':
+            start_date = now.replace(hour=0, minute=0, second=0)
+            end_date = now.replace(hour=23, minute=59, second=59)
+            period_label = f"Hoy - {now.strftime('%d/%m/%Y')}"
+            
+        elif period == 'week':
+            # Inicio de semana (lunes)
+            start_date = now - timedelta(days=now.weekday())
+            start_date = start_date.replace(hour=0, minute=0, second=0)
+            end_date = now.replace(hour=23, minute=59, second=59)
+            period_label = f"Esta Semana ({start_date.strftime('%d/%m')} - {end_date.strftime('%d/%m/%Y')})"
+            
+        elif period == 'month':
+            # Inicio de mes
+            start_date = now.replace(day=1, hour=0, minute=0, second=0)
+            end_date = now.replace(hour=23, minute=59, second=59)
+            period_label = f"Este Mes - {now.strftime('%B %Y')}"
+            
+        elif period == 'custom' and custom_start and custom_end:
+            start_date = datetime.strptime(custom_start, '%Y-%m-%d').replace(tzinfo=BUSINESS_TZ)
+            end_date = datetime.strptime(custom_end, '%Y-%m-%d')
+            end_date = end_date.replace(hour=23, minute=59, second=59, tzinfo=BUSINESS_TZ)
+            period_label = f"{start_date.strftime('%d/%m/%Y')} - {end_date.strftime('%d/%m/%Y')}"
+        else:
+            return None
+
+        return start_date, end_date, period_label
+
+    @uses_sheets
+    def profit_accumulator(self, start_date, end_date):
+        """
+        ProfitAccumulator con las ventas entre start_date y end_date
+
+        Los días anteriores a hoy se toman de los cierres diarios (se crean
+        los que falten) y solo se leen las filas vivas de hoy, así que el
+        detalle incluye únicamente las ventas de hoy.
+        """
+        now = datetime.now(BUSINESS_TZ)
+        today = now.date()
+        yesterday = today - timedelta(days=1)
+        accumulator = ProfitAccumulator(keep_detail=True)
+
+        # Cerrar los días completos pendientes (normalmente ninguno o ayer)
+        closing = self.close_days()
+        if not closing['success']:
+            raise RuntimeError(closing['error'])
+
+        # Días completos: desde los cierres
+        if start_date.date() <= yesterday:
+            day = start_date.date()
+            while day <= min(end_date.date(), yesterday):
+                snapshot = self.cierres.get(day.isoformat())
+                record_cache('cierres', snapshot is not None)
+                if snapshot:
+                    accumulator.add_snapshot(snapshot)
+                day += timedelta(days=1)
+
+        # Hoy: filas vivas posteriores al último cierre
+        if end_date.date() >= today:
+            latest = self.cierres.get(yesterday.isoformat())
+            first_row = latest['ultima_fila'] + 1 if latest else 2
+            day_start = max(start_date, now.replace(hour=0, minute=0, second=0, microsecond=0))
+            live_sales = []
+            for _, sale in self._get_sales_since(first_row):
                 try:
                     sale_datetime = datetime.strptime(
                         f"{sale['Fecha']} {sale['Hora']}",
                         '%Y-%m-%d %H:%M:%S'
                     ).replace(tzinfo=BUSINESS_TZ)
-                    
-                    if start_date <= sale_datetime <= end_date:
-                        filtered_sales.append(sale)
-                except:
+                except (KeyError, ValueError):
                     continue
-            print("filtered sales")
-            print(filtered_sales)
-
-            # Calcular totales
-            total_ingresos = Decimal("0.000")
-            total_costos = Decimal("0.000")
-            total_unidades = Decimal("0")
-            ventas_detalle = []
-            productos_vendidos = {}
-            vendedores_stats = {}
-            
-            for sale in filtered_sales:
-                codigo = sale['Codigo']
-                cantidad = Decimal(str(sale['Cantidad']))
-                precio_venta = Decimal(str(sale['PrecioUnitario']))
-                costo_unitario = Decimal(str(costs_dict.get(codigo, 0)))
-                vendedor = sale.get('Vendedor', 'Sistema')
-                
-                ingreso = (precio_venta * cantidad).quantize(Decimal("0.001"), ROUND_HALF_UP)
-                costo = (costo_unitario * cantidad).quantize(Decimal("0.001"), ROUND_HALF_UP)
-                utilidad = (ingreso - costo).quantize(Decimal("0.001"), ROUND_HALF_UP)
-                
-                utilidad = utilidad.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
 
-                
-                total_ingresos += ingreso
-                total_costos += costo
-                total_unidades += cantidad
-                
-                # Detalle de venta
-                ventas_detalle.append({
-                    'fecha': sale['Fecha'],
-                    'hora': sale['Hora'],
-                    'producto': sale['Nombre'],
-                    'cantidad': cantidad,
-                    'precio_venta': precio_venta,
-                    'costo_unitario': costo_unitario,
-                    'ingreso': ingreso,
-                    'costo': costo,
-                    'utilidad': utilidad,
-                    'vendedor': vendedor
-                })
-                
-                # Agrupar por producto
-                if codigo not in productos_vendidos:
-                    productos_vendidos[codigo] = {
-                        'producto': sale['Nombre'],
-                        'codigo': codigo,
-                        'cantidad': 0,
-                        'ingresos': 0,
-                        'costos': 0,
-                        'utilidad': 0
-                    }
-                productos_vendidos[codigo]['cantidad'] += cantidad
-                productos_vendidos[codigo]['ingresos'] += ingreso
-                productos_vendidos[codigo]['costos'] += costo
-                productos_vendidos[codigo]['utilidad'] += utilidad
-                
-                # Estadísticas por vendedor
-                if vendedor not in vendedores_stats:
-                    vendedores_stats[vendedor] = {
-                        'vendedor': vendedor,
-                        'ventas': 0,
-                        'ingresos': 0,
-                        'utilidad': 0
-                    }
-                vendedores_stats[vendedor]['ventas'] += 1
-                vendedores_stats[vendedor]['ingresos'] += ingreso
-                vendedores_stats[vendedor]['utilidad'] += utilidad
-            
-            utilidad_neta = (total_ingresos - total_costos).quantize(Decimal("0.001"), ROUND_HALF_UP)
-            margen_total = ((utilidad_neta / total_ingresos * 100)).quantize(Decimal("0.001"), ROUND_HALF_UP)if total_ingresos > 0 else Decimal("0.000")
-            
-            # Convertir diccionarios a listas y ordenar
-            productos_list = sorted(productos_vendidos.values(), key=lambda x: x['utilidad'], reverse=True)
-            vendedores_list = sorted(vendedores_stats.values(), key=lambda x: x['ingresos'], reverse=True)
-            
+                if day_start <= sale_datetime <= end_date:
+                    live_sales.append(sale)
+
+            for sale, cost in zip(live_sales, self._sale_costs(live_sales)):
+                accumulator.add_sale(sale, cost)
+
+        return accumulator
+
+    def get_profit_analysis(self, period='today', custom_start=None, custom_end=None):
+        """
+        Analiza las utilidades para cierre de caja por período
+
+        'ventas_detalle' incluye únicamente las ventas de hoy (los días
+        anteriores salen de los cierres diarios).
+        """
+        try:
+            period_range = self.period_range(period, custom_start, custom_end)
+            if period_range is None:
+                return {'success': False, 'error': 'Período no válido'}
+            start_date, end_date, period_label = period_range
+
+            accumulator = self.profit_accumulator(start_date, end_date)
+
             return {
                 'success': True,
-                'data': {
-                    'periodo': period_label,
-                    'total_ingresos': round(total_ingresos, 2),
-                    'total_costos': round(total_costos, 2),
-                    'utilidad_neta': round(utilidad_neta, 2),
-                    'margen_total': round(margen_total, 2),
-                    'total_ventas': len(filtered_sales),
-                    'total_unidades': total_unidades,
-                    'ticket_promedio': round(total_ingresos / len(filtered_sales), 2) if filtered_sales else 0,
-                    'productos_vendidos': productos_list[:10],  # Top 10
-                    'vendedores': vendedores_list,
-                    'ventas_detalle': ventas_detalle
-                }
+                'data': accumulator.result(period_label)
             }
             
         except Exception as e:
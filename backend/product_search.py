@@ -0,0 +1,204 @@
+"""
+Índice en memoria para la búsqueda de productos mientras se escribe
+
+Soporta, en orden de relevancia:
+    - código exacto y prefijo de código ("P0012" -> P00123, P00124...)
+    - prefijo de palabras del nombre ("arr fl" -> "Arroz Flor 1kg")
+    - coincidencia aproximada por trigramas para errores de tipeo ("arros")
+
+Las búsquedas no distinguen mayúsculas ni tildes ("azucar" encuentra
+"Azúcar"). Códigos y palabras se guardan en listas ordenadas y los prefijos
+se resuelven con búsqueda binaria, así una consulta no recorre el catálogo.
+"""
+import bisect
+import threading
+import unicodedata
+from collections import namedtuple
+
+# Candidatos revisados por cada resultado pedido
+CANDIDATES_PER_RESULT = 20
+# Fracción mínima de trigramas compartidos para la búsqueda aproximada
+FUZZY_THRESHOLD = 0.4
+
+
+def normalize(text):
+    """minúsculas y sin tildes: 'Azúcar Ñ' -> 'azucar n'"""
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return text.casefold()
+
+
+def tokenize(text):
+    return [t for t in ''.join(c if c.isalnum() else ' ' for c in normalize(text)).split() if t]
+
+
+def trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# Estado completo del índice. Se publica como una sola referencia: una
+# búsqueda concurrente con build/upsert ve todo el índice anterior o todo el
+# nuevo, nunca palabras nuevas con nombres viejos
+_Snapshot = namedtuple('_Snapshot', [
+    'products',  # código -> producto
+    'names',     # código -> palabras normalizadas del nombre
+    'codes',     # (código normalizado, código)
+    'tokens',    # (palabra normalizada, código)
+    'trigrams',  # trigrama -> set de palabras (vocabulario)
+])
+
+
+def _prefix_range(ordered, prefix):
+    """Índices [inicio, fin) de las entradas que empiezan con prefix"""
+    start = bisect.bisect_left(ordered, (prefix,))
+    end = bisect.bisect_left(ordered, (prefix + '\uffff',))
+    return start, end
+
+
+class ProductIndex:
+    """
+    Índice de productos por código y nombre
+
+    Los productos son dicts con el formato de get_product_by_code ('codigo',
+    'nombre', 'cantidad', ...). Las lecturas no toman lock: cada cambio
+    arma un _Snapshot nuevo (sin modificar el anterior) y lo publica de una
+    vez; el lock solo ordena a los que escriben.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = _Snapshot({}, {}, [], [], {})
+        self.built_at = None
+
+    def __len__(self):
+        return len(self._snapshot.products)
+
+    def build(self, products, built_at=None):
+        """Reconstruye el índice completo (reemplazo atómico)"""
+        by_code = {str(p['codigo']): p for p in products if str(p.get('codigo', '')) != ''}
+        names = {code: tokenize(p.get('nombre', '')) for code, p in by_code.items()}
+        codes = sorted((normalize(code), code) for code in by_code)
+        tokens = sorted({(token, code) for code, words in names.items() for token in words})
+        grams = {}
+        for token in {token for token, _ in tokens}:
+            for gram in trigrams(token):
+                grams.setdefault(gram, set()).add(token)
+
+        with self._lock:
+            self._snapshot = _Snapshot(by_code, names, codes, tokens, grams)
+            self.built_at = built_at
+
+    def upsert(self, product):
+        """Agrega o reemplaza un producto (p. ej. después de add_product)"""
+        code = str(product['codigo'])
+        with self._lock:
+            current = self._snapshot
+            products = dict(current.products)
+            previous = products.get(code)
+            products[code] = product
+
+            codes = current.codes
+            if previous is None:
+                codes = list(codes)
+                bisect.insort(codes, (normalize(code), code))
+
+            names = dict(current.names)
+            names[code] = tokenize(product.get('nombre', ''))
+
+            tokens = current.tokens
+            grams = current.trigrams
+            old_tokens = set(current.names.get(code, ()))
+            new_tokens = set(names[code])
+            if old_tokens != new_tokens:
+                tokens = [entry for entry in tokens if entry[1] != code or entry[0] in new_tokens]
+                # Copia superficial: solo se reemplazan los sets que cambian.
+                # Las palabras que quedan sin productos siguen en el
+                # vocabulario pero ya no devuelven resultados
+                grams = dict(grams)
+                for token in new_tokens - old_tokens:
+                    bisect.insort(tokens, (token, code))
+                    for gram in trigrams(token):
+                        if token not in grams.get(gram, ()):
+                            grams[gram] = grams.get(gram, set()) | {token}
+
+            self._snapshot = _Snapshot(products, names, codes, tokens, grams)
+
+    def update_fields(self, code, **fields):
+        """Actualiza datos que no afectan la búsqueda (cantidad, precios)"""
+        code = str(code)
+        with self._lock:
+            current = self._snapshot
+            product = current.products.get(code)
+            if product is not None:
+                products = dict(current.products)
+                products[code] = {**product, **fields}
+                self._snapshot = current._replace(products=products)
+
+    def search(self, query, limit=10):
+        """
+        Productos ordenados por relevancia
+
+        Returns:
+            lista de dicts del producto con 'score' (mayor es mejor)
+        """
+        terms = tokenize(query)
+        if not terms or limit <= 0:
+            return []
+
+        # Una sola lectura del estado: todo lo que sigue usa el mismo índice
+        products, names, codes, tokens, grams = self._snapshot
+        scores = {}
+
+        # Cuántos candidatos se revisan por resultado pedido: los prefijos
+        # muy comunes ("a") no recorren todo el catálogo
+        max_candidates = limit * CANDIDATES_PER_RESULT
+
+        # Código: exacto o prefijo (la consulta completa, sin espacios)
+        code_query = ''.join(terms)
+        start, end = _prefix_range(codes, code_query)
+        for normalized, code in codes[start:min(end, start + max_candidates)]:
+            scores[code] = 100 if normalized == code_query else 80 - min(len(normalized) - len(code_query), 10)
+
+        # Nombre: cada término es prefijo de alguna palabra. Los candidatos
+        # salen del término con menos coincidencias (el más selectivo)
+        ranges = {term: _prefix_range(tokens, term) for term in terms}
+        anchor = min(terms, key=lambda term: ranges[term][1] - ranges[term][0])
+        start, end = ranges[anchor]
+        for token, code in tokens[start:min(end, start + max_candidates)]:
+            if code in scores:
+                continue
+            name_tokens = names[code]
+            if all(any(t.startswith(term) for t in name_tokens) for term in terms):
+                score = 60
+                if name_tokens[0].startswith(terms[0]):
+                    score += 5
+                if token == anchor:
+                    score += 5
+                scores[code] = score
+
+        # Aproximada: palabras del vocabulario con trigramas en común (Dice)
+        # con el término más largo sin coincidencias, solo si no alcanzan los
+        # resultados exactos
+        if len(scores) < limit:
+            unmatched = [term for term in terms if ranges[term][0] == ranges[term][1]]
+            fuzzy_term = max(unmatched or terms, key=len)
+            if len(fuzzy_term) >= 3:
+                query_grams = trigrams(fuzzy_term)
+                shared = {}
+                for gram in query_grams:
+                    for token in grams.get(gram, ()):
+                        shared[token] = shared.get(token, 0) + 1
+                for token, count in shared.items():
+                    similarity = 2 * count / (len(query_grams) + len(token) + 1)
+                    if similarity < FUZZY_THRESHOLD:
+                        continue
+                    score = round(50 * similarity, 2)
+                    start = bisect.bisect_left(tokens, (token,))
+                    end = bisect.bisect_left(tokens, (token, '\uffff'))
+                    for _, code in tokens[start:min(end, start + max_candidates)]:
+                        if scores.get(code, 0) < score:
+                            scores[code] = score
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [{**products[code], 'score': score} for code, score in ranked[:limit]]
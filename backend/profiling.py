@@ -0,0 +1,233 @@
+"""
+Perfilado bajo demanda de peticiones (cProfile + tracemalloc)
+
+Un administrador puede perfilar una sola petición enviando la cabecera
+'X-Profile: 1', o activar un muestreo (fracción de peticiones, opcionalmente
+solo para un prefijo de ruta) con POST /api/admin/profiling. La configuración
+se guarda en el directorio de perfiles para que todos los workers de gunicorn
+la vean en pocos segundos.
+
+Cada petición perfilada deja un .pstats (abrible con pstats/snakeviz) y un
+.txt con las funciones más costosas y las mayores asignaciones de memoria,
+descargables desde /api/admin/profiles.
+
+Con el muestreo apagado y sin cabecera, el costo por petición es una
+comparación de tiempo y la búsqueda de una cabecera.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+from flask import g, jsonify, request, send_from_directory, session
+
+PROFILE_HEADER = 'X-Profile'
+SETTINGS_FILE = 'profiling.json'
+SETTINGS_REFRESH_SECONDS = 5
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+
+
+class RequestProfiler:
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.sample_rate = 0.0
+        self.path_prefix = None
+        self._next_refresh = 0.0
+        # tracemalloc es global al proceso: un solo perfil a la vez por worker
+        self._busy = threading.Lock()
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    # --- Configuración compartida entre workers ---
+
+    def _settings_path(self):
+        return os.path.join(self.output_dir, SETTINGS_FILE)
+
+    def _refresh_settings(self):
+        now = time.monotonic()
+        if now < self._next_refresh:
+            return
+        self._next_refresh = now + SETTINGS_REFRESH_SECONDS
+        try:
+            with open(self._settings_path(), 'r') as f:
+                data = json.load(f)
+            self.sample_rate = float(data.get('sample_rate', 0))
+            self.path_prefix = data.get('path_prefix') or None
+        except FileNotFoundError:
+            self.sample_rate = 0.0
+            self.path_prefix = None
+        except Exception as e:
+            print(f"❌ Error leyendo configuración de perfilado: {str(e)}")
+
+    def configure(self, sample_rate, path_prefix=None):
+        """Activa (sample_rate > 0) o apaga el muestreo para todos los workers"""
+        sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+        tmp_path = self._settings_path() + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'sample_rate': sample_rate, 'path_prefix': path_prefix}, f)
+        os.replace(tmp_path, self._settings_path())
+        self.sample_rate = sample_rate
+        self.path_prefix = path_prefix
+        self._next_refresh = time.monotonic() + SETTINGS_REFRESH_SECONDS
+        return {'sample_rate': sample_rate, 'path_prefix': path_prefix}
+
+    # --- Decisión por petición ---
+
+    def should_profile(self):
+        if request.headers.get(PROFILE_HEADER):
+            return _is_admin()
+
+        self._refresh_settings()
+        if self.sample_rate <= 0:
+            return False
+        if self.path_prefix and not request.path.startswith(self.path_prefix):
+            return False
+        return random.random() < self.sample_rate
+
+    def start(self):
+        if not self._busy.acquire(blocking=False):
+            return
+        tracemalloc.start()
+        profiler = cProfile.Profile()
+        g._profile = {
+            'profiler': profiler,
+            'id': uuid.uuid4().hex[:8],
+            'started': time.perf_counter()
+        }
+        profiler.enable()
+
+    def stop(self, response):
+        state = g.pop('_profile', None)
+        if state is None:
+            return response
+
+        profiler = state['profiler']
+        profiler.disable()
+        elapsed_ms = (time.perf_counter() - state['started']) * 1000
+        snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self._busy.release()
+
+        try:
+            name = self._write_report(profiler, snapshot, peak, elapsed_ms, state['id'])
+            response.headers['X-Profile-Id'] = name
+        except Exception as e:
+            print(f"❌ Error guardando perfil: {str(e)}")
+        return response
+
+    def _write_report(self, profiler, snapshot, peak, elapsed_ms, profile_id):
+        route = re.sub(r'[^A-Za-z0-9]+', '_', request.path).strip('_') or 'root'
+        name = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}_{route}_{profile_id}"
+
+        profiler.dump_stats(os.path.join(self.output_dir, f'{name}.pstats'))
+
+        report = io.StringIO()
+        report.write(f'{request.method} {request.full_path}\n')
+        report.write(f'Duración: {elapsed_ms:.1f} ms - Pico de memoria: {peak / 1024:.1f} KiB\n\n')
+
+        stats = pstats.Stats(profiler, stream=report)
+        stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+
+        report.write(f'\nTop {TOP_ALLOCATIONS} asignaciones por línea\n')
+        for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+            report.write(f'{stat}\n')
+
+        with open(os.path.join(self.output_dir, f'{name}.txt'), 'w', encoding='utf-8') as f:
+            f.write(report.getvalue())
+        return name
+
+    def list_profiles(self):
+        names = set()
+        for filename in os.listdir(self.output_dir):
+            base, ext = os.path.splitext(filename)
+            if ext in ('.pstats', '.txt'):
+                names.add(base)
+        return sorted(names, reverse=True)
+
+
+def _is_admin():
+    return 'user' in session and session['user']['role'] == 'admin'
+
+
+def init_app(app, output_dir=None):
+    """Registra los hooks de perfilado y los endpoints de administración"""
+    profiler = RequestProfiler(output_dir or os.environ.get('POS_PROFILE_DIR', 'profiles'))
+
+    @app.before_request
+    def _maybe_start_profile():
+        if profiler.should_profile():
+            profiler.start()
+
+    @app.after_request
+    def _maybe_stop_profile(response):
+        if '_profile' in g:
+            return profiler.stop(response)
+        return response
+
+    @app.route('/api/admin/profiling', methods=['GET', 'POST'])
+    def profiling_settings():
+        """Consulta o cambia el muestreo de perfilado (solo administradores)"""
+        if not _is_admin():
+            return jsonify({
+                'success': False,
+                'message': 'No autorizado'
+            }), 403
+
+        if request.method == 'POST':
+            data = request.json or {}
+            try:
+                settings = profiler.configure(
+                    data.get('sample_rate', 0),
+                    data.get('path_prefix')
+                )
+            except (TypeError, ValueError):
+                return jsonify({
+                    'success': False,
+                    'message': 'sample_rate debe ser un número entre 0 y 1'
+                }), 400
+            return jsonify({'success': True, 'data': settings})
+
+        profiler._refresh_settings()
+        return jsonify({
+            'success': True,
+            'data': {
+                'sample_rate': profiler.sample_rate,
+                'path_prefix': profiler.path_prefix
+            }
+        })
+
+    @app.route('/api/admin/profiles', methods=['GET'])
+    def list_profiles():
+        """Lista los perfiles guardados (solo administradores)"""
+        if not _is_admin():
+            return jsonify({
+                'success': False,
+                'message': 'No autorizado'
+            }), 403
+        return jsonify({'success': True, 'data': profiler.list_profiles()})
+
+    @app.route('/api/admin/profiles/<filename>', methods=['GET'])
+    def download_profile(filename):
+        """Descarga un .pstats o .txt (solo administradores)"""
+        if not _is_admin():
+            return jsonify({
+                'success': False,
+                'message': 'No autorizado'
+            }), 403
+        return send_from_directory(
+            os.path.abspath(profiler.output_dir),
+            filename,
+            as_attachment=True
+        )
+
+    return profiler
@@ -0,0 +1,205 @@
+"""
+Secuenciales de factura únicos entre procesos, reservados por bloques
+
+secuencial.json guarda el último número reservado por cualquier proceso.
+Cada worker reserva un bloque (SRI_SECUENCIAL_BLOQUE números) tomando un
+flock sobre el archivo, y luego entrega números del bloque en memoria: solo
+una de cada N facturas toca el disco, y dos procesos nunca reciben el mismo
+número.
+
+Cada bloque vivo tiene un archivo bloque-<pid>.json con su rango; al cerrar
+el proceso se anota hasta dónde se usó y, si era el último bloque reservado,
+se devuelve el sobrante. Si el proceso muere, el siguiente que reserva
+detecta el bloque huérfano y registra el rango no confirmado en huecos.json
+(números que pueden faltar en la numeración).
+"""
+import atexit
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+SECUENCIAL_PATH = os.environ.get('SRI_SECUENCIAL_PATH', 'secuencial.json')
+BLOQUE = int(os.environ.get('SRI_SECUENCIAL_BLOQUE', 20))
+
+
+def _leer_json(path, default):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def _escribir_json(path, data):
+    # Escritura atómica y durable: un corte de luz no debe devolver el
+    # contador a un valor ya entregado
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def huecos(path=SECUENCIAL_PATH):
+    """Rangos de secuenciales reservados que quizá no se usaron"""
+    return _leer_json(os.path.join(_directorio_bloques(path), 'huecos.json'), [])
+
+
+def _directorio_bloques(path):
+    return os.path.join(os.path.dirname(path) or '.', 'secuencial_bloques')
+
+
+class SecuencialAllocator:
+
+    def __init__(self, path=None, block_size=None):
+        """
+        Args:
+            path: archivo con el último secuencial reservado (formato de
+                secuencial.json: {"ultimo_secuencial": N})
+            block_size: números reservados por bloque
+        """
+        self.path = path or SECUENCIAL_PATH
+        self.block_size = block_size or BLOQUE
+        self.directorio = _directorio_bloques(self.path)
+        os.makedirs(self.directorio, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._pid = None
+        self._siguiente = 1
+        self._fin = 0
+        self._bloque = None
+        self._bloque_fd = None
+        self.ultimo = None
+        atexit.register(self.liberar)
+
+    @contextmanager
+    def _flock(self):
+        fd = os.open(f'{self.path}.lock', os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _ruta_bloque(self, pid):
+        return os.path.join(self.directorio, f'bloque-{pid}.json')
+
+    def siguiente(self):
+        """Próximo secuencial (único entre todos los procesos)"""
+        with self._lock:
+            if self._pid != os.getpid():
+                # Proceso hijo: el bloque del padre no es suyo
+                self._pid = os.getpid()
+                self._siguiente, self._fin = 1, 0
+                self._bloque = None
+                self._bloque_fd = None
+            if self._siguiente > self._fin:
+                self._reservar()
+            numero = self._siguiente
+            self._siguiente += 1
+            self.ultimo = numero
+            return numero
+
+    def _reservar(self):
+        with self._flock():
+            self._recuperar_huerfanos()
+            if self._bloque is not None:
+                self._cerrar_bloque(self._fin)
+            else:
+                # Bloque de otro proceso con el mismo pid (reinicio del contenedor)
+                anterior = _leer_json(self._ruta_bloque(os.getpid()), None)
+                if anterior is not None:
+                    self._registrar_hueco(anterior['inicio'], anterior['fin'], f"proceso {anterior['pid']} terminó sin liberar su bloque")
+
+            estado = _leer_json(self.path, {})
+            inicio = estado.get('ultimo_secuencial', 0) + 1
+            fin = inicio + self.block_size - 1
+            estado['ultimo_secuencial'] = fin
+            _escribir_json(self.path, estado)
+
+            self._bloque = {
+                'pid': os.getpid(),
+                'inicio': inicio,
+                'fin': fin,
+                'reservado': datetime.now().isoformat(timespec='seconds')
+            }
+            _escribir_json(self._ruta_bloque(os.getpid()), self._bloque)
+            if self._bloque_fd is None:
+                # Lock mientras el proceso viva: su bloque no es huérfano
+                self._bloque_fd = os.open(f'{self._ruta_bloque(os.getpid())}.lock', os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._bloque_fd, fcntl.LOCK_EX)
+            self._siguiente, self._fin = inicio, fin
+
+    def _cerrar_bloque(self, usado_hasta):
+        """Da por terminado el bloque actual (llamar con el flock tomado)"""
+        estado = _leer_json(self.path, {})
+        if estado.get('ultimo_secuencial') == self._bloque['fin'] and usado_hasta < self._bloque['fin']:
+            # Es el último bloque reservado: el sobrante vuelve a estar libre
+            estado['ultimo_secuencial'] = usado_hasta
+            _escribir_json(self.path, estado)
+        elif usado_hasta < self._bloque['fin']:
+            self._registrar_hueco(usado_hasta + 1, self._bloque['fin'], 'bloque liberado sin usar')
+        try:
+            os.remove(self._ruta_bloque(os.getpid()))
+        except FileNotFoundError:
+            pass
+        self._bloque = None
+
+    def _recuperar_huerfanos(self):
+        """Bloques de procesos que murieron sin liberarlos (con el flock tomado)"""
+        for nombre in os.listdir(self.directorio):
+            if not (nombre.startswith('bloque-') and nombre.endswith('.json')):
+                continue
+            path = os.path.join(self.directorio, nombre)
+            bloque = _leer_json(path, None)
+            if bloque is None or bloque['pid'] == os.getpid():
+                continue
+            fd = os.open(f'{path}.lock', os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue  # el proceso sigue vivo
+            try:
+                # No se sabe cuántos números alcanzó a usar: todo el bloque
+                # queda como posible hueco
+                self._registrar_hueco(bloque['inicio'], bloque['fin'], f"proceso {bloque['pid']} terminó sin liberar su bloque")
+                os.remove(path)
+                os.remove(f'{path}.lock')
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+    def _registrar_hueco(self, desde, hasta, motivo):
+        path = os.path.join(self.directorio, 'huecos.json')
+        lista = _leer_json(path, [])
+        lista.append({
+            'desde': desde,
+            'hasta': hasta,
+            'motivo': motivo,
+            'detectado': datetime.now().isoformat(timespec='seconds')
+        })
+        _escribir_json(path, lista)
+        print(f"⚠️  Secuenciales {desde}-{hasta} posiblemente sin usar: {motivo}")
+
+    def liberar(self):
+        """Confirma hasta dónde se usó el bloque y devuelve el sobrante si se puede"""
+        with self._lock:
+            if self._bloque is None or self._pid != os.getpid():
+                return
+            with self._flock():
+                self._cerrar_bloque(self._siguiente - 1)
+            if self._bloque_fd is not None:
+                fcntl.flock(self._bloque_fd, fcntl.LOCK_UN)
+                os.close(self._bloque_fd)
+                try:
+                    os.remove(f'{self._ruta_bloque(os.getpid())}.lock')
+                except FileNotFoundError:
+                    pass
+                self._bloque_fd = None
+            self._siguiente, self._fin = 1, 0
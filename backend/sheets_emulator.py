@@ -0,0 +1,371 @@
+"""
+Emulador en memoria de Google Sheets para pruebas y benchmarks
+
+Implementa la parte de la API de gspread (Spreadsheet/Worksheet) que usa
+InventoryManager, sin red ni credenciales:
+
+    spreadsheet = build_pos_spreadsheet(products=..., sales=..., users=...)
+    inventory = InventoryManager(spreadsheet=spreadsheet)
+
+Permite simular la latencia de cada llamada, el límite de cuota por minuto
+(respuesta 429 de Google) y fallos inyectados, y cuenta las llamadas por
+operación para poder medir el número de round trips de cada flujo.
+"""
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+
+INVENTORY_HEADERS = ['ID', 'Codigo', 'Nombre', 'Cantidad', 'Unidad', 'Costo',
+                     'Precio_1', 'Precio_2', 'MinStock', 'UltimaActualizacion']
+SALES_HEADERS = ['VentaID', 'Fecha', 'Hora', 'ProductoID', 'Codigo', 'Nombre',
+                 'Cantidad', 'PrecioUnitario', 'Subtotal', 'TotalVenta', 'Vendedor',
+                 'CostoUnitario']
+USERS_HEADERS = ['ID', 'Usuario', 'Password', 'Rol', 'Nombre', 'Activo', 'UltimoAcceso']
+
+
+class EmulatedAPIError(Exception):
+    """Error de la API emulada (equivalente a gspread.exceptions.APIError)"""
+
+    def __init__(self, code, message):
+        super().__init__(f'APIError: [{code}]: {message}')
+        self.code = code
+        self.message = message
+
+
+class WorksheetNotFound(Exception):
+    pass
+
+
+class Cell:
+    """Celda devuelta por find() y cell(), como gspread.Cell"""
+
+    def __init__(self, row, col, value):
+        self.row = row
+        self.col = col
+        self.value = value
+
+    def __repr__(self):
+        return f'<Cell R{self.row}C{self.col} {self.value!r}>'
+
+
+def _format(value):
+    """Valor tal como lo devuelve la API en modo FORMATTED_VALUE"""
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _numericise(value):
+    """Conversión de get_all_records(): números como int/float, resto igual"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    value = _format(value)
+    if value == '':
+        return ''
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def _column_index(letters):
+    index = 0
+    for char in letters.upper():
+        index = index * 26 + (ord(char) - 64)
+    return index
+
+
+_A1_RE = re.compile(r'^([A-Za-z]*)(\d*)$')
+
+
+def _parse_a1(label):
+    match = _A1_RE.match(label)
+    if not match:
+        raise EmulatedAPIError(400, f'Rango no válido: {label}')
+    letters, digits = match.groups()
+    return (int(digits) if digits else None,
+            _column_index(letters) if letters else None)
+
+
+def parse_range(a1):
+    """'D5' -> (5, 4, 5, 4); 'A2:K' -> (2, 1, None, 11). None = sin límite"""
+    a1 = a1.split('!')[-1]
+    start, _, end = a1.partition(':')
+    row1, col1 = _parse_a1(start)
+    row2, col2 = _parse_a1(end) if end else (row1, col1)
+    return row1 or 1, col1 or 1, row2, col2
+
+
+class EmulatedWorksheet:
+
+    def __init__(self, spreadsheet, title, values=None):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        # Fila 1 = encabezado, como en la hoja real
+        self._rows = [list(row) for row in (values or [])]
+
+    # --- Propiedades ---
+
+    @property
+    def row_count(self):
+        return len(self._rows)
+
+    @property
+    def col_count(self):
+        return max((len(row) for row in self._rows), default=0)
+
+    def _call(self, operation):
+        self.spreadsheet._api_call(operation)
+
+    def _value(self, row, col):
+        if row - 1 < len(self._rows) and col - 1 < len(self._rows[row - 1]):
+            return self._rows[row - 1][col - 1]
+        return ''
+
+    def _set(self, row, col, value):
+        while len(self._rows) < row:
+            self._rows.append([])
+        target = self._rows[row - 1]
+        while len(target) < col:
+            target.append('')
+        target[col - 1] = value
+
+    def _block(self, row1, col1, row2, col2):
+        row2 = row2 or len(self._rows)
+        col2 = col2 or self.col_count
+        block = []
+        for row in range(row1, row2 + 1):
+            values = [_format(self._value(row, col)) for col in range(col1, col2 + 1)]
+            while values and values[-1] == '':
+                values.pop()
+            block.append(values)
+        while block and not block[-1]:
+            block.pop()
+        return block
+
+    # --- Lecturas ---
+
+    def get_all_values(self):
+        self._call('get_all_values')
+        with self.spreadsheet._lock:
+            return [[_format(v) for v in row] for row in self._rows]
+
+    def get_all_records(self, head=1):
+        self._call('get_all_records')
+        with self.spreadsheet._lock:
+            if len(self._rows) < head:
+                return []
+            headers = [_format(v) for v in self._rows[head - 1]]
+            records = []
+            for row in self._rows[head:]:
+                records.append({
+                    key: _numericise(row[i]) if i < len(row) else ''
+                    for i, key in enumerate(headers)
+                })
+            return records
+
+    def row_values(self, row):
+        self._call('row_values')
+        with self.spreadsheet._lock:
+            if row - 1 >= len(self._rows):
+                return []
+            values = [_format(v) for v in self._rows[row - 1]]
+        while values and values[-1] == '':
+            values.pop()
+        return values
+
+    def col_values(self, col):
+        self._call('col_values')
+        with self.spreadsheet._lock:
+            values = [_format(self._value(r + 1, col)) for r in range(len(self._rows))]
+        while values and values[-1] == '':
+            values.pop()
+        return values
+
+    def cell(self, row, col):
+        self._call('cell')
+        with self.spreadsheet._lock:
+            return Cell(row, col, _format(self._value(row, col)))
+
+    def acell(self, label):
+        row, col, _, _ = parse_range(label)
+        return self.cell(row, col)
+
+    def find(self, query, in_row=None, in_column=None):
+        """Primera celda cuyo valor coincide exactamente, o None"""
+        self._call('find')
+        query = str(query)
+        with self.spreadsheet._lock:
+            for r, row in enumerate(self._rows, start=1):
+                if in_row is not None and r != in_row:
+                    continue
+                for c, value in enumerate(row, start=1):
+                    if in_column is not None and c != in_column:
+                        continue
+                    if _format(value) == query:
+                        return Cell(r, c, _format(value))
+        return None
+
+    def get(self, range_name=None, **kwargs):
+        self._call('get')
+        with self.spreadsheet._lock:
+            if range_name is None:
+                return [[_format(v) for v in row] for row in self._rows]
+            return self._block(*parse_range(range_name))
+
+    def get_values(self, range_name=None, **kwargs):
+        return self.get(range_name)
+
+    def batch_get(self, ranges):
+        self._call('batch_get')
+        with self.spreadsheet._lock:
+            return [self._block(*parse_range(r)) for r in ranges]
+
+    # --- Escrituras ---
+
+    def update_cell(self, row, col, value):
+        self._call('update_cell')
+        with self.spreadsheet._lock:
+            self._set(row, col, value)
+
+    def _write_block(self, range_name, values):
+        row1, col1, _, _ = parse_range(range_name)
+        for r, row in enumerate(values):
+            for c, value in enumerate(row):
+                self._set(row1 + r, col1 + c, value)
+
+    def update(self, range_name, values=None, **kwargs):
+        # gspread 6 acepta update(values, range_name) y update(range_name, values)
+        if not isinstance(range_name, str):
+            range_name, values = values, range_name
+        self._call('update')
+        with self.spreadsheet._lock:
+            self._write_block(range_name or 'A1', values)
+
+    def batch_update(self, data, **kwargs):
+        self._call('batch_update')
+        with self.spreadsheet._lock:
+            for entry in data:
+                self._write_block(entry['range'], entry['values'])
+
+    def append_row(self, values, **kwargs):
+        self._call('append_row')
+        with self.spreadsheet._lock:
+            self._rows.append(list(values))
+
+    def append_rows(self, values, **kwargs):
+        self._call('append_rows')
+        with self.spreadsheet._lock:
+            self._rows.extend(list(row) for row in values)
+
+    def delete_rows(self, start_index, end_index=None):
+        self._call('delete_rows')
+        end_index = end_index or start_index
+        with self.spreadsheet._lock:
+            del self._rows[start_index - 1:end_index]
+
+
+class EmulatedSpreadsheet:
+    """
+    Libro de cálculo en memoria
+
+    Args:
+        latency: segundos por llamada (número) o rango (min, max) aleatorio
+        quota_per_minute: máximo de llamadas por minuto; al excederlo se lanza
+            EmulatedAPIError 429 como hace Google (None = sin límite)
+        failure_rate: probabilidad de que cualquier llamada falle con un 503
+        seed: semilla para que latencia y fallos sean reproducibles
+    """
+
+    def __init__(self, title='Emulado', latency=0.0, quota_per_minute=None,
+                 failure_rate=0.0, seed=None):
+        self.title = title
+        self.latency = latency
+        self.quota_per_minute = quota_per_minute
+        self.failure_rate = failure_rate
+        self.calls = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._quota_window = deque()
+        self._scheduled_failures = Counter()
+        self._worksheets = {}
+
+    # --- Hojas ---
+
+    def add_worksheet(self, title, rows=0, cols=0, values=None):
+        worksheet = EmulatedWorksheet(self, title, values)
+        self._worksheets[title] = worksheet
+        return worksheet
+
+    def worksheet(self, title):
+        self._api_call('worksheet')
+        if title not in self._worksheets:
+            raise WorksheetNotFound(title)
+        return self._worksheets[title]
+
+    def worksheets(self):
+        self._api_call('worksheets')
+        return list(self._worksheets.values())
+
+    # --- Inyección de fallos ---
+
+    def fail_next(self, operation, count=1, code=500):
+        """Hace fallar las próximas `count` llamadas a `operation`"""
+        with self._lock:
+            self._scheduled_failures[(operation, code)] += count
+
+    def reset_calls(self):
+        self.calls.clear()
+
+    def _api_call(self, operation):
+        with self._lock:
+            self.calls[operation] += 1
+
+            for (op, code), pending in self._scheduled_failures.items():
+                if op == operation and pending > 0:
+                    self._scheduled_failures[(op, code)] -= 1
+                    raise EmulatedAPIError(code, f'Fallo inyectado en {operation}')
+
+            if self.quota_per_minute is not None:
+                now = time.monotonic()
+                while self._quota_window and now - self._quota_window[0] >= 60:
+                    self._quota_window.popleft()
+                if len(self._quota_window) >= self.quota_per_minute:
+                    raise EmulatedAPIError(429, 'Quota exceeded for quota metric \'Read requests\'')
+                self._quota_window.append(now)
+
+            fail = self.failure_rate and self._random.random() < self.failure_rate
+            if isinstance(self.latency, (tuple, list)):
+                delay = self._random.uniform(*self.latency)
+            else:
+                delay = self.latency
+
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise EmulatedAPIError(503, 'The service is currently unavailable.')
+
+
+def build_pos_spreadsheet(products=(), sales=(), users=(), **options):
+    """
+    Crea un libro con las hojas Inventario, Ventas y Usuarios
+
+    products, sales y users son listas de filas (sin encabezado) en el orden
+    de columnas de INVENTORY_HEADERS, SALES_HEADERS y USERS_HEADERS.
+    options se pasa a EmulatedSpreadsheet (latency, quota_per_minute, ...).
+    """
+    spreadsheet = EmulatedSpreadsheet(**options)
+    spreadsheet.add_worksheet('Inventario', values=[INVENTORY_HEADERS] + [list(r) for r in products])
+    spreadsheet.add_worksheet('Ventas', values=[SALES_HEADERS] + [list(r) for r in sales])
+    spreadsheet.add_worksheet('Usuarios', values=[USERS_HEADERS] + [list(r) for r in users])
+    return spreadsheet
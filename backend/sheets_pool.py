@@ -0,0 +1,98 @@
+"""
+Pool de clientes de Google Sheets para InventoryManager
+
+Un cliente de gspread (y su sesión HTTP) no debe usarse desde varios hilos a
+la vez. El pool mantiene hasta `size` clientes autorizados, cada uno con sus
+hojas ya abiertas, y entrega uno por operación. Los clientes se reutilizan
+(LIFO, para mantener calientes las conexiones keep-alive) en lugar de
+autorizar y abrir el libro en cada petición.
+"""
+import queue
+import threading
+from contextlib import contextmanager
+
+from metrics import InstrumentedWorksheet
+
+DEFAULT_WORKSHEETS = {
+    'inventory': 'Inventario',
+    'sales': 'Ventas',
+    'users': 'Usuarios',
+}
+
+
+class SheetsSession:
+    """Un libro abierto con las hojas que usa el POS"""
+
+    def __init__(self, spreadsheet, worksheets=None):
+        self.spreadsheet = spreadsheet
+        for attr, title in (worksheets or DEFAULT_WORKSHEETS).items():
+            setattr(self, attr, InstrumentedWorksheet(spreadsheet.worksheet(title)))
+
+
+class SheetsClientPool:
+
+    def __init__(self, factory, size=4, timeout=30, worksheets=None):
+        """
+        Args:
+            factory: función sin argumentos que devuelve un libro abierto
+                (gspread.Spreadsheet o EmulatedSpreadsheet) con un cliente nuevo
+            size: máximo de clientes simultáneos
+            timeout: segundos que se espera un cliente libre antes de fallar
+            worksheets: atributo -> nombre de hoja (por defecto DEFAULT_WORKSHEETS)
+        """
+        self._factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.worksheets = worksheets or DEFAULT_WORKSHEETS
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _new_session(self):
+        return SheetsSession(self._factory(), self.worksheets)
+
+    def prefill(self, count=1):
+        """Crea clientes por adelantado (y valida credenciales al iniciar)"""
+        for _ in range(min(count, self.size)):
+            with self._lock:
+                if self._created >= self.size:
+                    return
+                self._created += 1
+            try:
+                self._idle.put(self._new_session())
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+
+        if create:
+            try:
+                return self._new_session()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError('No hay clientes de Google Sheets disponibles')
+
+    @contextmanager
+    def checkout(self):
+        session = self._acquire()
+        try:
+            yield session
+        finally:
+            self._idle.put(session)
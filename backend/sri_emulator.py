@@ -0,0 +1,429 @@
+"""
+Emulador local de los web services offline del SRI para pruebas y benchmarks
+
+Sirve RecepcionComprobantesOffline y AutorizacionComprobantesOffline (WSDL y
+respuestas SOAP con la misma estructura que celcer.sri.gob.ec) sin red ni
+certificado registrado:
+
+    python -m sri_emulator --port 8089 --latency 0.2 --auth-delay 2
+    SRI_URL_RECEPCION=http://localhost:8089/comprobantes-electronicos-ws/RecepcionComprobantesOffline?wsdl
+    SRI_URL_AUTORIZACION=http://localhost:8089/comprobantes-electronicos-ws/AutorizacionComprobantesOffline?wsdl
+
+o dentro de un proceso (benchmarks):
+
+    emulator = SRIEmulator(latency=0.1)
+    server = emulator.serve(port=0)        # hilo en segundo plano
+    SRIConfig.URL_RECEPCION = emulator.wsdl_url('recepcion')
+
+Permite simular la latencia de cada llamada, la demora hasta que el
+comprobante aparece autorizado (mientras tanto responde sin autorizaciones,
+como EN PROCESO) y una fracción de comprobantes DEVUELTA o NO AUTORIZADO.
+El resultado de cada clave se decide con la propia clave, así una corrida
+con los mismos datos es reproducible. Acepta comprobantes sueltos y lotes
+masivos, y cuenta las llamadas por operación.
+"""
+import argparse
+import base64
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from lxml import etree
+
+SOAP_NS = 'http://schemas.xmlsoap.org/soap/envelope/'
+BASE_PATH = '/comprobantes-electronicos-ws'
+
+SERVICIOS = {
+    'recepcion': ('RecepcionComprobantesOffline', 'http://ec.gob.sri.ws.recepcion'),
+    'autorizacion': ('AutorizacionComprobantesOffline', 'http://ec.gob.sri.ws.autorizacion'),
+}
+
+_TIPOS_MENSAJES = '''
+      <xsd:complexType name="mensaje">
+        <xsd:sequence>
+          <xsd:element name="identificador" type="xsd:string" minOccurs="0"/>
+          <xsd:element name="mensaje" type="xsd:string" minOccurs="0"/>
+          <xsd:element name="informacionAdicional" type="xsd:string" minOccurs="0"/>
+          <xsd:element name="tipo" type="xsd:string" minOccurs="0"/>
+        </xsd:sequence>
+      </xsd:complexType>
+      <xsd:complexType name="mensajes">
+        <xsd:sequence>
+          <xsd:element name="mensaje" type="tns:mensaje" minOccurs="0" maxOccurs="unbounded"/>
+        </xsd:sequence>
+      </xsd:complexType>'''
+
+_TIPOS_RECEPCION = _TIPOS_MENSAJES + '''
+      <xsd:element name="validarComprobante" type="tns:validarComprobante"/>
+      <xsd:element name="validarComprobanteResponse" type="tns:validarComprobanteResponse"/>
+      <xsd:complexType name="validarComprobante">
+        <xsd:sequence>
+          <xsd:element name="xml" type="xsd:base64Binary" minOccurs="0"/>
+        </xsd:sequence>
+      </xsd:complexType>
+      <xsd:complexType name="validarComprobanteResponse">
+        <xsd:sequence>
+          <xsd:element name="RespuestaRecepcionComprobante" type="tns:respuestaSolicitud" minOccurs="0"/>
+        </xsd:sequence>
+      </xsd:complexType>
+      <xsd:complexType name="respuestaSolicitud">
+        <xsd:sequence>
+          <xsd:element name="estado" type="xsd:string" minOccurs="0"/>
+          <xsd:element name="comprobantes" minOccurs="0">
+            <xsd:complexType>
+              <xsd:sequence>
+                <xsd:element name="comprobante" type="tns:comprobante" minOccurs="0" maxOccurs="unbounded"/>
+              </xsd:sequence>
+            </xsd:complexType>
+          </xsd:element>
+        </xsd:sequence>
+      </xsd:complexType>
+      <xsd:complexType name="comprobante">
+        <xsd:sequence>
+          <xsd:element name="claveAcceso" type="xsd:string" minOccurs="0"/>
+          <xsd:element name="mensajes" type="tns:mensajes" minOccurs="0"/>
+        </xsd:sequence>
+      </xsd:complexType>'''
+
+_TIPOS_AUTORIZACION = _TIPOS_MENSAJES + '''
+      <xsd:element name="autorizacionComprobante" type="tns:autorizacionComprobante"/>
+      <xsd:element name="autorizacionComprobanteResponse" type="tns:autorizacionComprobanteResponse"/>
+      <xsd:element name="autorizacionComprobanteLote" type="tns:autorizacionComprobanteLote"/>
+      <xsd:element name="autorizacionComprobanteLoteResponse" type="tns:autorizacionComprobanteLoteResponse"/>
+      <xsd:complexType name="autorizacionComprobante">
+        <xsd:sequence>
+          <xsd:element name="claveAccesoComprobante" type="xsd:string" minOccurs="0"/>
+        </xsd:sequence>
+      </xsd:complexType>
+      <xsd:complexType name="autorizacionComprobanteResponse">
+        <xsd:sequence>
+          <xsd:element name="RespuestaAutorizacionComprobante" type="tns:respuestaComprobante" minOccurs="0"/>
+        </xsd:sequence>
+      </xsd:complexType>
+      <xsd:complexType name="autorizacionComprobanteLote">
+        <xsd:sequence>
+          <xsd:element name="claveAccesoLote" type="xsd:string" minOccurs="0"/>
+        </xsd:sequence>
+      </xsd:complexType>
+      <xsd:complexType name="autorizacionComprobanteLoteResponse">
+        <xsd:sequence>
+          <xsd:element name="RespuestaAutorizacionLote" type="tns:respuestaLote" minOccurs="0"/>
+        </xsd:sequence>
+      </xsd:complexType>
+      <xsd:complexType name="autorizaciones">
+        <xsd:sequence>
+          <xsd:element name="autorizacion" type="tns:autorizacion" minOccurs="0" maxOccurs="unbounded"/>
+        </xsd:sequence>
+      </xsd:complexType>
+      <xsd:complexType name="respuestaComprobante">
+        <xsd:sequence>
+          <xsd:element name="claveAccesoConsultada" type="xsd:string" minOccurs="0"/>
+          <xsd:element name="numeroComprobantes" type="xsd:string" minOccurs="0"/>
+          <xsd:element name="autorizaciones" type="tns:autorizaciones" minOccurs="0"/>
+        </xsd:sequence>
+      </xsd:complexType>
+      <xsd:complexType name="respuestaLote">
+        <xsd:sequence>
+          <xsd:element name="claveAccesoLoteConsultada" type="xsd:string" minOccurs="0"/>
+          <xsd:element name="numeroComprobantesLote" type="xsd:string" minOccurs="0"/>
+          <xsd:element name="autorizaciones" type="tns:autorizaciones" minOccurs="0"/>
+        </xsd:sequence>
+      </xsd:complexType>
+      <xsd:complexType name="autorizacion">
+        <xsd:sequence>
+          <xsd:element name="estado" type="xsd:string" minOccurs="0"/>
+          <xsd:element name="numeroAutorizacion" type="xsd:string" minOccurs="0"/>
+          <xsd:element name="fechaAutorizacion" type="xsd:dateTime" minOccurs="0"/>
+          <xsd:element name="ambiente" type="xsd:string" minOccurs="0"/>
+          <xsd:element name="comprobante" type="xsd:string" minOccurs="0"/>
+          <xsd:element name="mensajes" type="tns:mensajes" minOccurs="0"/>
+        </xsd:sequence>
+      </xsd:complexType>'''
+
+_OPERACIONES = {
+    'recepcion': ['validarComprobante'],
+    'autorizacion': ['autorizacionComprobante', 'autorizacionComprobanteLote'],
+}
+
+
+def wsdl(servicio, location):
+    """WSDL document/literal del servicio con su dirección"""
+    nombre, namespace = SERVICIOS[servicio]
+    tipos = _TIPOS_RECEPCION if servicio == 'recepcion' else _TIPOS_AUTORIZACION
+    mensajes = ''.join(
+        f'<message name="{op}"><part name="parameters" element="tns:{op}"/></message>'
+        f'<message name="{op}Response"><part name="parameters" element="tns:{op}Response"/></message>'
+        for op in _OPERACIONES[servicio]
+    )
+    port_ops = ''.join(
+        f'<operation name="{op}"><input message="tns:{op}"/><output message="tns:{op}Response"/></operation>'
+        for op in _OPERACIONES[servicio]
+    )
+    binding_ops = ''.join(
+        f'<operation name="{op}"><soap:operation soapAction=""/>'
+        f'<input><soap:body use="literal"/></input><output><soap:body use="literal"/></output></operation>'
+        for op in _OPERACIONES[servicio]
+    )
+    return f'''<?xml version="1.0" encoding="UTF-8"?>
+<definitions xmlns="http://schemas.xmlsoap.org/wsdl/" xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/"
+    xmlns:xsd="http://www.w3.org/2001/XMLSchema" xmlns:tns="{namespace}"
+    targetNamespace="{namespace}" name="{nombre}Service">
+  <types>
+    <xsd:schema targetNamespace="{namespace}" elementFormDefault="unqualified">{tipos}
+    </xsd:schema>
+  </types>
+  {mensajes}
+  <portType name="{nombre}">{port_ops}</portType>
+  <binding name="{nombre}PortBinding" type="tns:{nombre}">
+    <soap:binding transport="http://schemas.xmlsoap.org/soap/http" style="document"/>{binding_ops}
+  </binding>
+  <service name="{nombre}Service">
+    <port name="{nombre}Port" binding="tns:{nombre}PortBinding"><soap:address location="{location}"/></port>
+  </service>
+</definitions>'''
+
+
+def _sub(parent, tag, text=None):
+    element = etree.SubElement(parent, tag)
+    if text is not None:
+        element.text = str(text)
+    return element
+
+
+def _mensajes(parent, mensajes):
+    contenedor = _sub(parent, 'mensajes')
+    for identificador, texto, tipo in mensajes:
+        mensaje = _sub(contenedor, 'mensaje')
+        _sub(mensaje, 'identificador', identificador)
+        _sub(mensaje, 'mensaje', texto)
+        _sub(mensaje, 'tipo', tipo)
+
+
+class SRIEmulator:
+
+    def __init__(self, latency=0.0, auth_delay=0.0, devuelta_rate=0.0,
+                 no_autorizado_rate=0.0, seed=0):
+        """
+        Args:
+            latency: segundos que tarda cada llamada SOAP
+            auth_delay: segundos desde la recepción hasta que el comprobante
+                aparece autorizado (antes: sin autorizaciones, EN PROCESO)
+            devuelta_rate: fracción de comprobantes que la recepción devuelve
+            no_autorizado_rate: fracción de recibidos que no se autorizan
+            seed: cambia qué claves caen en cada resultado
+        """
+        self.latency = latency
+        self.auth_delay = auth_delay
+        self.devuelta_rate = devuelta_rate
+        self.no_autorizado_rate = no_autorizado_rate
+        self.seed = seed
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._recibidos = {}   # clave -> (hora de recepción, xml)
+        self._lotes = {}       # clave del lote -> claves
+        self.base_url = None
+
+    def _sorteo(self, clave, resultado):
+        return random.Random(f'{self.seed}:{resultado}:{clave}').random()
+
+    def wsdl_url(self, servicio):
+        return f'{self.base_url}{BASE_PATH}/{SERVICIOS[servicio][0]}?wsdl'
+
+    # ----- recepción -----
+
+    def _recibir(self, xml_bytes):
+        """Comprobantes con errores [(clave, [(id, mensaje, tipo)])]"""
+        try:
+            root = etree.fromstring(xml_bytes)
+        except etree.XMLSyntaxError:
+            return [('', [('35', 'ARCHIVO NO CUMPLE ESTRUCTURA XML', 'ERROR')])]
+
+        if root.tag == 'lote':
+            clave_lote = root.findtext('claveAcceso') or ''
+            comprobantes = [
+                c.text.encode('utf-8') for c in root.iterfind('comprobantes/comprobante') if c.text
+            ]
+        else:
+            clave_lote = None
+            comprobantes = [xml_bytes]
+
+        devueltos, claves = [], []
+        for comprobante in comprobantes:
+            try:
+                clave = etree.fromstring(comprobante).findtext('infoTributaria/claveAcceso') or ''
+            except etree.XMLSyntaxError:
+                devueltos.append(('', [('35', 'ARCHIVO NO CUMPLE ESTRUCTURA XML', 'ERROR')]))
+                continue
+            with self._lock:
+                registrada = clave in self._recibidos
+            if len(clave) != 49:
+                devueltos.append((clave, [('35', 'ARCHIVO NO CUMPLE ESTRUCTURA XML', 'ERROR')]))
+            elif registrada:
+                devueltos.append((clave, [('43', 'CLAVE ACCESO REGISTRADA', 'ERROR')]))
+            elif self._sorteo(clave, 'devuelta') < self.devuelta_rate:
+                devueltos.append((clave, [('35', 'ARCHIVO NO CUMPLE ESTRUCTURA XML', 'ERROR')]))
+            else:
+                with self._lock:
+                    self._recibidos[clave] = (time.monotonic(), comprobante.decode('utf-8'))
+                claves.append(clave)
+
+        if clave_lote:
+            with self._lock:
+                self._lotes[clave_lote] = claves
+        return devueltos
+
+    def _validar_comprobante(self, request, response):
+        xml_bytes = base64.b64decode(request.findtext('xml') or '')
+        devueltos = self._recibir(xml_bytes)
+
+        respuesta = _sub(response, 'RespuestaRecepcionComprobante')
+        _sub(respuesta, 'estado', 'DEVUELTA' if devueltos else 'RECIBIDA')
+        comprobantes = _sub(respuesta, 'comprobantes')
+        for clave, mensajes in devueltos:
+            comprobante = _sub(comprobantes, 'comprobante')
+            _sub(comprobante, 'claveAcceso', clave)
+            _mensajes(comprobante, mensajes)
+
+    # ----- autorización -----
+
+    def _autorizacion(self, parent, clave):
+        """Agrega la autorización de la clave si ya tiene respuesta"""
+        with self._lock:
+            recibido = self._recibidos.get(clave)
+        if recibido is None or time.monotonic() - recibido[0] < self.auth_delay:
+            return False
+
+        autorizacion = _sub(parent, 'autorizacion')
+        if self._sorteo(clave, 'no_autorizado') < self.no_autorizado_rate:
+            _sub(autorizacion, 'estado', 'NO AUTORIZADO')
+            _sub(autorizacion, 'fechaAutorizacion', datetime.now().isoformat(timespec='seconds'))
+            _sub(autorizacion, 'ambiente', 'PRUEBAS')
+            _sub(autorizacion, 'comprobante', recibido[1])
+            _mensajes(autorizacion, [('56', 'ERROR ESTABLECIMIENTO CERRADO', 'ERROR')])
+        else:
+            _sub(autorizacion, 'estado', 'AUTORIZADO')
+            _sub(autorizacion, 'numeroAutorizacion', clave)
+            _sub(autorizacion, 'fechaAutorizacion', datetime.now().isoformat(timespec='seconds'))
+            _sub(autorizacion, 'ambiente', 'PRUEBAS')
+            _sub(autorizacion, 'comprobante', recibido[1])
+        return True
+
+    def _autorizacion_comprobante(self, request, response):
+        clave = request.findtext('claveAccesoComprobante') or ''
+        respuesta = _sub(response, 'RespuestaAutorizacionComprobante')
+        _sub(respuesta, 'claveAccesoConsultada', clave)
+        numero = _sub(respuesta, 'numeroComprobantes', 0)
+        autorizaciones = _sub(respuesta, 'autorizaciones')
+        if self._autorizacion(autorizaciones, clave):
+            numero.text = '1'
+
+    def _autorizacion_comprobante_lote(self, request, response):
+        clave_lote = request.findtext('claveAccesoLote') or ''
+        with self._lock:
+            claves = list(self._lotes.get(clave_lote, []))
+        respuesta = _sub(response, 'RespuestaAutorizacionLote')
+        _sub(respuesta, 'claveAccesoLoteConsultada', clave_lote)
+        numero = _sub(respuesta, 'numeroComprobantesLote', 0)
+        autorizaciones = _sub(respuesta, 'autorizaciones')
+        numero.text = str(sum(1 for clave in claves if self._autorizacion(autorizaciones, clave)))
+
+    # ----- WSGI -----
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        servicio = next(
+            (s for s, (nombre, _) in SERVICIOS.items() if path == f'{BASE_PATH}/{nombre}'),
+            None
+        )
+        if servicio is None:
+            start_response('404 Not Found', [('Content-Type', 'text/plain')])
+            return [b'not found']
+
+        if environ['REQUEST_METHOD'] == 'GET':
+            host = environ.get('HTTP_HOST') or f"{environ['SERVER_NAME']}:{environ['SERVER_PORT']}"
+            body = wsdl(servicio, f'http://{host}{path}').encode('utf-8')
+            start_response('200 OK', [('Content-Type', 'text/xml; charset=utf-8'),
+                                      ('Content-Length', str(len(body)))])
+            return [body]
+
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        envelope = etree.fromstring(environ['wsgi.input'].read(length))
+        request = envelope.find(f'{{{SOAP_NS}}}Body')[0]
+        operacion = etree.QName(request).localname
+        handler = {
+            'validarComprobante': self._validar_comprobante,
+            'autorizacionComprobante': self._autorizacion_comprobante,
+            'autorizacionComprobanteLote': self._autorizacion_comprobante_lote,
+        }.get(operacion)
+        if handler is None or operacion not in _OPERACIONES[servicio]:
+            start_response('500 Internal Server Error', [('Content-Type', 'text/plain')])
+            return [f'operación desconocida: {operacion}'.encode('utf-8')]
+
+        with self._lock:
+            self.calls[operacion] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        respuesta_envelope = etree.Element(f'{{{SOAP_NS}}}Envelope', nsmap={'soap': SOAP_NS})
+        body = etree.SubElement(respuesta_envelope, f'{{{SOAP_NS}}}Body')
+        response = etree.SubElement(
+            body, f'{{{SERVICIOS[servicio][1]}}}{operacion}Response',
+            nsmap={'ns2': SERVICIOS[servicio][1]}
+        )
+        handler(request, response)
+
+        data = etree.tostring(respuesta_envelope, xml_declaration=True, encoding='UTF-8')
+        start_response('200 OK', [('Content-Type', 'text/xml; charset=utf-8'),
+                                  ('Content-Length', str(len(data)))])
+        return [data]
+
+    def serve(self, host='127.0.0.1', port=0):
+        """
+        Atiende en un hilo en segundo plano (port=0 elige uno libre)
+
+        Returns:
+            el servidor WSGI (server.shutdown() lo detiene)
+        """
+        server = make_server(host, port, self, server_class=_ThreadingWSGIServer,
+                             handler_class=_QuietHandler)
+        self.base_url = f'http://{host}:{server.server_port}'
+        threading.Thread(target=server.serve_forever, name='sri-emulator', daemon=True).start()
+        return server
+
+
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class _QuietHandler(WSGIRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Emulador de los web services offline del SRI')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.0, help='segundos por llamada')
+    parser.add_argument('--auth-delay', type=float, default=0.0, help='segundos hasta la autorización')
+    parser.add_argument('--devuelta-rate', type=float, default=0.0)
+    parser.add_argument('--no-autorizado-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    emulator = SRIEmulator(args.latency, args.auth_delay, args.devuelta_rate,
+                           args.no_autorizado_rate, args.seed)
+    server = make_server(args.host, args.port, emulator, server_class=_ThreadingWSGIServer)
+    emulator.base_url = f'http://{args.host}:{args.port}'
+    print(f"✅ Emulador SRI en {emulator.wsdl_url('recepcion')}")
+    print(f"   y {emulator.wsdl_url('autorizacion')}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
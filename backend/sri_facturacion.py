@@ -2,32 +2,146 @@
 Cliente SOAP para comunicación con Web Services del SRI
 """
 from zeep import Client
+from zeep.cache import SqliteCache
 from zeep.transports import Transport
 from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import re
+import threading
 import time
 from lxml import etree
 from config import SRIConfig
+from metrics import SRI_CALL_LATENCY, observe, record_cache
+from xml_archive import XMLArchive
 import os
 
+# Las descargas de WSDL/XSD se guardan en disco: los workers y reinicios no
+# vuelven a descargarlos mientras no venza el TTL. Lo que se guarda son las
+# descargas, no el WSDL parseado (zeep no permite serializar su Document):
+# cada proceso lo parsea una vez en get_client (10-15 ms los dos servicios,
+# benchmarks.bench_wsdl) y luego reutiliza el cliente en memoria
+WSDL_CACHE_PATH = os.environ.get('SRI_WSDL_CACHE', 'cache/sri_wsdl.db')
+WSDL_CACHE_TTL = int(os.environ.get('SRI_WSDL_CACHE_TTL', 7 * 24 * 3600))
+# (conexión, lectura) en segundos para cada llamada SOAP
+HTTP_TIMEOUT = (
+    float(os.environ.get('SRI_CONNECT_TIMEOUT', 5)),
+    float(os.environ.get('SRI_READ_TIMEOUT', 30))
+)
+HTTP_POOL_SIZE = int(os.environ.get('SRI_HTTP_POOL_SIZE', 10))
+
+# Segmentos comprimidos con todos los XML (generados, firmados, ...)
+XML_ARCHIVE_DIR = os.environ.get('SRI_XML_ARCHIVE_DIR', 'xml_archivo')
+ESTADO_POR_DIRECTORIO = {
+    SRIConfig.DIR_XML_GENERADOS: 'generado',
+    SRIConfig.DIR_XML_FIRMADOS: 'firmado',
+    SRIConfig.DIR_XML_AUTORIZADOS: 'autorizado',
+    SRIConfig.DIR_XML_RECHAZADOS: 'rechazado',
+}
+
+
+class _SqliteCacheMedido(SqliteCache):
+    """SqliteCache que cuenta aciertos y fallos (métrica pos_cache_requests_total)"""
+
+    def get(self, url):
+        data = super().get(url)
+        record_cache('wsdl_disco', data is not None)
+        return data
+
+
+_lock = threading.Lock()
+_pid = None
+_session = None
+_clients = {}
+_archivo = None
+
+
+def _crear_sesion():
+    """Sesión HTTPS con pool de conexiones keep-alive hacia el SRI"""
+    session = Session()
+    session.verify = True
+    # Solo se reintenta la conexión: un envío que llegó al SRI no se repite
+    retries = Retry(connect=2, read=0, status=0, backoff_factor=0.5)
+    adapter = HTTPAdapter(
+        pool_connections=2,
+        pool_maxsize=HTTP_POOL_SIZE,
+        max_retries=retries
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def _reiniciar_si_fork():
+    """Los sockets no se comparten entre procesos: cada proceso arma los suyos"""
+    global _pid, _session
+    if _pid != os.getpid():
+        _pid = os.getpid()
+        _session = None
+        _clients.clear()
+
+
+def get_session():
+    """Sesión HTTP compartida por todos los clientes SOAP del proceso"""
+    global _session
+    with _lock:
+        _reiniciar_si_fork()
+        if _session is None:
+            _session = _crear_sesion()
+        return _session
+
+
+def get_client(wsdl_url):
+    """
+    Cliente SOAP de un WSDL, creado una sola vez por proceso
+
+    El WSDL se lee de la caché en disco; solo se descarga la primera vez o
+    cuando vence WSDL_CACHE_TTL.
+    """
+    session = get_session()
+    with _lock:
+        client = _clients.get(wsdl_url)
+        record_cache('wsdl_cliente', client is not None)
+        if client is None:
+            directorio = os.path.dirname(WSDL_CACHE_PATH)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            transport = Transport(
+                session=session,
+                cache=_SqliteCacheMedido(path=WSDL_CACHE_PATH, timeout=WSDL_CACHE_TTL),
+                timeout=HTTP_TIMEOUT[1],
+                operation_timeout=HTTP_TIMEOUT
+            )
+            client = Client(wsdl_url, transport=transport)
+            _clients[wsdl_url] = client
+        return client
+
+
+def _clave_del_comprobante(comprobante_xml):
+    """claveAcceso de un comprobante autorizado (las respuestas de lote no
+    siempre la incluyen fuera del XML)"""
+    if not comprobante_xml:
+        return None
+    match = re.search(r'<claveAcceso>(\d{49})</claveAcceso>', comprobante_xml)
+    return match.group(1) if match else None
+
+
+def get_archivo():
+    """Archivo de XML del proceso (xml_archive.XMLArchive)"""
+    global _archivo
+    with _lock:
+        if _archivo is None:
+            _archivo = XMLArchive(XML_ARCHIVE_DIR)
+        return _archivo
+
+
 class SRIClient:
     
     def __init__(self):
-        """Inicializa el cliente SOAP del SRI"""
-        # Configurar sesión HTTP
-        session = Session()
-        session.verify = True
-        transport = Transport(session=session)
-        
-        # Crear clientes SOAP
+        """Inicializa el cliente SOAP del SRI (clientes y sesión compartidos por proceso)"""
         try:
-            self.client_recepcion = Client(
-                SRIConfig.URL_RECEPCION,
-                transport=transport
-            )
-            self.client_autorizacion = Client(
-                SRIConfig.URL_AUTORIZACION,
-                transport=transport
-            )
+            self.client_recepcion = get_client(SRIConfig.URL_RECEPCION)
+            self.client_autorizacion = get_client(SRIConfig.URL_AUTORIZACION)
             
             ambiente = "PRUEBAS" if SRIConfig.AMBIENTE_ACTUAL == 1 else "PRODUCCIÓN"
             print(f"✅ Cliente SRI iniciado - Ambiente: {ambiente}")
@@ -51,7 +165,8 @@ class SRIClient:
             
             # Llamar al servicio
             print("📤 Enviando comprobante al SRI...")
-            response = self.client_recepcion.service.validarComprobante(xml_bytes)
+            with observe(SRI_CALL_LATENCY, service='recepcion', operation='validarComprobante'):
+                response = self.client_recepcion.service.validarComprobante(xml_bytes)
             
             # Procesar respuesta
             estado = response.estado if hasattr(response, 'estado') else 'ERROR'
@@ -67,15 +182,7 @@ class SRIClient:
                 if response.comprobantes and hasattr(response.comprobantes, 'comprobante'):
                     comprobante = response.comprobantes.comprobante[0]
                     if hasattr(comprobante, 'mensajes'):
-                        errores = []
-                        for mensaje in comprobante.mensajes.mensaje:
-                            error_info = {
-                                'identificador': mensaje.identificador if hasattr(mensaje, 'identificador') else '',
-                                'mensaje': mensaje.mensaje if hasattr(mensaje, 'mensaje') else '',
-                                'tipo': mensaje.tipo if hasattr(mensaje, 'tipo') else '',
-                                'informacion_adicional': mensaje.informacionAdicional if hasattr(mensaje, 'informacionAdicional') else ''
-                            }
-                            errores.append(error_info)
+                        errores = self._errores_recepcion(comprobante)
                         resultado['errores'] = errores
                         resultado['mensaje'] = errores[0]['mensaje'] if errores else 'Error desconocido'
             
@@ -93,10 +200,90 @@ class SRIClient:
                 'mensaje': f'Error al enviar comprobante: {str(e)}'
             }
     
+    @staticmethod
+    def _errores_recepcion(comprobante):
+        """Mensajes de un <comprobante> devuelto por la recepción"""
+        errores = []
+        if not getattr(comprobante, 'mensajes', None):
+            return errores
+        for mensaje in comprobante.mensajes.mensaje:
+            errores.append({
+                'identificador': mensaje.identificador if hasattr(mensaje, 'identificador') else '',
+                'mensaje': mensaje.mensaje if hasattr(mensaje, 'mensaje') else '',
+                'tipo': mensaje.tipo if hasattr(mensaje, 'tipo') else '',
+                'informacion_adicional': mensaje.informacionAdicional if hasattr(mensaje, 'informacionAdicional') else ''
+            })
+        return errores
+    
+    def enviar_lote(self, lote_xml, claves_acceso):
+        """
+        Envía un lote masivo (ver XMLGenerator.generar_lote_xml) en una sola
+        llamada a la recepción
+        
+        Args:
+            lote_xml: String con el XML del lote
+            claves_acceso: claves de los comprobantes incluidos en el lote
+        
+        Returns:
+            dict clave_acceso -> resultado con el formato de enviar_comprobante
+        """
+        try:
+            print(f"📤 Enviando lote de {len(claves_acceso)} comprobantes al SRI...")
+            with observe(SRI_CALL_LATENCY, service='recepcion', operation='validarComprobanteLote'):
+                response = self.client_recepcion.service.validarComprobante(lote_xml.encode('utf-8'))
+            estado = response.estado if hasattr(response, 'estado') else 'ERROR'
+        except Exception as e:
+            estado = 'ERROR'
+            mensaje = f'Error al enviar lote: {str(e)}'
+        else:
+            mensaje = f'Lote {estado}'
+        
+        if estado not in ('RECIBIDA', 'DEVUELTA'):
+            return {
+                clave: {'success': False, 'estado': 'ERROR', 'mensaje': mensaje}
+                for clave in claves_acceso
+            }
+        
+        # La respuesta solo lista los comprobantes con errores
+        devueltos = {}
+        if getattr(response, 'comprobantes', None) and hasattr(response.comprobantes, 'comprobante'):
+            for comprobante in response.comprobantes.comprobante:
+                errores = self._errores_recepcion(comprobante)
+                devueltos[getattr(comprobante, 'claveAcceso', None)] = {
+                    'success': False,
+                    'estado': 'DEVUELTA',
+                    'mensaje': errores[0]['mensaje'] if errores else 'Error desconocido',
+                    'errores': errores
+                }
+        
+        # DEVUELTA sin errores de comprobantes del lote: se rechazó el lote
+        # completo (estructura, clave del lote, tamaño...)
+        error_lote = None
+        if estado == 'DEVUELTA' and not any(clave in devueltos for clave in claves_acceso):
+            error_lote = next(iter(devueltos.values()), {
+                'success': False, 'estado': 'DEVUELTA', 'mensaje': mensaje, 'errores': []
+            })
+        
+        resultados = {}
+        for clave in claves_acceso:
+            if clave in devueltos:
+                resultados[clave] = devueltos[clave]
+            elif error_lote is not None:
+                resultados[clave] = dict(error_lote)
+            else:
+                resultados[clave] = {'success': True, 'estado': 'RECIBIDA', 'mensaje': ''}
+        
+        recibidos = sum(1 for r in resultados.values() if r['success'])
+        print(f"{'✅' if recibidos == len(resultados) else '⚠️ '} Lote: {recibidos}/{len(resultados)} comprobantes RECIBIDOS")
+        return resultados
+    
     def consultar_autorizacion(self, clave_acceso, intentos_maximos=10, tiempo_espera=3):
         """
         Consulta el estado de autorización de un comprobante
         
+        Bloquea entre intentos; para no retener un worker HTTP se usa
+        sri_pipeline, que consulta con consultar_autorizacion_una_vez.
+        
         Args:
             clave_acceso: Clave de acceso del comprobante (49 dígitos)
             intentos_maximos: Número máximo de intentos
@@ -108,75 +295,17 @@ class SRIClient:
         print(f"🔍 Consultando autorización...")
         
         for intento in range(intentos_maximos):
-            try:
-                # Esperar antes de consultar (excepto en el primer intento)
-                if intento > 0:
-                    print(f"⏳ Esperando {tiempo_espera} segundos... (Intento {intento + 1}/{intentos_maximos})")
-                    time.sleep(tiempo_espera)
-                
-                # Consultar autorización
-                response = self.client_autorizacion.service.autorizacionComprobante(clave_acceso)
-                
-                # Verificar si hay autorizaciones
-                if not hasattr(response, 'autorizaciones') or not response.autorizaciones:
-                    continue
-                
-                # Obtener primera autorización
-                autorizacion = response.autorizaciones.autorizacion[0]
-                estado = autorizacion.estado if hasattr(autorizacion, 'estado') else 'ERROR'
-                
-                resultado = {
-                    'success': estado == 'AUTORIZADO',
-                    'estado': estado,
-                    'clave_acceso': clave_acceso
-                }
-                
-                # Si está autorizado
-                if estado == 'AUTORIZADO':
-                    resultado['numero_autorizacion'] = autorizacion.numeroAutorizacion
-                    resultado['fecha_autorizacion'] = str(autorizacion.fechaAutorizacion)
-                    resultado['ambiente'] = autorizacion.ambiente
-                    resultado['comprobante_xml'] = autorizacion.comprobante
-                    
-                    # Extraer mensajes/advertencias
-                    if hasattr(autorizacion, 'mensajes'):
-                        advertencias = []
-                        for mensaje in autorizacion.mensajes.mensaje:
-                            advertencias.append({
-                                'identificador': mensaje.identificador if hasattr(mensaje, 'identificador') else '',
-                                'mensaje': mensaje.mensaje if hasattr(mensaje, 'mensaje') else '',
-                                'tipo': mensaje.tipo if hasattr(mensaje, 'tipo') else ''
-                            })
-                        resultado['advertencias'] = advertencias
-                    
-                    print(f"✅ Comprobante AUTORIZADO")
-                    print(f"   Número autorización: {resultado['numero_autorizacion']}")
-                    print(f"   Fecha: {resultado['fecha_autorizacion']}")
-                    return resultado
-                
-                # Si fue rechazado
-                elif estado in ['NO AUTORIZADO', 'RECHAZADO']:
-                    errores = []
-                    if hasattr(autorizacion, 'mensajes'):
-                        for mensaje in autorizacion.mensajes.mensaje:
-                            errores.append({
-                                'identificador': mensaje.identificador if hasattr(mensaje, 'identificador') else '',
-                                'mensaje': mensaje.mensaje if hasattr(mensaje, 'mensaje') else '',
-                                'tipo': mensaje.tipo if hasattr(mensaje, 'tipo') else ''
-                            })
-                    resultado['errores'] = errores
-                    resultado['mensaje'] = errores[0]['mensaje'] if errores else 'Comprobante no autorizado'
-                    
-                    print(f"❌ Comprobante NO AUTORIZADO: {resultado['mensaje']}")
-                    return resultado
-                
-            except Exception as e:
-                if intento == intentos_maximos - 1:
-                    return {
-                        'success': False,
-                        'estado': 'ERROR',
-                        'mensaje': f'Error consultando autorización: {str(e)}'
-                    }
+            # Esperar antes de consultar (excepto en el primer intento)
+            if intento > 0:
+                print(f"⏳ Esperando {tiempo_espera} segundos... (Intento {intento + 1}/{intentos_maximos})")
+                time.sleep(tiempo_espera)
+            
+            resultado = self.consultar_autorizacion_una_vez(clave_acceso)
+            if resultado['estado'] == 'EN PROCESO':
+                continue
+            if resultado['estado'] == 'ERROR' and intento < intentos_maximos - 1:
+                continue
+            return resultado
         
         # Si llegamos aquí, se agotaron los intentos
         return {
@@ -185,16 +314,140 @@ class SRIClient:
             'mensaje': 'Se agotó el tiempo de espera para la autorización'
         }
     
+    def consultar_autorizacion_una_vez(self, clave_acceso):
+        """
+        Una sola consulta de autorización, sin esperas
+        
+        Returns:
+            dict con 'estado': AUTORIZADO, NO AUTORIZADO/RECHAZADO, EN PROCESO
+            (el SRI todavía no responde) o ERROR (falla de red o del servicio)
+        """
+        try:
+            with observe(SRI_CALL_LATENCY, service='autorizacion', operation='autorizacionComprobante'):
+                response = self.client_autorizacion.service.autorizacionComprobante(clave_acceso)
+        except Exception as e:
+            return {
+                'success': False,
+                'estado': 'ERROR',
+                'clave_acceso': clave_acceso,
+                'mensaje': f'Error consultando autorización: {str(e)}'
+            }
+        
+        # Verificar si hay autorizaciones
+        if not hasattr(response, 'autorizaciones') or not response.autorizaciones:
+            return {'success': False, 'estado': 'EN PROCESO', 'clave_acceso': clave_acceso}
+        
+        return self._resultado_autorizacion(response.autorizaciones.autorizacion[0], clave_acceso)
+    
+    def consultar_autorizacion_lote(self, clave_lote):
+        """
+        Autorizaciones de todos los comprobantes de un lote en una consulta
+        
+        Returns:
+            dict clave_acceso -> resultado con el formato de
+            consultar_autorizacion_una_vez; los comprobantes sin respuesta
+            todavía no aparecen
+        """
+        try:
+            with observe(SRI_CALL_LATENCY, service='autorizacion', operation='autorizacionComprobanteLote'):
+                response = self.client_autorizacion.service.autorizacionComprobanteLote(clave_lote)
+        except Exception as e:
+            print(f"❌ Error consultando lote {clave_lote}: {str(e)}")
+            return {}
+        
+        if not hasattr(response, 'autorizaciones') or not response.autorizaciones:
+            return {}
+        
+        resultados = {}
+        for autorizacion in response.autorizaciones.autorizacion:
+            clave = getattr(autorizacion, 'claveAcceso', None) or _clave_del_comprobante(
+                getattr(autorizacion, 'comprobante', None)
+            )
+            if clave:
+                resultados[clave] = self._resultado_autorizacion(autorizacion, clave)
+        return resultados
+    
+    def _resultado_autorizacion(self, autorizacion, clave_acceso):
+        """Convierte un elemento <autorizacion> de la respuesta en dict"""
+        estado = autorizacion.estado if hasattr(autorizacion, 'estado') else 'ERROR'
+        
+        resultado = {
+            'success': estado == 'AUTORIZADO',
+            'estado': estado,
+            'clave_acceso': clave_acceso
+        }
+        
+        # Si está autorizado
+        if estado == 'AUTORIZADO':
+            resultado['numero_autorizacion'] = autorizacion.numeroAutorizacion
+            resultado['fecha_autorizacion'] = str(autorizacion.fechaAutorizacion)
+            resultado['ambiente'] = autorizacion.ambiente
+            resultado['comprobante_xml'] = autorizacion.comprobante
+            
+            # Extraer mensajes/advertencias
+            if hasattr(autorizacion, 'mensajes') and autorizacion.mensajes:
+                advertencias = []
+                for mensaje in autorizacion.mensajes.mensaje:
+                    advertencias.append({
+                        'identificador': mensaje.identificador if hasattr(mensaje, 'identificador') else '',
+                        'mensaje': mensaje.mensaje if hasattr(mensaje, 'mensaje') else '',
+                        'tipo': mensaje.tipo if hasattr(mensaje, 'tipo') else ''
+                    })
+                resultado['advertencias'] = advertencias
+            
+            print(f"✅ Comprobante AUTORIZADO")
+            print(f"   Número autorización: {resultado['numero_autorizacion']}")
+            print(f"   Fecha: {resultado['fecha_autorizacion']}")
+        
+        # Si fue rechazado
+        elif estado in ['NO AUTORIZADO', 'RECHAZADO']:
+            errores = []
+            if hasattr(autorizacion, 'mensajes') and autorizacion.mensajes:
+                for mensaje in autorizacion.mensajes.mensaje:
+                    errores.append({
+                        'identificador': mensaje.identificador if hasattr(mensaje, 'identificador') else '',
+                        'mensaje': mensaje.mensaje if hasattr(mensaje, 'mensaje') else '',
+                        'tipo': mensaje.tipo if hasattr(mensaje, 'tipo') else ''
+                    })
+            resultado['errores'] = errores
+            resultado['mensaje'] = errores[0]['mensaje'] if errores else 'Comprobante no autorizado'
+            
+            print(f"❌ Comprobante NO AUTORIZADO: {resultado['mensaje']}")
+        
+        else:
+            # Cualquier otro estado (p. ej. EN PROCESO): aún no hay respuesta final
+            resultado['estado'] = 'EN PROCESO'
+        
+        return resultado
+    
     def guardar_xml(self, xml_contenido, clave_acceso, directorio):
         """
-        Guarda un XML en el directorio especificado
+        Guarda un XML en el archivo comprimido (xml_archive)
+        
+        Args:
+            directorio: SRIConfig.DIR_XML_* según el estado del comprobante
         """
         try:
-            filepath = os.path.join(directorio, f"{clave_acceso}.xml")
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(xml_contenido)
-            print(f"💾 XML guardado: {filepath}")
-            return filepath
+            estado = ESTADO_POR_DIRECTORIO[directorio]
+            segmento = get_archivo().guardar(clave_acceso, estado, xml_contenido)
+            print(f"💾 XML {estado} guardado: {clave_acceso}")
+            return segmento
         except Exception as e:
             print(f"❌ Error guardando XML: {str(e)}")
-            return None
\ No newline at end of file
+            return None
+    
+    def leer_xml(self, clave_acceso, directorio):
+        """
+        Lee un XML guardado con guardar_xml (None si no existe)
+        
+        Los XML anteriores al archivo comprimido se buscan como archivos
+        sueltos en el directorio.
+        """
+        xml = get_archivo().leer(clave_acceso, ESTADO_POR_DIRECTORIO[directorio])
+        if xml is not None:
+            return xml
+        try:
+            with open(os.path.join(directorio, f"{clave_acceso}.xml"), 'r', encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
@@ -1,93 +1,236 @@
 """
 Firma electrónica de XMLs según estándar XAdES-BES
 """
+from base64 import b64encode
 from lxml import etree
-from signxml import XMLSigner
-from cryptography.hazmat.primitives.serialization import pkcs12
-from cryptography.hazmat.backends import default_backend
+from signxml import DigestAlgorithm, SignatureMethod, methods
+from signxml.util import ds_tag, xades_tag
+from signxml.xades import (
+    XAdESDataObjectFormat, XAdESSignatureConfiguration, XAdESSigner, XAdESVerifier
+)
+from cryptography.hazmat.primitives.serialization import Encoding, pkcs12
+from concurrent.futures import ProcessPoolExecutor
 from config import SRIConfig
-import base64
+import multiprocessing
+import os
+import threading
+
+# La verificación también debe aceptar SHA1 (signxml lo rechaza por defecto).
+# Referencias esperadas: comprobante, SignedProperties y KeyInfo
+_SHA1_VERIFY_CONFIG = XAdESSignatureConfiguration(
+    signature_methods=frozenset({SignatureMethod.RSA_SHA1}),
+    digest_algorithms=frozenset({DigestAlgorithm.SHA1}),
+    expect_references=3
+)
+
+
+class SRISigner(XAdESSigner):
+    """
+    Firmador XAdES-BES con el perfil del SRI (XAdES 1.3.2, RSA-SHA1)
+
+    signxml rechaza SHA1 por defecto; aquí se permite explícitamente. Además
+    emite xades:SigningCertificate (digest SHA1 + IssuerSerial) en lugar de
+    SigningCertificateV2, que es de XAdES 1.4.1 y el SRI no lo reconoce.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(
+            data_object_format=XAdESDataObjectFormat(
+                Description='contenido comprobante', MimeType='text/xml'
+            ),
+            **kwargs
+        )
+
+    def check_deprecated_methods(self):
+        pass
+
+    def add_signing_certificate(self, signed_signature_properties, sig_root, signing_settings):
+        cert = signing_settings.cert_chain[0]
+        digest = self._get_digest(cert.public_bytes(Encoding.DER), algorithm=DigestAlgorithm.SHA1)
+
+        signing_cert = etree.SubElement(signed_signature_properties, xades_tag('SigningCertificate'))
+        cert_node = etree.SubElement(signing_cert, xades_tag('Cert'))
+        cert_digest = etree.SubElement(cert_node, xades_tag('CertDigest'))
+        etree.SubElement(cert_digest, ds_tag('DigestMethod'), Algorithm=DigestAlgorithm.SHA1.value)
+        etree.SubElement(cert_digest, ds_tag('DigestValue')).text = b64encode(digest).decode()
+        issuer_serial = etree.SubElement(cert_node, xades_tag('IssuerSerial'))
+        etree.SubElement(issuer_serial, ds_tag('X509IssuerName')).text = cert.issuer.rfc4514_string()
+        etree.SubElement(issuer_serial, ds_tag('X509SerialNumber')).text = str(cert.serial_number)
+
+
+# Firmador de cada proceso del pool de firma por lotes (ver firmar_lote)
+_firmador_worker = None
+
+
+def _iniciar_worker(cert_path, cert_password):
+    """Inicializador del pool: descifra el .p12 una vez por proceso"""
+    global _firmador_worker
+    _firmador_worker = FirmaElectronica(cert_path, cert_password)
+
+
+def _firmar_en_worker(xml_string):
+    try:
+        return {'success': True, 'xml': _firmador_worker.firmar_xml(xml_string)}
+    except Exception as e:
+        return {'success': False, 'error': str(e)}
+
 
 class FirmaElectronica:
-    
-    def __init__(self):
-        self.cert_path = SRIConfig.CERTIFICADO_PATH
-        self.cert_password = SRIConfig.CERTIFICADO_PASSWORD
+
+    def __init__(self, cert_path=None, cert_password=None):
+        """
+        Descifra el .p12 una sola vez y conserva la llave y la cadena de
+        certificados listas para firmar.
+
+        Args:
+            cert_path: ruta del .p12 (por defecto SRIConfig.CERTIFICADO_PATH)
+            cert_password: clave del .p12 (por defecto SRIConfig.CERTIFICADO_PASSWORD)
+        """
+        self.cert_path = cert_path or SRIConfig.CERTIFICADO_PATH
+        self.cert_password = cert_password if cert_password is not None else SRIConfig.CERTIFICADO_PASSWORD
+        self.private_key = None
+        self.certificate = None
+        self.cert_chain = []
+        # Un firmador por hilo: signxml guarda un parser de lxml, que no se
+        # debe compartir entre hilos
+        self._local = threading.local()
         self._cargar_certificado()
-    
+
     def _cargar_certificado(self):
         """Carga el certificado .p12"""
         try:
             with open(self.cert_path, 'rb') as f:
                 p12_data = f.read()
-                
+
+            password = self.cert_password
+            if isinstance(password, str):
+                password = password.encode('utf-8')
+
             # Decrypt PKCS12 data (password must be bytes)
             private_key, certificate, additional_certs = pkcs12.load_key_and_certificates(
-                p12_data, self.cert_password, default_backend()
+                p12_data, password
             )
-            
+
+            if private_key is None or certificate is None:
+                raise ValueError('El .p12 no contiene llave privada y certificado')
+
+            # Objetos ya parseados: signxml los usa sin volver a leer PEM
+            self.private_key = private_key
+            self.certificate = certificate
+            self.cert_chain = [certificate] + list(additional_certs or [])
+
             print("✅ Certificado cargado correctamente")
         except FileNotFoundError:
             raise Exception(f"❌ No se encontró el certificado en: {self.cert_path}")
         except Exception as e:
             raise Exception(f"❌ Error al cargar certificado: {str(e)}")
-    
+
+    def _signer(self):
+        signer = getattr(self._local, 'signer', None)
+        if signer is None:
+            signer = SRISigner(
+                method=methods.enveloped,
+                signature_algorithm='rsa-sha1',
+                digest_algorithm='sha1',
+                c14n_algorithm='http://www.w3.org/TR/2001/REC-xml-c14n-20010315'
+            )
+            self._local.signer = signer
+        return signer
+
     def firmar_xml(self, xml_string):
         """
         Firma un XML con el estándar XAdES-BES
-        
+
         Args:
             xml_string: String con el XML a firmar
-        
+
         Returns:
             str: XML firmado
         """
         try:
             # Parsear XML
             root = etree.fromstring(xml_string.encode('utf-8'))
-            
-            # Crear firmador con XAdES-BES
-            signer = XMLSigner(
-                method=XMLSigner.Methods.enveloped,
-                signature_algorithm='rsa-sha1',
-                digest_algorithm='sha1',
-                c14n_algorithm='http://www.w3.org/TR/2001/REC-xml-c14n-20010315'
-            )
-            
-            # Firmar
-            signed_root = signer.sign(
+
+            # Firmar (firmador y llave reutilizados: solo digest + RSA)
+            signed_root = self._signer().sign(
                 root,
-                key=crypto.dump_privatekey(crypto.FILETYPE_PEM, self.private_key),
-                cert=crypto.dump_certificate(crypto.FILETYPE_PEM, self.certificate),
+                key=self.private_key,
+                cert=self.cert_chain,
                 reference_uri='#comprobante'
             )
-            
-            # Convertir de vuelta a string
+
+            # Convertir de vuelta a string. Sin pretty_print: cualquier espacio
+            # agregado después de firmar cambia el digest y anula la firma
             signed_xml = etree.tostring(
                 signed_root,
-                pretty_print=True,
                 xml_declaration=True,
                 encoding='UTF-8'
             ).decode('utf-8')
-            
-            print("✅ XML firmado correctamente")
+
             return signed_xml
-            
+
         except Exception as e:
             raise Exception(f"❌ Error firmando XML: {str(e)}")
-    
+
+    def firmar_lote(self, xml_strings, workers=None, chunksize=None):
+        """
+        Firma muchos XML en paralelo en un pool de procesos
+
+        La firma (C14N + RSA) es CPU y no se paraleliza con hilos por el GIL.
+        Cada proceso descifra el .p12 una sola vez al iniciar. Pensado para
+        lotes grandes: el pipeline lo usa al retomar muchas facturas que
+        quedaron sin firmar (FacturacionPipeline._firmar_recuperadas).
+
+        Args:
+            xml_strings: lista de XML sin firmar
+            workers: procesos (por defecto uno por núcleo)
+            chunksize: XML por envío a cada proceso (por defecto automático)
+
+        Returns:
+            lista en el mismo orden con {'success', 'xml'} o {'success', 'error'};
+            un XML inválido no detiene el resto del lote
+        """
+        xml_strings = list(xml_strings)
+        workers = workers or os.cpu_count() or 1
+        workers = min(workers, len(xml_strings))
+
+        # Lotes chicos o un solo núcleo: arrancar procesos cuesta más que firmar
+        if workers <= 1 or len(xml_strings) < 2 * workers:
+            resultados = []
+            for xml_string in xml_strings:
+                try:
+                    resultados.append({'success': True, 'xml': self.firmar_xml(xml_string)})
+                except Exception as e:
+                    resultados.append({'success': False, 'error': str(e)})
+            return resultados
+
+        if chunksize is None:
+            chunksize = max(1, len(xml_strings) // (workers * 4))
+
+        # spawn: el servidor tiene hilos (gunicorn, pools de Sheets) y hacer
+        # fork de un proceso con hilos no es seguro
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_iniciar_worker,
+            initargs=(self.cert_path, self.cert_password)
+        ) as pool:
+            return list(pool.map(_firmar_en_worker, xml_strings, chunksize=chunksize))
+
     def verificar_firma(self, xml_firmado):
         """
         Verifica que la firma sea válida
         """
         try:
-            from signxml import XMLVerifier
-            
             root = etree.fromstring(xml_firmado.encode('utf-8'))
-            verified_data = XMLVerifier().verify(root)
-            
+            XAdESVerifier().verify(
+                root,
+                x509_cert=self.certificate,
+                expect_config=_SHA1_VERIFY_CONFIG
+            )
+
             print("✅ Firma verificada correctamente")
             return True
         except Exception as e:
             print(f"❌ Error verificando firma: {str(e)}")
-            return False
\ No newline at end of file
+            return False
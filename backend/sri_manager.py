@@ -6,9 +6,16 @@ from sri_xml_generator import XMLGenerator
 from sri_firma_electronica import FirmaElectronica
 from sri_facturacion import SRIClient
 from config import SRIConfig
-import json
+from secuenciales import SecuencialAllocator
+from sri_validacion import VALIDAR_XSD, validar_factura
+from tracing import tracer
+import os
 from datetime import datetime
 
+# Límites de un lote masivo del SRI
+LOTE_MAX_COMPROBANTES = int(os.environ.get('SRI_LOTE_MAX_COMPROBANTES', 50))
+LOTE_MAX_BYTES = int(os.environ.get('SRI_LOTE_MAX_BYTES', 500 * 1024))
+
 class SRIManager:
     
     def __init__(self):
@@ -21,33 +28,19 @@ class SRIManager:
         self.firmador = FirmaElectronica()
         self.sri_client = SRIClient()
         
-        # Cargar último secuencial
-        self.secuencial_actual = self._cargar_secuencial()
+        # Secuenciales reservados por bloques, únicos entre workers
+        self.secuenciales = SecuencialAllocator()
         
         print("✅ SRI Manager iniciado correctamente")
     
-    def _cargar_secuencial(self):
-        """Carga el último secuencial usado"""
-        try:
-            with open('secuencial.json', 'r') as f:
-                data = json.load(f)
-                return data.get('ultimo_secuencial', 0)
-        except FileNotFoundError:
-            return 0
-    
-    def _guardar_secuencial(self):
-        """Guarda el secuencial actual"""
-        try:
-            with open('secuencial.json', 'w') as f:
-                json.dump({'ultimo_secuencial': self.secuencial_actual}, f)
-        except Exception as e:
-            print(f"❌ Error guardando secuencial: {str(e)}")
+    @property
+    def secuencial_actual(self):
+        """Último secuencial entregado por este proceso"""
+        return self.secuenciales.ultimo
     
     def _incrementar_secuencial(self):
-        """Incrementa el secuencial"""
-        self.secuencial_actual += 1
-        self._guardar_secuencial()
-        return self.secuencial_actual
+        """Siguiente secuencial (ver secuenciales.SecuencialAllocator)"""
+        return self.secuenciales.siguiente()
     
     def preparar_datos_venta(self, venta_pos):
         """
@@ -134,6 +127,52 @@ class SRIManager:
             'telefono': cliente.get('telefono', '')
         }
     
+    @staticmethod
+    def armar_lotes(comprobantes):
+        """
+        Reparte (clave_acceso, xml_firmado) en lotes que respetan los límites
+        de cantidad y tamaño del SRI
+        """
+        lotes, actual, tamano = [], [], 0
+        for clave, xml_firmado in comprobantes:
+            bytes_xml = len(xml_firmado.encode('utf-8'))
+            if actual and (len(actual) >= LOTE_MAX_COMPROBANTES or tamano + bytes_xml > LOTE_MAX_BYTES):
+                lotes.append(actual)
+                actual, tamano = [], 0
+            actual.append((clave, xml_firmado))
+            tamano += bytes_xml
+        if actual:
+            lotes.append(actual)
+        return lotes
+    
+    def enviar_lote(self, comprobantes):
+        """
+        Envía muchos comprobantes firmados en lotes masivos (pocas llamadas
+        en lugar de una por comprobante)
+        
+        Args:
+            comprobantes: lista de (clave_acceso, xml_firmado)
+        
+        Returns:
+            dict clave_acceso -> resultado con el formato de
+            SRIClient.enviar_comprobante más 'clave_lote'
+        """
+        resultados = {}
+        for lote in self.armar_lotes(comprobantes):
+            claves = [clave for clave, _ in lote]
+            # El lote usa el secuencial de su primer comprobante
+            secuencial = int(claves[0][30:39])
+            with tracer.span('lote', comprobantes=len(lote)) as span:
+                lote_xml, clave_lote = self.xml_generator.generar_lote_xml(
+                    [xml_firmado for _, xml_firmado in lote],
+                    secuencial
+                )
+                span.set('bytes', len(lote_xml))
+                for clave, resultado in self.sri_client.enviar_lote(lote_xml, claves).items():
+                    resultado['clave_lote'] = clave_lote
+                    resultados[clave] = resultado
+        return resultados
+    
     def emitir_factura(self, venta_pos, cliente):
         """
         Proceso completo de emisión de factura electrónica
@@ -145,13 +184,22 @@ class SRIManager:
         Returns:
             dict con resultado de la emisión
         """
+        with tracer.trace('emitir_factura', items=len(venta_pos.get('cart', []))) as trace:
+            resultado = self._emitir_factura(venta_pos, cliente)
+            trace.set('success', resultado['success'])
+            if resultado.get('clave_acceso'):
+                trace.set('clave_acceso', resultado['clave_acceso'])
+            return resultado
+
+    def _emitir_factura(self, venta_pos, cliente):
         try:
             print("\n" + "="*60)
             print("🧾 INICIANDO EMISIÓN DE FACTURA ELECTRÓNICA")
             print("="*60)
             
             # 1. Obtener siguiente secuencial
-            secuencial = self._incrementar_secuencial()
+            with tracer.span('secuencial'):
+                secuencial = self._incrementar_secuencial()
             print(f"📄 Secuencial: {str(secuencial).zfill(9)}")
             
             # 2. Preparar datos
@@ -163,35 +211,63 @@ class SRIManager:
             
             # 3. Generar XML
             print("\n📝 Generando XML...")
-            xml_sin_firmar, clave_acceso = self.xml_generator.generar_factura_xml(
-                datos_venta,
-                datos_cliente,
-                secuencial
-            )
+            with tracer.span('xml_generation', detalles=len(datos_venta['items'])) as span:
+                xml_sin_firmar, clave_acceso = self.xml_generator.generar_factura_xml(
+                    datos_venta,
+                    datos_cliente,
+                    secuencial
+                )
+                span.set('bytes', len(xml_sin_firmar))
             
             # Guardar XML sin firmar
-            self.sri_client.guardar_xml(
-                xml_sin_firmar,
-                clave_acceso,
-                SRIConfig.DIR_XML_GENERADOS
-            )
+            with tracer.span('xml_persist', estado='generado'):
+                self.sri_client.guardar_xml(
+                    xml_sin_firmar,
+                    clave_acceso,
+                    SRIConfig.DIR_XML_GENERADOS
+                )
             
             print(f"🔑 Clave de acceso: {clave_acceso}")
             
+            # Validar contra el XSD antes de gastar la firma y el envío
+            if VALIDAR_XSD:
+                with tracer.span('xsd_validation') as span:
+                    validacion = validar_factura(xml_sin_firmar)
+                    span.set('valido', validacion['success'])
+                if not validacion['success']:
+                    print(f"❌ {validacion['mensaje']}")
+                    self.sri_client.guardar_xml(
+                        xml_sin_firmar,
+                        clave_acceso,
+                        SRIConfig.DIR_XML_RECHAZADOS
+                    )
+                    return {
+                        'success': False,
+                        'error': validacion['mensaje'],
+                        'errores': validacion['errores'],
+                        'clave_acceso': clave_acceso,
+                        'estado': 'INVALIDO'
+                    }
+            
             # 4. Firmar XML
             print("\n✍️  Firmando XML electrónicamente...")
-            xml_firmado = self.firmador.firmar_xml(xml_sin_firmar)
+            with tracer.span('signing') as span:
+                xml_firmado = self.firmador.firmar_xml(xml_sin_firmar)
+                span.set('bytes', len(xml_firmado))
             
             # Guardar XML firmado
-            self.sri_client.guardar_xml(
-                xml_firmado,
-                clave_acceso,
-                SRIConfig.DIR_XML_FIRMADOS
-            )
+            with tracer.span('xml_persist', estado='firmado'):
+                self.sri_client.guardar_xml(
+                    xml_firmado,
+                    clave_acceso,
+                    SRIConfig.DIR_XML_FIRMADOS
+                )
             
             # 5. Enviar al SRI
             print("\n📤 Enviando comprobante al SRI...")
-            resultado_envio = self.sri_client.enviar_comprobante(xml_firmado)
+            with tracer.span('send') as span:
+                resultado_envio = self.sri_client.enviar_comprobante(xml_firmado)
+                span.set('estado', resultado_envio['estado'])
             
             if not resultado_envio['success']:
                 # Guardar en rechazados
@@ -210,7 +286,9 @@ class SRIManager:
             
             # 6. Consultar autorización
             print("\n⏳ Esperando autorización del SRI...")
-            resultado_autorizacion = self.sri_client.consultar_autorizacion(clave_acceso)
+            with tracer.span('authorization') as span:
+                resultado_autorizacion = self.sri_client.consultar_autorizacion(clave_acceso)
+                span.set('estado', resultado_autorizacion['estado'])
             
             if not resultado_autorizacion['success']:
                 # Guardar en rechazados
@@ -229,11 +307,12 @@ class SRIManager:
                 }
             
             # 7. Guardar XML autorizado
-            self.sri_client.guardar_xml(
-                resultado_autorizacion['comprobante_xml'],
-                clave_acceso,
-                SRIConfig.DIR_XML_AUTORIZADOS
-            )
+            with tracer.span('xml_persist', estado='autorizado'):
+                self.sri_client.guardar_xml(
+                    resultado_autorizacion['comprobante_xml'],
+                    clave_acceso,
+                    SRIConfig.DIR_XML_AUTORIZADOS
+                )
             
             print("\n" + "="*60)
             print("✅ FACTURA ELECTRÓNICA EMITIDA EXITOSAMENTE")
@@ -0,0 +1,715 @@
+"""
+Emisión de facturas electrónicas en segundo plano
+
+SRIManager.emitir_factura hace todo dentro de la petición HTTP: generar,
+firmar, enviar y esperar la autorización (hasta ~30 s de time.sleep), con un
+worker de gunicorn retenido por factura. Aquí la emisión se divide en etapas,
+cada una con su cola acotada y sus hilos:
+
+    generar -> firmar -> enviar -> autorizar
+
+Al generar, el XML se valida contra el XSD (sri_validacion); si no lo
+cumple la factura termina en INVALIDO sin firmarse ni enviarse.
+
+La ruta de venta solo registra la factura y responde de inmediato con su id;
+el resultado se consulta después (/api/invoices/<id>). La etapa de
+autorización toma de una vez todas las claves cuya consulta ya venció, las
+consulta en paralelo y reprograma las que siguen EN PROCESO con espera
+exponencial (1 s, 2 s, 4 s... hasta SRI_POLL_MAX). Del mismo modo, los
+comprobantes que se acumulan en la cola de envío (cierre del día, salida de
+una caída del SRI) se mandan juntos en lotes masivos y su autorización se
+consulta con una llamada por lote.
+
+Cada factura es un JSON en POS_FACTURAS_DIR que se reescribe de forma
+atómica en cada cambio de estado: cualquier worker responde la consulta de
+estado y las facturas a medias de un worker que murió las retoma otro. Las
+terminadas pasan a POS_FACTURAS_DIR/finales.
+"""
+import fcntl
+import heapq
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+from config import SRIConfig
+from sri_manager import LOTE_MAX_COMPROBANTES
+from sri_validacion import VALIDAR_XSD, validar_factura
+from tracing import tracer
+
+# Estados finales: la factura ya no avanza por el pipeline
+ESTADOS_FINALES = ('AUTORIZADO', 'NO AUTORIZADO', 'RECHAZADO', 'DEVUELTA', 'SIN RESPUESTA', 'INVALIDO', 'ERROR')
+
+# El SRI devuelve este error si la clave ya fue recibida (p. ej. un reenvío
+# tras perder la respuesta): se continúa con la autorización
+ERROR_CLAVE_REGISTRADA = '43'
+
+# Cada cuánto se buscan facturas de workers que ya no existen
+INTERVALO_RECUPERACION = 60
+
+# Desde cuántas facturas GENERADA retomadas juntas se firman en paralelo con
+# firmar_lote (arrancar el pool de procesos cuesta ~1 s; a ~500 firmas/s por
+# núcleo no compensa para menos)
+FIRMA_LOTE_MINIMO = int(os.environ.get('SRI_FIRMA_LOTE_MINIMO', 500))
+
+FACTURAS_DIR = os.environ.get('POS_FACTURAS_DIR', 'facturas_pendientes')
+
+
+class FacturaStore:
+    """
+    Estado de las facturas del pipeline, un JSON por id
+
+    Las pendientes están en el directorio principal y las que llegan a un
+    estado final se mueven a finales/: la recuperación periódica solo
+    recorre las pendientes, no todo el historial.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.final_directory = os.path.join(directory, 'finales')
+        os.makedirs(self.final_directory, exist_ok=True)
+
+    def _path(self, factura_id):
+        return os.path.join(self.directory, f'{factura_id}.json')
+
+    def _final_path(self, factura_id):
+        return os.path.join(self.final_directory, f'{factura_id}.json')
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def get(self, factura_id):
+        # Primero la pendiente: si se finaliza entre las dos lecturas, ya
+        # está en finales/
+        record = self._read(self._path(factura_id))
+        if record is None:
+            record = self._read(self._final_path(factura_id))
+        return record
+
+    def save(self, record):
+        record['actualizado'] = datetime.now().isoformat(timespec='seconds')
+        final = record['estado'] in ESTADOS_FINALES
+        path = self._final_path(record['id']) if final else self._path(record['id'])
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+        if final:
+            self._remove(self._path(record['id']))
+
+    def pending(self):
+        """
+        Facturas que todavía no llegan a un estado final
+
+        Una terminada que quedó en el directorio principal (caída entre
+        escribirla en finales/ y borrar la pendiente, o guardada por una
+        versión anterior) se mueve a finales/ aquí.
+        """
+        records = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            factura_id = name[:-5]
+            path = self._path(factura_id)
+            record = self._read(path)
+            if record is None:
+                continue
+            if os.path.exists(self._final_path(factura_id)):
+                self._remove(path)
+            elif record['estado'] in ESTADOS_FINALES:
+                os.replace(path, self._final_path(factura_id))
+            else:
+                records.append(record)
+        return records
+
+
+class FacturacionPipeline:
+
+    def __init__(self, sri_manager, directory=None, queue_size=None, send_workers=None,
+                 send_batch=None, auth_batch=None, auth_concurrency=None, poll_initial=None,
+                 poll_max=None, max_wait=None):
+        """
+        Args:
+            sri_manager: SRIManager (generador, firmador y cliente SOAP)
+            directory: estado de las facturas (POS_FACTURAS_DIR)
+            queue_size: capacidad de cada cola (SRI_QUEUE_SIZE)
+            send_workers: hilos de envío al SRI (SRI_SEND_WORKERS)
+            send_batch: comprobantes por envío; más de 1 usa lotes masivos
+                (SRI_SEND_BATCH, 1 desactiva los lotes)
+            auth_batch: claves consultadas por ronda (SRI_AUTH_BATCH)
+            auth_concurrency: consultas de autorización simultáneas
+                (SRI_AUTH_CONCURRENCY)
+            poll_initial, poll_max: primera espera y espera máxima entre
+                consultas de una misma clave, en segundos
+            max_wait: segundos sin respuesta tras los que una factura queda
+                SIN RESPUESTA (SRI_MAX_WAIT)
+        """
+        env = os.environ.get
+        self.manager = sri_manager
+        self.store = FacturaStore(directory or FACTURAS_DIR)
+        self.queue_size = queue_size or int(env('SRI_QUEUE_SIZE', 100))
+        self.send_workers = send_workers or int(env('SRI_SEND_WORKERS', 2))
+        self.send_batch = send_batch or int(env('SRI_SEND_BATCH', LOTE_MAX_COMPROBANTES))
+        self.auth_batch = auth_batch or int(env('SRI_AUTH_BATCH', 50))
+        self.auth_concurrency = auth_concurrency or int(env('SRI_AUTH_CONCURRENCY', 4))
+        self.poll_initial = poll_initial or float(env('SRI_POLL_INITIAL', 1))
+        self.poll_max = poll_max or float(env('SRI_POLL_MAX', 60))
+        self.max_wait = max_wait or float(env('SRI_MAX_WAIT', 3600))
+
+        # Generar y firmar tienen un solo hilo: el secuencial es correlativo
+        # y la firma es CPU (más hilos no rinden más por el GIL)
+        self._etapas = {
+            'generar': (self._generar, 1),
+            'firmar': (self._firmar, 1),
+        }
+        self._workers = {'generar': 1, 'firmar': 1, 'enviar': self.send_workers, 'autorizar': 1}
+        self._colas = {
+            nombre: queue.Queue(maxsize=self.queue_size)
+            for nombre in self._workers
+        }
+
+        # Reintentos y consultas futuras: (cuándo, orden, etapa, item)
+        self._programadas = []
+        self._orden = itertools.count()
+        self._cond = threading.Condition()
+
+        self._hilos = []
+        self._consultas = None
+        self._lock_fd = None
+        self._detenido = False
+
+    # ----- ciclo de vida -----
+
+    def start(self):
+        """Arranca los hilos y retoma las facturas a medias"""
+        if self._hilos:
+            return self
+        # Lock mientras el proceso viva: indica a los demás que sus
+        # facturas no están huérfanas
+        self._lock_fd = self._tomar_lock(f'proceso-{os.getpid()}.lock')
+
+        self._consultas = ThreadPoolExecutor(
+            max_workers=self.auth_concurrency,
+            thread_name_prefix='sri-autorizacion'
+        )
+        for nombre, (handler, workers) in self._etapas.items():
+            for i in range(workers):
+                self._iniciar_hilo(f'sri-{nombre}-{i}', self._worker, nombre, handler)
+        for i in range(self.send_workers):
+            self._iniciar_hilo(f'sri-enviar-{i}', self._enviador)
+        self._iniciar_hilo('sri-autorizar', self._autorizador)
+        self._iniciar_hilo('sri-programador', self._programador)
+
+        recuperadas = self._recuperar(inicio=True)
+        if recuperadas:
+            print(f"♻️  {recuperadas} facturas pendientes retomadas")
+        print("✅ Pipeline de facturación iniciado")
+        return self
+
+    def _iniciar_hilo(self, nombre, target, *args):
+        hilo = threading.Thread(target=target, args=args, name=nombre, daemon=True)
+        hilo.start()
+        self._hilos.append(hilo)
+
+    def stop(self, timeout=5):
+        """Detiene los hilos; lo que quede pendiente se retoma al reiniciar"""
+        self._detenido = True
+        with self._cond:
+            self._cond.notify_all()
+        for nombre, cola in self._colas.items():
+            for _ in range(self._workers[nombre]):
+                try:
+                    cola.put(None, timeout=timeout)
+                except queue.Full:
+                    pass
+        for hilo in self._hilos:
+            hilo.join(timeout)
+        self._hilos = []
+        if self._consultas is not None:
+            self._consultas.shutdown(wait=False)
+        if self._lock_fd is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    # ----- API -----
+
+    def submit(self, venta_pos, cliente):
+        """
+        Registra una factura para emitir en segundo plano
+
+        Nunca rechaza la factura: si la cola de generación está llena queda
+        guardada y el programador la encola apenas haya espacio.
+
+        Returns:
+            dict de estado (ver get)
+        """
+        ahora = datetime.now()
+        record = {
+            'id': f"FAC-{ahora.strftime('%Y%m%d')}-{uuid.uuid4().hex[:8]}",
+            'estado': 'EN COLA',
+            'sale_id': venta_pos.get('sale_id'),
+            'creado': ahora.isoformat(timespec='seconds'),
+            'pid': os.getpid(),
+            'venta': venta_pos,
+            'cliente': cliente,
+            'intentos': 0,
+        }
+        self.store.save(record)
+        self._encolar('generar', {'id': record['id']})
+        return self.public(record)
+
+    def get(self, factura_id):
+        record = self.store.get(factura_id)
+        return self.public(record) if record is not None else None
+
+    def saturated(self):
+        """True si la cola de generación está llena (para responder 503)"""
+        return self._colas['generar'].full()
+
+    def stats(self):
+        with self._cond:
+            programadas = len(self._programadas)
+        return {
+            'colas': {nombre: cola.qsize() for nombre, cola in self._colas.items()},
+            'programadas': programadas,
+            'capacidad': self.queue_size
+        }
+
+    @staticmethod
+    def public(record):
+        """Estado de la factura sin los datos de entrada de la venta"""
+        return {k: v for k, v in record.items() if k not in ('venta', 'cliente', 'pid')}
+
+    # ----- colas y programador -----
+
+    def _encolar(self, etapa, item):
+        """
+        Toda entrega a una cola pasa por aquí y nunca bloquea: si la cola
+        está llena el item se reprograma. Con put() bloqueante dos etapas que
+        se devuelven trabajo (firmar <-> generar, enviar <-> firmar) pueden
+        quedar esperándose con las dos colas llenas.
+        """
+        try:
+            self._colas[etapa].put_nowait(item)
+        except queue.Full:
+            self._programar(1, etapa, item)
+
+    def _programar(self, segundos, etapa, item):
+        with self._cond:
+            heapq.heappush(self._programadas, (time.monotonic() + segundos, next(self._orden), etapa, item))
+            self._cond.notify()
+
+    def _programador(self):
+        """Pasa a su cola lo programado que ya venció y retoma huérfanas"""
+        proxima_recuperacion = time.monotonic() + INTERVALO_RECUPERACION
+        while not self._detenido:
+            vencidas = []
+            with self._cond:
+                ahora = time.monotonic()
+                while self._programadas and self._programadas[0][0] <= ahora:
+                    vencidas.append(heapq.heappop(self._programadas))
+                if not vencidas:
+                    siguiente = self._programadas[0][0] if self._programadas else proxima_recuperacion
+                    self._cond.wait(max(0.0, min(siguiente, proxima_recuperacion) - ahora))
+
+            for _, _, etapa, item in vencidas:
+                self._encolar(etapa, item)
+
+            if time.monotonic() >= proxima_recuperacion:
+                proxima_recuperacion = time.monotonic() + INTERVALO_RECUPERACION
+                try:
+                    self._recuperar()
+                except Exception as e:
+                    print(f"❌ Error retomando facturas pendientes: {str(e)}")
+
+    def _espera(self, intentos):
+        return min(self.poll_initial * 2 ** intentos, self.poll_max)
+
+    def _vencida(self, record):
+        desde = datetime.fromisoformat(record['creado'])
+        return (datetime.now() - desde).total_seconds() > self.max_wait
+
+    # ----- etapas -----
+
+    def _worker(self, etapa, handler):
+        cola = self._colas[etapa]
+        while True:
+            item = cola.get()
+            if item is None:
+                break
+            record = self.store.get(item['id'])
+            if record is None or record['estado'] in ESTADOS_FINALES:
+                continue
+            try:
+                with tracer.trace(f'factura_{etapa}', factura=record['id']):
+                    handler(record, item)
+            except Exception as e:
+                print(f"❌ Error en etapa {etapa} de {record['id']}: {str(e)}")
+                self._finalizar(record, 'ERROR', error=f'Error en etapa {etapa}: {str(e)}')
+
+    def _generar(self, record, item):
+        manager = self.manager
+        # Al retomar una factura se conserva su secuencial
+        secuencial = record.get('secuencial') or manager._incrementar_secuencial()
+        record['secuencial'] = secuencial
+        self.store.save(record)
+
+        datos_venta = manager.preparar_datos_venta(record['venta'])
+        datos_cliente = manager.preparar_datos_cliente(record['cliente'])
+        with tracer.span('xml_generation', detalles=len(datos_venta['items'])):
+            xml, clave_acceso = manager.xml_generator.generar_factura_xml(
+                datos_venta, datos_cliente, secuencial
+            )
+        with tracer.span('xml_persist', estado='generado'):
+            manager.sri_client.guardar_xml(xml, clave_acceso, SRIConfig.DIR_XML_GENERADOS)
+
+        numero = str(secuencial).zfill(9)
+        record.update({
+            'estado': 'GENERADA',
+            'clave_acceso': clave_acceso,
+            'numero_factura': f"{SRIConfig.CODIGO_ESTABLECIMIENTO}-{SRIConfig.CODIGO_PUNTO_EMISION}-{numero}",
+            'total': datos_venta['total'],
+        })
+
+        if VALIDAR_XSD:
+            with tracer.span('xsd_validation'):
+                validacion = validar_factura(xml)
+            if not validacion['success']:
+                manager.sri_client.guardar_xml(xml, clave_acceso, SRIConfig.DIR_XML_RECHAZADOS)
+                self._finalizar(record, 'INVALIDO', error=validacion['mensaje'], errores=validacion['errores'])
+                return
+        self.store.save(record)
+        self._encolar('firmar', {'id': record['id'], 'xml': xml})
+
+    def _firmar(self, record, item):
+        manager = self.manager
+        xml = item.get('xml') or manager.sri_client.leer_xml(record['clave_acceso'], SRIConfig.DIR_XML_GENERADOS)
+        if xml is None:
+            self._encolar('generar', {'id': record['id']})
+            return
+
+        with tracer.span('signing'):
+            xml_firmado = manager.firmador.firmar_xml(xml)
+        with tracer.span('xml_persist', estado='firmado'):
+            manager.sri_client.guardar_xml(xml_firmado, record['clave_acceso'], SRIConfig.DIR_XML_FIRMADOS)
+
+        record['estado'] = 'FIRMADA'
+        self.store.save(record)
+        self._encolar('enviar', {'id': record['id'], 'xml': xml_firmado})
+
+    def _tomar_lote(self, cola, maximo):
+        """
+        Espera un item y se lleva además los que ya estén en la cola
+        
+        Returns:
+            lista de items o None si llegó la señal de parada
+        """
+        item = cola.get()
+        if item is None:
+            return None
+        items = [item]
+        while len(items) < maximo:
+            try:
+                item = cola.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                cola.put(None)
+                break
+            items.append(item)
+        return items
+
+    def _enviador(self):
+        """Envía los comprobantes en cola: uno solo directo, varios en lote"""
+        cola = self._colas['enviar']
+        client = self.manager.sri_client
+        while True:
+            items = self._tomar_lote(cola, self.send_batch)
+            if items is None:
+                break
+
+            pendientes = []
+            for item in items:
+                record = self.store.get(item['id'])
+                if record is None or record['estado'] in ESTADOS_FINALES:
+                    continue
+                xml_firmado = item.get('xml') or client.leer_xml(record['clave_acceso'], SRIConfig.DIR_XML_FIRMADOS)
+                if xml_firmado is None:
+                    self._encolar('firmar', {'id': record['id']})
+                    continue
+                pendientes.append((record, xml_firmado))
+            if not pendientes:
+                continue
+
+            error = 'Sin respuesta del SRI para el comprobante'
+            try:
+                with tracer.trace('factura_enviar', comprobantes=len(pendientes)):
+                    if len(pendientes) == 1:
+                        record, xml_firmado = pendientes[0]
+                        with tracer.span('send') as span:
+                            resultado = client.enviar_comprobante(xml_firmado)
+                            span.set('estado', resultado['estado'])
+                        resultados = {record['clave_acceso']: resultado}
+                    else:
+                        resultados = self.manager.enviar_lote(
+                            [(record['clave_acceso'], xml_firmado) for record, xml_firmado in pendientes]
+                        )
+            except Exception as e:
+                resultados = {}
+                error = f'Error al enviar: {str(e)}'
+
+            for record, xml_firmado in pendientes:
+                resultado = resultados.get(record['clave_acceso']) or {
+                    'success': False, 'estado': 'ERROR', 'mensaje': error
+                }
+                try:
+                    self._procesar_envio(record, resultado, xml_firmado)
+                except Exception as e:
+                    print(f"❌ Error procesando envío de {record['id']}: {str(e)}")
+                    self._finalizar(record, 'ERROR', error=str(e))
+
+    def _procesar_envio(self, record, resultado, xml_firmado):
+        errores = resultado.get('errores', [])
+        registrada = any(str(e.get('identificador')) == ERROR_CLAVE_REGISTRADA for e in errores)
+
+        if resultado['success'] or registrada:
+            record.update({'estado': 'RECIBIDA', 'intentos': 0})
+            if resultado['success'] and resultado.get('clave_lote'):
+                record['clave_lote'] = resultado['clave_lote']
+            self.store.save(record)
+            self._programar(self.poll_initial, 'autorizar', {'id': record['id']})
+        elif resultado['estado'] == 'ERROR':
+            # Falla de red o del servicio: se reintenta el envío
+            record['intentos'] += 1
+            record['mensaje'] = resultado.get('mensaje', '')
+            if self._vencida(record):
+                self._finalizar(record, 'ERROR', error=record['mensaje'])
+            else:
+                self.store.save(record)
+                self._programar(self._espera(record['intentos']), 'enviar', {'id': record['id'], 'xml': xml_firmado})
+        else:
+            self.manager.sri_client.guardar_xml(xml_firmado, record['clave_acceso'], SRIConfig.DIR_XML_RECHAZADOS)
+            self._finalizar(record, resultado['estado'], error=resultado.get('mensaje', ''), errores=errores)
+
+    def _autorizador(self):
+        """
+        Consulta en paralelo todas las claves que ya toca revisar
+
+        Los comprobantes enviados en lote se consultan con una sola llamada
+        por lote; los demás, uno por uno.
+        """
+        cola = self._colas['autorizar']
+        client = self.manager.sri_client
+        while True:
+            items = self._tomar_lote(cola, self.auth_batch)
+            if items is None:
+                break
+
+            grupos = {}
+            for item in items:
+                record = self.store.get(item['id'])
+                if record is None or record['estado'] != 'RECIBIDA':
+                    continue
+                grupos.setdefault(record.get('clave_lote') or record['clave_acceso'], []).append(record)
+            if not grupos:
+                continue
+
+            def consultar(records):
+                if records[0].get('clave_lote'):
+                    por_clave = client.consultar_autorizacion_lote(records[0]['clave_lote'])
+                    return [
+                        por_clave.get(r['clave_acceso']) or
+                        {'success': False, 'estado': 'EN PROCESO', 'clave_acceso': r['clave_acceso']}
+                        for r in records
+                    ]
+                return [client.consultar_autorizacion_una_vez(r['clave_acceso']) for r in records]
+
+            try:
+                with tracer.trace('factura_autorizar', claves=sum(map(len, grupos.values())), consultas=len(grupos)):
+                    respuestas = list(self._consultas.map(consultar, grupos.values()))
+            except Exception as e:
+                respuestas = [
+                    [{'success': False, 'estado': 'ERROR', 'mensaje': str(e)}] * len(records)
+                    for records in grupos.values()
+                ]
+
+            for records, resultados in zip(grupos.values(), respuestas):
+                for record, resultado in zip(records, resultados):
+                    try:
+                        self._procesar_autorizacion(record, resultado)
+                    except Exception as e:
+                        print(f"❌ Error procesando autorización de {record['id']}: {str(e)}")
+                        self._finalizar(record, 'ERROR', error=str(e))
+
+    def _procesar_autorizacion(self, record, resultado):
+        client = self.manager.sri_client
+        estado = resultado['estado']
+
+        if estado == 'AUTORIZADO':
+            client.guardar_xml(resultado['comprobante_xml'], record['clave_acceso'], SRIConfig.DIR_XML_AUTORIZADOS)
+            self._finalizar(
+                record, 'AUTORIZADO',
+                numero_autorizacion=resultado['numero_autorizacion'],
+                fecha_autorizacion=resultado['fecha_autorizacion'],
+                ambiente=resultado['ambiente'],
+                advertencias=resultado.get('advertencias', [])
+            )
+        elif estado in ('NO AUTORIZADO', 'RECHAZADO'):
+            xml_firmado = client.leer_xml(record['clave_acceso'], SRIConfig.DIR_XML_FIRMADOS)
+            if xml_firmado is not None:
+                client.guardar_xml(xml_firmado, record['clave_acceso'], SRIConfig.DIR_XML_RECHAZADOS)
+            self._finalizar(record, estado, error=resultado.get('mensaje', ''), errores=resultado.get('errores', []))
+        else:
+            # EN PROCESO o falla de red: se vuelve a consultar más tarde
+            record['intentos'] += 1
+            if self._vencida(record):
+                self._finalizar(record, 'SIN RESPUESTA',
+                                error='El SRI no respondió la autorización a tiempo')
+            else:
+                self.store.save(record)
+                self._programar(self._espera(record['intentos']), 'autorizar', {'id': record['id']})
+
+    def _finalizar(self, record, estado, error=None, **datos):
+        record.update(datos)
+        record['estado'] = estado
+        record['success'] = estado == 'AUTORIZADO'
+        if error:
+            record['error'] = error
+        record['terminado'] = datetime.now().isoformat(timespec='seconds')
+        self.store.save(record)
+        if estado == 'AUTORIZADO':
+            print(f"✅ Factura {record.get('numero_factura')} AUTORIZADA ({record['id']})")
+        else:
+            print(f"❌ Factura {record['id']} terminó en {estado}: {error or ''}")
+
+    # ----- recuperación -----
+
+    def _tomar_lock(self, nombre, bloquear=True):
+        path = os.path.join(self.store.directory, nombre)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if bloquear else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    @contextmanager
+    def _lock(self, nombre):
+        fd = self._tomar_lock(nombre)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _proceso_vivo(self, pid):
+        if pid == os.getpid():
+            return True
+        path = os.path.join(self.store.directory, f'proceso-{pid}.lock')
+        if not os.path.exists(path):
+            return False
+        fd = self._tomar_lock(f'proceso-{pid}.lock', bloquear=False)
+        if fd is None:
+            return True
+        # Nadie tiene el lock: el proceso terminó
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return False
+
+    def _recuperar(self, inicio=False):
+        """
+        Retoma las facturas sin terminar de procesos que ya no existen
+
+        Al iniciar también toma las que tienen el pid propio (un reinicio
+        del contenedor puede repetir pids). Si quedaron muchas sin firmar
+        (caída larga, salida de contingencia) se firman en bloque en un hilo
+        aparte en lugar de pasar una por una por la etapa de firma.
+        """
+        recuperadas = 0
+        sin_firmar = []
+        with self._lock('recuperacion.lock'):
+            for record in self.store.pending():
+                pid = record.get('pid')
+                if pid == os.getpid() and not inicio:
+                    continue
+                if pid != os.getpid() and self._proceso_vivo(pid):
+                    continue
+
+                record['pid'] = os.getpid()
+                self.store.save(record)
+                recuperadas += 1
+                if record['estado'] == 'GENERADA':
+                    sin_firmar.append(record)
+                    continue
+                etapa = {
+                    'EN COLA': 'generar',
+                    'GENERADA': 'firmar',
+                    'FIRMADA': 'enviar',
+                    'RECIBIDA': 'autorizar',
+                }[record['estado']]
+                self._encolar(etapa, {'id': record['id']})
+
+        if len(sin_firmar) >= FIRMA_LOTE_MINIMO:
+            threading.Thread(target=self._firmar_recuperadas, args=(sin_firmar,),
+                             name='sri-refirma', daemon=True).start()
+        else:
+            for record in sin_firmar:
+                self._encolar('firmar', {'id': record['id']})
+        return recuperadas
+
+    def _firmar_recuperadas(self, records):
+        """Firma en paralelo (firmar_lote) las facturas GENERADA retomadas"""
+        client = self.manager.sri_client
+        listas, xmls = [], []
+        for record in records:
+            xml = client.leer_xml(record['clave_acceso'], SRIConfig.DIR_XML_GENERADOS)
+            if xml is None:
+                self._encolar('generar', {'id': record['id']})
+                continue
+            listas.append(record)
+            xmls.append(xml)
+
+        try:
+            with tracer.trace('factura_firmar_lote', comprobantes=len(xmls)):
+                resultados = self.manager.firmador.firmar_lote(xmls)
+        except Exception as e:
+            print(f"❌ Error firmando {len(xmls)} facturas en bloque: {str(e)}")
+            for record in listas:
+                self._encolar('firmar', {'id': record['id']})
+            return
+
+        firmadas = 0
+        for record, resultado in zip(listas, resultados):
+            if not resultado['success']:
+                self._finalizar(record, 'ERROR', error=f"Error en etapa firmar: {resultado['error']}")
+                continue
+            client.guardar_xml(resultado['xml'], record['clave_acceso'], SRIConfig.DIR_XML_FIRMADOS)
+            record['estado'] = 'FIRMADA'
+            self.store.save(record)
+            self._encolar('enviar', {'id': record['id']})
+            firmadas += 1
+        print(f"✅ {firmadas} facturas retomadas firmadas en bloque")
@@ -0,0 +1,81 @@
+"""
+Validación local de facturas contra el XSD del SRI antes de firmarlas
+
+Un XML mal formado hoy se descubre recién cuando la recepción lo devuelve,
+después de firmarlo y de un viaje de ida y vuelta al SRI. El esquema se
+compila una sola vez por proceso y cada factura se valida en memoria
+(décimas de milisegundo) antes de la firma; los errores salen con el mismo
+formato que los mensajes de la recepción.
+"""
+import os
+import threading
+from lxml import etree
+
+XSD_FACTURA_PATH = os.environ.get(
+    'SRI_XSD_FACTURA',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'xsd', 'factura_V1.1.0.xsd')
+)
+VALIDAR_XSD = os.environ.get('SRI_VALIDAR_XSD', '1') == '1'
+
+_schemas = {}
+_lock = threading.Lock()
+
+
+def get_schema(path=None):
+    """XMLSchema compilado (uno por proceso y archivo)"""
+    path = path or XSD_FACTURA_PATH
+    schema = _schemas.get(path)
+    if schema is None:
+        with _lock:
+            schema = _schemas.get(path)
+            if schema is None:
+                schema = etree.XMLSchema(etree.parse(path))
+                _schemas[path] = schema
+    return schema
+
+
+def _error(mensaje, linea=None, elemento=None):
+    return {
+        'identificador': 'XSD',
+        'mensaje': mensaje,
+        'tipo': 'ERROR',
+        'informacion_adicional': ': '.join(str(v) for v in (f'línea {linea}' if linea else None, elemento) if v),
+        'linea': linea,
+        'elemento': elemento
+    }
+
+
+def validar_factura(xml, path=None):
+    """
+    Valida el XML de una factura contra el esquema
+
+    Args:
+        xml: String o bytes con el XML (sin firmar o firmado)
+        path: XSD a usar (por defecto SRI_XSD_FACTURA)
+
+    Returns:
+        dict con 'success', 'mensaje' y 'errores' (mismo formato que los
+        mensajes de la recepción, más 'linea' y 'elemento')
+    """
+    if isinstance(xml, str):
+        xml = xml.encode('utf-8')
+    try:
+        doc = etree.fromstring(xml)
+    except etree.XMLSyntaxError as e:
+        errores = [_error(f'XML mal formado: {e.msg}', e.lineno)]
+        return {'success': False, 'mensaje': errores[0]['mensaje'], 'errores': errores}
+
+    schema = get_schema(path)
+    # validate() y error_log comparten estado dentro del esquema
+    with _lock:
+        valido = schema.validate(doc)
+        log = list(schema.error_log) if not valido else []
+
+    if valido:
+        return {'success': True, 'mensaje': 'XML válido', 'errores': []}
+    errores = [_error(entry.message, entry.line, entry.path) for entry in log]
+    return {
+        'success': False,
+        'mensaje': f"XML no cumple el esquema: {errores[0]['mensaje']}",
+        'errores': errores
+    }
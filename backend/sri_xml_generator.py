@@ -3,9 +3,78 @@ Generador de XML para Facturas Electrónicas según esquema SRI
 """
 from lxml import etree
 from datetime import datetime
+import os
 import random
+import re
 from config import SRIConfig
 
+# Con SRI_XML_PRETTY=1 la factura se arma con lxml e indentada (útil para
+# revisar los XML a mano); por defecto se usa la plantilla sin indentar
+XML_PRETTY = os.environ.get('SRI_XML_PRETTY', '0') == '1'
+
+# Caracteres que lxml no acepta en texto ni atributos
+_NO_XML = re.compile('[^\t\n\r\x20-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]')
+
+
+def _texto(valor):
+    """Texto de un elemento escapado igual que lo serializa lxml"""
+    if _NO_XML.search(valor):
+        raise ValueError('All strings must be XML compatible: Unicode or ASCII, no NULL bytes or control characters')
+    return valor.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('\r', '&#13;')
+
+
+def _atributo(valor):
+    """Valor de un atributo escapado igual que lo serializa lxml"""
+    return _texto(valor).replace('"', '&quot;').replace('\n', '&#10;').replace('\t', '&#9;')
+
+
+_plantillas = {}
+
+
+def _plantilla_emisor():
+    """
+    Partes fijas de la factura (datos del emisor de SRIConfig) ya
+    serializadas, entre los huecos de clave de acceso, secuencial y fecha
+
+    Se arma una vez por configuración: si cambia SRIConfig se genera otra.
+    """
+    config = (
+        SRIConfig.AMBIENTE_ACTUAL, SRIConfig.TIPO_EMISION_NORMAL, SRIConfig.RAZON_SOCIAL,
+        SRIConfig.NOMBRE_COMERCIAL, SRIConfig.RUC_EMISOR, SRIConfig.CODIGO_ESTABLECIMIENTO,
+        SRIConfig.CODIGO_PUNTO_EMISION, SRIConfig.DIR_MATRIZ, SRIConfig.DIR_ESTABLECIMIENTO,
+        SRIConfig.CONTRIBUYENTE_ESPECIAL, SRIConfig.OBLIGADO_CONTABILIDAD
+    )
+    plantilla = _plantillas.get(config)
+    if plantilla is None:
+        contribuyente = ''
+        if SRIConfig.CONTRIBUYENTE_ESPECIAL:
+            contribuyente = f'<contribuyenteEspecial>{_texto(SRIConfig.CONTRIBUYENTE_ESPECIAL)}</contribuyenteEspecial>'
+        plantilla = (
+            # hasta la clave de acceso
+            "<?xml version='1.0' encoding='UTF-8'?>\n"
+            '<factura id="comprobante" version="1.1.0"><infoTributaria>'
+            f'<ambiente>{SRIConfig.AMBIENTE_ACTUAL}</ambiente>'
+            f'<tipoEmision>{SRIConfig.TIPO_EMISION_NORMAL}</tipoEmision>'
+            f'<razonSocial>{_texto(SRIConfig.RAZON_SOCIAL)}</razonSocial>'
+            f'<nombreComercial>{_texto(SRIConfig.NOMBRE_COMERCIAL)}</nombreComercial>'
+            f'<ruc>{_texto(SRIConfig.RUC_EMISOR)}</ruc><claveAcceso>',
+            # hasta el secuencial
+            '</claveAcceso><codDoc>01</codDoc>'
+            f'<estab>{_texto(SRIConfig.CODIGO_ESTABLECIMIENTO)}</estab>'
+            f'<ptoEmi>{_texto(SRIConfig.CODIGO_PUNTO_EMISION)}</ptoEmi><secuencial>',
+            # hasta la fecha de emisión
+            f'</secuencial><dirMatriz>{_texto(SRIConfig.DIR_MATRIZ)}</dirMatriz>'
+            '</infoTributaria><infoFactura><fechaEmision>',
+            # después de la fecha
+            '</fechaEmision>'
+            f'<dirEstablecimiento>{_texto(SRIConfig.DIR_ESTABLECIMIENTO)}</dirEstablecimiento>'
+            f'{contribuyente}'
+            f'<obligadoContabilidad>{_texto(SRIConfig.OBLIGADO_CONTABILIDAD)}</obligadoContabilidad>'
+        )
+        _plantillas[config] = plantilla
+    return plantilla
+
+
 class XMLGenerator:
     
     @staticmethod
@@ -97,12 +166,102 @@ class XMLGenerator:
             secuencial: int número secuencial de la factura
         
         Returns:
-            str: XML generado como string
+            tuple: (xml_string, clave_acceso)
         """
-        
         fecha_emision = datetime.now()
         clave_acceso = XMLGenerator.generar_clave_acceso(fecha_emision, secuencial)
         
+        if XML_PRETTY:
+            xml_string = XMLGenerator.construir_factura_arbol(
+                datos_venta, datos_cliente, secuencial, fecha_emision, clave_acceso
+            )
+        else:
+            xml_string = XMLGenerator.construir_factura(
+                datos_venta, datos_cliente, secuencial, fecha_emision, clave_acceso
+            )
+        return xml_string, clave_acceso
+    
+    @staticmethod
+    def construir_factura(datos_venta, datos_cliente, secuencial, fecha_emision, clave_acceso):
+        """
+        Serializa la factura directamente a texto sobre la plantilla del emisor
+        
+        Solo se arman las partes de cada venta (cliente, totales, detalles e
+        información adicional). El resultado es el mismo documento que
+        construir_factura_arbol(..., pretty_print=False), byte a byte.
+        
+        Returns:
+            str: XML sin indentar
+        """
+        inicio, antes_secuencial, antes_fecha, emisor = _plantilla_emisor()
+        
+        subtotal = datos_venta['subtotal_sin_impuestos']
+        descuento = datos_venta.get('descuento_total', 0.00)
+        iva_total = datos_venta['iva_total']
+        total = datos_venta['total']
+        
+        partes = [
+            inicio, clave_acceso,
+            antes_secuencial, str(secuencial).zfill(9),
+            antes_fecha, fecha_emision.strftime('%d/%m/%Y'),
+            emisor,
+            f"<tipoIdentificacionComprador>{_texto(datos_cliente['tipo_identificacion'])}</tipoIdentificacionComprador>"
+            f"<razonSocialComprador>{_texto(datos_cliente['razon_social'])}</razonSocialComprador>"
+            f"<identificacionComprador>{_texto(datos_cliente['identificacion'])}</identificacionComprador>"
+        ]
+        if datos_cliente.get('direccion'):
+            partes.append(f"<direccionComprador>{_texto(datos_cliente['direccion'])}</direccionComprador>")
+        partes.append(
+            f"<totalSinImpuestos>{subtotal:.2f}</totalSinImpuestos>"
+            f"<totalDescuento>{descuento:.2f}</totalDescuento>"
+            "<totalConImpuestos><totalImpuesto><codigo>2</codigo>"
+            f"<codigoPorcentaje>{_texto(datos_venta['codigo_porcentaje_iva'])}</codigoPorcentaje>"
+            f"<baseImponible>{subtotal:.2f}</baseImponible>"
+            f"<valor>{iva_total:.2f}</valor></totalImpuesto></totalConImpuestos>"
+            "<propina>0.00</propina>"
+            f"<importeTotal>{total:.2f}</importeTotal>"
+            "<moneda>DOLAR</moneda>"
+            f"<pagos><pago><formaPago>{_texto(datos_venta.get('forma_pago', '01'))}</formaPago>"
+            f"<total>{total:.2f}</total></pago></pagos>"
+            "</infoFactura><detalles>"
+        )
+        
+        for item in datos_venta['items']:
+            base = f"{item['precio_total_sin_impuesto']:.2f}"
+            partes.append(
+                f"<detalle><codigoPrincipal>{_texto(item['codigo'])}</codigoPrincipal>"
+                f"<descripcion>{_texto(item['descripcion'])}</descripcion>"
+                f"<cantidad>{item['cantidad']:.6f}</cantidad>"
+                f"<precioUnitario>{item['precio_unitario']:.6f}</precioUnitario>"
+                f"<descuento>{item.get('descuento', 0.00):.2f}</descuento>"
+                f"<precioTotalSinImpuesto>{base}</precioTotalSinImpuesto>"
+                "<impuestos><impuesto><codigo>2</codigo>"
+                f"<codigoPorcentaje>{_texto(item['codigo_porcentaje_iva'])}</codigoPorcentaje>"
+                f"<tarifa>{_texto(item['tarifa_iva'])}</tarifa>"
+                f"<baseImponible>{base}</baseImponible>"
+                f"<valor>{item['valor_iva']:.2f}</valor></impuesto></impuestos></detalle>"
+            )
+        partes.append("</detalles>")
+        
+        if datos_venta.get('info_adicional'):
+            partes.append("<infoAdicional>")
+            for campo in datos_venta['info_adicional']:
+                partes.append(
+                    f"<campoAdicional nombre=\"{_atributo(campo['nombre'])}\">{_texto(campo['valor'])}</campoAdicional>"
+                )
+            partes.append("</infoAdicional>")
+        partes.append("</factura>")
+        
+        return ''.join(partes)
+    
+    @staticmethod
+    def construir_factura_arbol(datos_venta, datos_cliente, secuencial, fecha_emision, clave_acceso, pretty_print=True):
+        """
+        Arma la factura elemento por elemento con lxml
+        
+        Returns:
+            str: XML (indentado si pretty_print)
+        """
         # Crear elemento raíz
         factura = etree.Element(
             "factura",
@@ -204,11 +363,40 @@ class XMLGenerator:
                 campo_adicional.text = campo['valor']
         
         # Convertir a string con declaración XML
-        xml_string = etree.tostring(
+        return etree.tostring(
             factura,
-            pretty_print=True,
+            pretty_print=pretty_print,
+            xml_declaration=True,
+            encoding='UTF-8'
+        ).decode('utf-8')
+    
+    @staticmethod
+    def generar_lote_xml(comprobantes_firmados, secuencial):
+        """
+        Genera el XML de un lote masivo con comprobantes ya firmados
+        
+        Cada comprobante va completo (con su firma) dentro de un CDATA.
+        
+        Args:
+            comprobantes_firmados: lista de XML firmados
+            secuencial: int secuencial para la clave de acceso del lote
+        
+        Returns:
+            tuple: (xml_string, clave_acceso_lote)
+        """
+        clave_lote = XMLGenerator.generar_clave_acceso(datetime.now(), secuencial)
+        
+        lote = etree.Element("lote", version="1.0.0")
+        etree.SubElement(lote, "claveAcceso").text = clave_lote
+        etree.SubElement(lote, "ruc").text = SRIConfig.RUC_EMISOR
+        comprobantes = etree.SubElement(lote, "comprobantes")
+        for xml_firmado in comprobantes_firmados:
+            etree.SubElement(comprobantes, "comprobante").text = etree.CDATA(xml_firmado)
+        
+        xml_string = etree.tostring(
+            lote,
             xml_declaration=True,
             encoding='UTF-8'
         ).decode('utf-8')
         
-        return xml_string, clave_acceso
\ No newline at end of file
+        return xml_string, clave_lote
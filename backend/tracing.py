@@ -0,0 +1,145 @@
+"""
+Trazas livianas por etapa para los flujos de venta y facturación
+
+Cada operación (una venta, una factura) abre una traza con tracer.trace() y
+cada etapa interna se mide con tracer.span(). Las trazas terminadas quedan en
+un buffer circular en memoria (consultable vía /api/traces) y, si la variable
+POS_TRACE_FILE está definida, también se agregan como JSON por línea a ese
+archivo.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class Span:
+    """Una etapa medida dentro de una traza"""
+
+    def __init__(self, name, attributes=None):
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.start = time.perf_counter()
+        self.duration_ms = None
+        self.error = None
+
+    def set(self, key, value):
+        """Agrega o reemplaza un atributo (cantidad de ítems, bytes, ...)"""
+        self.attributes[key] = value
+
+    def finish(self):
+        self.duration_ms = round((time.perf_counter() - self.start) * 1000, 3)
+
+    def to_dict(self):
+        data = {
+            'name': self.name,
+            'duration_ms': self.duration_ms,
+            'attributes': self.attributes
+        }
+        if self.error:
+            data['error'] = self.error
+        return data
+
+
+class Trace(Span):
+    """Operación completa compuesta por varias etapas"""
+
+    def __init__(self, name, attributes=None):
+        super().__init__(name, attributes)
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.started_at = datetime.now().isoformat(timespec='milliseconds')
+        self.spans = []
+
+    def to_dict(self):
+        data = super().to_dict()
+        data.update({
+            'trace_id': self.trace_id,
+            'started_at': self.started_at,
+            'spans': [span.to_dict() for span in self.spans]
+        })
+        return data
+
+
+class Tracer:
+
+    def __init__(self, capacity=500, export_path=None):
+        self._buffer = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.export_path = export_path
+
+    @contextmanager
+    def trace(self, name, **attributes):
+        """Abre una traza raíz para el hilo actual"""
+        trace = Trace(name, attributes)
+        previous = getattr(self._local, 'trace', None)
+        self._local.trace = trace
+        try:
+            yield trace
+        except Exception as e:
+            trace.error = str(e)
+            raise
+        finally:
+            trace.finish()
+            self._local.trace = previous
+            self._record(trace)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Mide una etapa de la traza activa (si no hay traza, solo mide)"""
+        span = Span(name, attributes)
+        try:
+            yield span
+        except Exception as e:
+            span.error = str(e)
+            raise
+        finally:
+            span.finish()
+            trace = getattr(self._local, 'trace', None)
+            if trace is not None:
+                trace.spans.append(span)
+
+    def current(self):
+        """Traza activa del hilo actual o None"""
+        return getattr(self._local, 'trace', None)
+
+    def _record(self, trace):
+        data = trace.to_dict()
+        with self._lock:
+            self._buffer.append(data)
+            if self.export_path:
+                try:
+                    with open(self.export_path, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(data, default=str) + '\n')
+                except Exception as e:
+                    print(f"❌ Error exportando traza: {str(e)}")
+
+    def query(self, name=None, min_duration_ms=None, limit=50):
+        """Devuelve las trazas más recientes primero, con filtros opcionales"""
+        with self._lock:
+            traces = list(self._buffer)
+
+        traces.reverse()
+        if name:
+            traces = [t for t in traces if t['name'] == name]
+        if min_duration_ms is not None:
+            traces = [t for t in traces if t['duration_ms'] >= min_duration_ms]
+        return traces[:limit]
+
+    def get(self, trace_id):
+        """Busca una traza por su id"""
+        with self._lock:
+            for trace in self._buffer:
+                if trace['trace_id'] == trace_id:
+                    return trace
+        return None
+
+
+tracer = Tracer(
+    capacity=int(os.environ.get('POS_TRACE_BUFFER', 500)),
+    export_path=os.environ.get('POS_TRACE_FILE')
+)
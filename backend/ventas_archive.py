@@ -0,0 +1,153 @@
+"""
+Archivo histórico de Ventas en archivos columnares locales
+
+Los meses ya cerrados se sacan de la hoja Ventas y se guardan en un archivo
+Arrow IPC (Feather v2) por mes: ventas-YYYY-MM.arrow. Así la hoja viva solo
+contiene el mes en curso y las consultas históricas abren únicamente los
+meses que tocan (poda por partición) en lugar de descargar toda la hoja.
+
+Los archivos se leen con memory map. Por defecto van comprimidos con zstd
+(POS_ARCHIVE_COMPRESSION); con 'uncompressed' la lectura no copia los datos.
+"""
+import os
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+from gspread.utils import numericise_all
+
+# Columnas guardadas como números; el resto se guarda como texto tal como
+# lo muestra la hoja
+NUMERIC_COLUMNS = {'Cantidad', 'PrecioUnitario', 'Subtotal', 'TotalVenta', 'CostoUnitario'}
+
+
+def _to_float(value):
+    if value == '' or value is None:
+        return None
+    return float(str(value).replace(',', ''))
+
+
+class VentasArchive:
+
+    def __init__(self, directory, compression=None):
+        """
+        Args:
+            directory: directorio de las particiones mensuales
+            compression: 'zstd', 'lz4' o 'uncompressed'
+                (por defecto POS_ARCHIVE_COMPRESSION o 'zstd')
+        """
+        self.directory = directory
+        self.compression = compression or os.environ.get('POS_ARCHIVE_COMPRESSION', 'zstd')
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, month):
+        return os.path.join(self.directory, f'ventas-{month}.arrow')
+
+    def months(self):
+        """Meses archivados (YYYY-MM) en orden"""
+        return sorted(
+            name[7:-6] for name in os.listdir(self.directory)
+            if name.startswith('ventas-') and name.endswith('.arrow')
+        )
+
+    def has_month(self, month):
+        return os.path.exists(self._path(month))
+
+    def sale_ids(self, month):
+        """VentaID guardados en la partición del mes"""
+        if not self.has_month(month):
+            return set()
+        return set(self._read(month).column('VentaID').to_pylist())
+
+    def _read(self, month):
+        with pa.memory_map(self._path(month)) as source:
+            return pa.ipc.open_file(source).read_all()
+
+    def write_month(self, month, headers, rows):
+        """
+        Agrega filas de la hoja (valores como texto) a la partición del mes
+
+        Las ventas cuyo VentaID ya está en la partición se omiten, así que
+        repetir un archivado interrumpido no duplica filas.
+
+        Returns:
+            cantidad de filas agregadas
+        """
+        existing = self._read(month) if self.has_month(month) else None
+        if existing is not None and 'VentaID' in existing.column_names:
+            archived_ids = set(existing.column('VentaID').to_pylist())
+            id_index = headers.index('VentaID')
+            rows = [row for row in rows if row[id_index] not in archived_ids]
+        if not rows:
+            return 0
+
+        columns = {}
+        for i, name in enumerate(headers):
+            values = [row[i] if i < len(row) else '' for row in rows]
+            if name in NUMERIC_COLUMNS:
+                columns[name] = pa.array([_to_float(v) for v in values], type=pa.float64())
+            else:
+                columns[name] = pa.array([str(v) for v in values], type=pa.string())
+        table = pa.table(columns)
+
+        if existing is not None:
+            table = pa.concat_tables([existing, table], promote_options='default')
+
+        # Escritura atómica: una consulta nunca abre una partición a medias
+        path = self._path(month)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        feather.write_feather(table, tmp_path, compression=self.compression)
+        os.replace(tmp_path, path)
+        return len(rows)
+
+    def query(self, date_from=None, date_to=None, limit=None):
+        """
+        Ventas archivadas entre date_from y date_to (YYYY-MM-DD, inclusive)
+
+        Solo se abren los meses dentro del rango. Con `limit` se devuelven las
+        últimas `limit` filas y se leen los meses desde el más reciente hasta
+        completarlas.
+
+        Returns:
+            lista de registros con el mismo formato que get_all_records()
+        """
+        months = [
+            month for month in self.months()
+            if (not date_from or month >= date_from[:7])
+            and (not date_to or month <= date_to[:7])
+        ]
+
+        tables = []
+        count = 0
+        for month in reversed(months):
+            table = self._read(month)
+            if date_from and month == date_from[:7]:
+                table = table.filter(pc.greater_equal(table['Fecha'], date_from))
+            if date_to and month == date_to[:7]:
+                table = table.filter(pc.less_equal(table['Fecha'], date_to))
+            tables.append(table)
+            count += table.num_rows
+            if limit and count >= limit:
+                break
+
+        records = []
+        for table in reversed(tables):
+            records.extend(self._to_records(table))
+        if limit:
+            records = records[-limit:]
+        return records
+
+    @staticmethod
+    def _to_records(table):
+        columns = {}
+        for name in table.column_names:
+            values = table.column(name).to_pylist()
+            if name in NUMERIC_COLUMNS:
+                columns[name] = [
+                    '' if v is None else int(v) if v.is_integer() else v
+                    for v in values
+                ]
+            else:
+                columns[name] = numericise_all(values)
+        names = list(columns)
+        return [dict(zip(names, row)) for row in zip(*columns.values())]
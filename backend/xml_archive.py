@@ -0,0 +1,321 @@
+"""
+Archivo comprimido de los XML de facturación electrónica
+
+En lugar de un archivo plano por comprobante y estado (xml_generados/,
+xml_firmados/, ...), cada XML se agrega como un registro comprimido con zlib
+al final de un archivo de segmento (solo se escribe al final, nunca se
+reescribe). Un índice SQLite (clave de acceso, estado) -> (segmento,
+posición, longitud) permite leer cualquier XML con una búsqueda por clave y
+una sola lectura posicional, y listar por fecha de emisión y estado.
+
+Las facturas de un mismo emisor comparten casi todo menos los detalles: los
+datos del emisor, la estructura de la firma y el certificado (~1.5 KB en
+base64). El primer XML firmado se guarda como diccionario de zlib y los
+registros siguientes se comprimen contra él, así cada uno ocupa
+aproximadamente lo que tiene de distinto.
+
+Cada proceso escribe en su propio segmento (sin locks entre procesos) y
+cambia de segmento al pasar SRI_XML_SEGMENT_MB. Cada registro lleva una
+cabecera con su clave, estado y CRC, de modo que el índice se puede
+reconstruir desde los segmentos (reindexar).
+"""
+import os
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+
+MAGIC = b'SRIX'
+# magic, clave de acceso, estado, diccionario, guardado (epoch),
+# bytes sin comprimir, bytes comprimidos, crc32 del XML
+HEADER = struct.Struct('>4s49sBHdIII')
+
+ESTADOS = ('generado', 'firmado', 'autorizado', 'rechazado')
+_CODIGO_ESTADO = {estado: i + 1 for i, estado in enumerate(ESTADOS)}
+
+# Tamaño máximo de un diccionario de zlib (la ventana es de 32 KB)
+MAX_DICCIONARIO = 32 * 1024
+
+
+def fecha_emision(clave_acceso):
+    """Fecha de emisión (YYYY-MM-DD) tomada de la clave de acceso (DDMMAAAA...)"""
+    return f'{clave_acceso[4:8]}-{clave_acceso[2:4]}-{clave_acceso[0:2]}'
+
+
+class XMLArchive:
+
+    def __init__(self, directory, segment_mb=None, fsync=None, level=6):
+        """
+        Args:
+            directory: directorio de segmentos, diccionarios e índice
+            segment_mb: tamaño al que se cambia de segmento
+                (SRI_XML_SEGMENT_MB, 64)
+            fsync: sincronizar a disco cada registro (SRI_XML_FSYNC)
+            level: nivel de compresión de zlib
+        """
+        self.directory = directory
+        self.segment_bytes = int(segment_mb or os.environ.get('SRI_XML_SEGMENT_MB', 64)) * 1024 * 1024
+        self.fsync = fsync if fsync is not None else os.environ.get('SRI_XML_FSYNC', '0') == '1'
+        self.level = level
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pid = None
+        self._segmento = None
+        self._segmento_fd = None
+        self._lectores = {}
+        self._diccionarios = {0: b''}
+        self._diccionario_actual = self._ultimo_diccionario()
+        self._crear_indice()
+
+    # ----- índice -----
+
+    def _db(self):
+        """Conexión SQLite del hilo (y del proceso) actual"""
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(os.path.join(self.directory, 'indice.db'), timeout=30)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def _crear_indice(self):
+        db = self._db()
+        with db:
+            db.execute('''
+                CREATE TABLE IF NOT EXISTS xml (
+                    clave TEXT NOT NULL,
+                    estado TEXT NOT NULL,
+                    fecha TEXT NOT NULL,
+                    segmento TEXT NOT NULL,
+                    posicion INTEGER NOT NULL,
+                    longitud INTEGER NOT NULL,
+                    guardado REAL NOT NULL,
+                    PRIMARY KEY (clave, estado)
+                ) WITHOUT ROWID
+            ''')
+            db.execute('CREATE INDEX IF NOT EXISTS xml_fecha ON xml (fecha, estado)')
+
+    def _indexar(self, db, clave, estado, segmento, posicion, longitud, guardado):
+        db.execute(
+            'INSERT OR REPLACE INTO xml VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (clave, estado, fecha_emision(clave), segmento, posicion, longitud, guardado)
+        )
+
+    # ----- diccionarios -----
+
+    def _ruta_diccionario(self, dict_id):
+        return os.path.join(self.directory, f'dict-{dict_id}.zdict')
+
+    def _ultimo_diccionario(self):
+        ids = [
+            int(name[5:-6]) for name in os.listdir(self.directory)
+            if name.startswith('dict-') and name.endswith('.zdict')
+        ]
+        return max(ids) if ids else 0
+
+    def _diccionario(self, dict_id):
+        data = self._diccionarios.get(dict_id)
+        if data is None:
+            with open(self._ruta_diccionario(dict_id), 'rb') as f:
+                data = f.read()
+            self._diccionarios[dict_id] = data
+        return data
+
+    def _crear_diccionario(self, raw):
+        """El primer XML firmado pasa a ser el diccionario 1 (inmutable)"""
+        path = self._ruta_diccionario(1)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(raw[-MAX_DICCIONARIO:])
+        try:
+            # link falla si otro proceso ya lo creó: se usa el suyo
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+        self._diccionario_actual = 1
+
+    # ----- escritura -----
+
+    def _segmento_activo(self, siguiente):
+        if self._pid != os.getpid():
+            # Proceso hijo: no escribe en el segmento del padre
+            self._pid = os.getpid()
+            self._segmento = None
+            self._segmento_fd = None
+            self._lectores = {}
+        if self._segmento is not None and os.fstat(self._segmento_fd).st_size + siguiente > self.segment_bytes:
+            os.close(self._segmento_fd)
+            self._segmento = None
+        if self._segmento is None:
+            self._segmento = f'{time.time_ns()}-{os.getpid()}.seg'
+            self._segmento_fd = os.open(
+                os.path.join(self.directory, self._segmento),
+                os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644
+            )
+        return self._segmento, self._segmento_fd
+
+    def guardar(self, clave_acceso, estado, xml):
+        """
+        Agrega el XML de un comprobante en un estado
+
+        Guardar de nuevo la misma clave y estado agrega otro registro y el
+        índice apunta al último.
+
+        Returns:
+            segmento donde quedó el registro
+        """
+        if estado not in _CODIGO_ESTADO:
+            raise ValueError(f'Estado de XML desconocido: {estado}')
+        raw = xml.encode('utf-8')
+
+        with self._lock:
+            if self._diccionario_actual == 0 and b'Signature' in raw:
+                self._crear_diccionario(raw)
+            dict_id = self._diccionario_actual
+            compressor = zlib.compressobj(self.level, zdict=self._diccionario(dict_id)) if dict_id else zlib.compressobj(self.level)
+            payload = compressor.compress(raw) + compressor.flush()
+            guardado = time.time()
+            header = HEADER.pack(
+                MAGIC, clave_acceso.encode('ascii'), _CODIGO_ESTADO[estado], dict_id,
+                guardado, len(raw), len(payload), zlib.crc32(raw)
+            )
+            registro = header + payload
+
+            segmento, fd = self._segmento_activo(len(registro))
+            posicion = os.fstat(fd).st_size
+            os.write(fd, registro)
+            if self.fsync:
+                os.fsync(fd)
+
+        db = self._db()
+        with db:
+            self._indexar(db, clave_acceso, estado, segmento, posicion, len(registro), guardado)
+        return segmento
+
+    # ----- lectura -----
+
+    def _lector(self, segmento):
+        fd = self._lectores.get(segmento)
+        if fd is None:
+            fd = os.open(os.path.join(self.directory, segmento), os.O_RDONLY)
+            self._lectores[segmento] = fd
+        return fd
+
+    def _decodificar(self, registro):
+        magic, clave, _, dict_id, _, raw_len, comp_len, crc = HEADER.unpack_from(registro)
+        if magic != MAGIC:
+            raise ValueError('Registro de XML dañado (cabecera)')
+        payload = registro[HEADER.size:HEADER.size + comp_len]
+        if dict_id:
+            raw = zlib.decompressobj(zdict=self._diccionario(dict_id)).decompress(payload)
+        else:
+            raw = zlib.decompress(payload)
+        if len(raw) != raw_len or zlib.crc32(raw) != crc:
+            raise ValueError(f'Registro de XML dañado ({clave.decode("ascii")})')
+        return raw.decode('utf-8')
+
+    def leer(self, clave_acceso, estado):
+        """XML guardado o None"""
+        fila = self._db().execute(
+            'SELECT segmento, posicion, longitud FROM xml WHERE clave = ? AND estado = ?',
+            (clave_acceso, estado)
+        ).fetchone()
+        if fila is None:
+            return None
+        segmento, posicion, longitud = fila
+        return self._decodificar(os.pread(self._lector(segmento), longitud, posicion))
+
+    def estados(self, clave_acceso):
+        """Estados guardados de un comprobante"""
+        filas = self._db().execute('SELECT estado FROM xml WHERE clave = ?', (clave_acceso,)).fetchall()
+        return [estado for (estado,) in filas]
+
+    def listar(self, fecha_desde=None, fecha_hasta=None, estado=None, limit=None):
+        """
+        Claves por fecha de emisión (YYYY-MM-DD) y estado
+
+        Returns:
+            lista de dicts con 'clave_acceso', 'estado', 'fecha', 'guardado'
+        """
+        condiciones, parametros = [], []
+        if fecha_desde:
+            condiciones.append('fecha >= ?')
+            parametros.append(fecha_desde)
+        if fecha_hasta:
+            condiciones.append('fecha <= ?')
+            parametros.append(fecha_hasta)
+        if estado:
+            condiciones.append('estado = ?')
+            parametros.append(estado)
+        sql = 'SELECT clave, estado, fecha, guardado FROM xml'
+        if condiciones:
+            sql += ' WHERE ' + ' AND '.join(condiciones)
+        sql += ' ORDER BY fecha, clave'
+        if limit:
+            sql += f' LIMIT {int(limit)}'
+        return [
+            {
+                'clave_acceso': clave,
+                'estado': estado,
+                'fecha': fecha,
+                'guardado': datetime.fromtimestamp(guardado).isoformat(timespec='seconds')
+            }
+            for clave, estado, fecha, guardado in self._db().execute(sql, parametros)
+        ]
+
+    # ----- mantenimiento -----
+
+    def reindexar(self):
+        """
+        Reconstruye el índice leyendo las cabeceras de todos los segmentos
+        (por ejemplo si se perdió indice.db o quedó atrás tras un corte)
+
+        Returns:
+            cantidad de registros indexados
+        """
+        segmentos = sorted(name for name in os.listdir(self.directory) if name.endswith('.seg'))
+        db = self._db()
+        total = 0
+        with db:
+            for segmento in segmentos:
+                with open(os.path.join(self.directory, segmento), 'rb') as f:
+                    posicion = 0
+                    while True:
+                        header = f.read(HEADER.size)
+                        if len(header) < HEADER.size:
+                            break
+                        magic, clave, codigo, _, guardado, _, comp_len, _ = HEADER.unpack(header)
+                        if magic != MAGIC:
+                            print(f"❌ Segmento {segmento} dañado en la posición {posicion}")
+                            break
+                        longitud = HEADER.size + comp_len
+                        # Registro cortado por un corte de luz: se descarta
+                        if len(f.read(comp_len)) < comp_len:
+                            break
+                        self._indexar(db, clave.decode('ascii'), ESTADOS[codigo - 1],
+                                      segmento, posicion, longitud, guardado)
+                        posicion += longitud
+                        total += 1
+        return total
+
+    def importar_directorio(self, directorio, estado):
+        """Importa los <clave>.xml de un directorio del formato anterior"""
+        importados = 0
+        for name in sorted(os.listdir(directorio)):
+            if not name.endswith('.xml'):
+                continue
+            clave = name[:-4]
+            if estado in self.estados(clave):
+                continue
+            with open(os.path.join(directorio, name), 'r', encoding='utf-8') as f:
+                self.guardar(clave, estado, f.read())
+            importados += 1
+        return importados